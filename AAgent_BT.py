@@ -1,408 +1,939 @@
-import sys
-from collections import deque
-
-import aiohttp
-import asyncio
-import json
-import Sensors
-import Goals_BT
-import BTRoam
-
-import BTAstronaut_alone, BTCritters, BTCollectRun
-
-import tkinter as tk
-from threading import Thread
-import queue
-import copy
-
-# Agent TK GUI
-gui_blackboard = queue.Queue()
-exit_gui = False
-active_tk_gui = False
-
-
-# Agent TK GUI
-class AAgentInterface:
-    def __init__(self, aa_name):
-        self.gui_root = tk.Tk()
-        self.gui_root.title("AAGENT: " + aa_name)
-
-        self.text = tk.Text(self.gui_root, width=40, height=20, wrap="word")
-        self.text.pack(expand=True, fill="both")
-
-        self.gui_root.geometry("1200x600")
-        self.update_values()
-
-    def update_values(self):
-        try:
-            i_state_data, sensor_data = gui_blackboard.get_nowait()
-            self.text.delete("1.0", tk.END)
-
-            # Sensor information
-            for s_data in sensor_data:
-                self.text.insert(tk.END, f"{s_data}\n")
-
-            # internal_state information
-            for key, value in i_state_data.items():
-                if key == "nearbyContainerInventoryList" or key == "myInventoryList":
-                    self.text.insert(tk.END, f"{key}:\n")
-                    for item in value:
-                        self.text.insert(tk.END, f"{item}\n")
-                else:
-                    self.text.insert(tk.END, f"{key}: {value}\n")
-
-        except queue.Empty:
-            pass
-        finally:
-            self.gui_root.after(100, self.update_values)
-            if exit_gui:
-                self.gui_root.quit()
-
-    def start(self):
-        self.gui_root.mainloop()
-
-
-class InternalState:
-    """
-    Internal state
-        Stores the internal state of the agent.
-            isRotatingRight: <bool>
-            isRotatingLeft: <bool>
-            movingForwards: <bool>
-            movingBackwards: <bool>
-            isFrozen: <bool> Indicates if the agent is frozen due to a collision with an enemy
-            speed: <float> Current speed of the agent
-            position: <dict { "x": <float>, "y": <float>, "z": <float> } Position using world coordinates
-            rotation: <dict { "x": <float>, "y": <float>, "z": <float> } Rotation y - Yaw, x - Pitch, z - Roll
-            currentNamedLoc: <str> Name of the current location (if the agent is in one)
-            onRoute: <bool> Is the agent moving toward a target using the NavMesh system
-            targetNamedLoc: <str> Name of the target location (if the agent is going to one using the NavMesh system)
-            myInventoryList: <list> My current inventory list. Has the form [{'name': '', 'amount': 0}, {'name': '', 'amount': 0}, ...]
-            nearbyContainerInventory: <bool> Is there a nearby container?
-            nearbyContainerInventoryList: <list> Nearby container inventory list. Has the form [{'name': '', 'amount': 0}, {'name': '', 'amount': 0}, ...]
-    """
-
-    def __init__(self):
-        self.isRotatingRight = False
-        self.isRotatingLeft = False
-        self.movingForwards = False
-        self.movingBackwards = False
-        self.isFrozen = None
-        self.speed = 0.0
-        self.position = {"x": 0, "y": 0, "z": 0}
-        self.rotation = {"x": 0, "y": 0, "z": 0}
-        self.currentNamedLoc = ""
-        self.onRoute = False
-        self.targetNamedLoc = ""
-        self.myInventoryList = []
-        self.nearbyContainerInventory = False
-        self.nearbyContainerInventoryList = []
-
-    def update_internal_state(self, sensor_info, i_state_dict):
-        self.isRotatingRight = i_state_dict["isRotatingRight"]
-        self.isRotatingLeft = i_state_dict["isRotatingLeft"]
-        self.movingForwards = i_state_dict["movingForwards"]
-        self.movingBackwards = i_state_dict["movingBackwards"]
-        self.isFrozen = i_state_dict["isFrozen"]
-        self.speed = i_state_dict["speed"]
-        self.position = i_state_dict["position"]
-        self.rotation = i_state_dict["rotation"]
-        self.currentNamedLoc = i_state_dict["currentNamedLoc"]
-        self.onRoute = i_state_dict["onRoute"]
-        self.targetNamedLoc = i_state_dict["targetNamedLoc"]
-        self.myInventoryList = i_state_dict["myInventoryList"]
-        self.nearbyContainerInventory = i_state_dict["nearbyContainerInventory"]
-        self.nearbyContainerInventoryList = i_state_dict["nearbyContainerInventoryList"]
-
-        # Agent TK GUI
-        if active_tk_gui:
-            if gui_blackboard.empty():
-                total_info = (i_state_dict, sensor_info)
-                gui_blackboard.put(copy.deepcopy(total_info))
-
-
-class AAgent:
-    # Constants that define the state of the simulation
-    ON_HOLD = 0
-    RUNNING = 1
-
-    def __init__(self, config_file_path: str):
-        # Read the agent configuration file and put the info in the 'config' dictionary.
-        with open(config_file_path, 'r') as file:
-            config_data = file.read()
-            self.config = json.loads(config_data)
-        # Extract the parameters of the agent from the config dictionary
-        self.AgentParameters = self.config['AgentParameters']
-        self.python_gui_monitor = self.config['Misc']['python_gui_monitor']
-
-        # URL to connect with Unity
-        self.url = f"ws://{self.config['Server']['host']}:{self.config['Server']['port']}/"
-
-        # Agent sensors
-        self.rc_sensor = Sensors.RayCastSensor(self.AgentParameters['ray_perception_sensor_param'])
-
-        # Agent internal state
-        self.i_state = InternalState()
-
-        # Misc. variables
-        # Variables used for the websocket connection
-        self.session = None
-        self.ws = None
-        # State of the simulation: ON_HOLD | RUNNING
-        self.simulation_state = self.ON_HOLD
-        # Asyncio exit event used to notify the tasks that they have to finish
-        self.exit_event = asyncio.Event()
-        # Flag that confirms the connection with Unity is fully operative and that Unity is waiting for messages
-        self.connection_ready = False
-
-        # Reference to the possible goals the agent can execute
-        self.goals = {
-            "DoNothing": Goals_BT.DoNothing(self),
-            "ForwardDist": Goals_BT.ForwardDist(self, -1, 5, 10),
-            "BackwardDist": Goals_BT.BackwardDist(self, -1, 5, 10),
-            "Turn": Goals_BT.Turn(self),
-            "RandomRoam": Goals_BT.RandomRoam(self),
-            "Avoid": Goals_BT.Avoid(self), 
-            "AvoidForMultipleCritters": Goals_BT.AvoidForCritters(self)
-        }
-
-        # Reference to the possible behaviour trees the agent can execute
-        self.bts = {            
-            "BTCollectRun": BTCollectRun.BTCollectRun(self),
-            "BTRoam": BTRoam.BTRoam(self),
-            "BTAstronautAlone": BTAstronaut_alone.BTAstronautAlone(self),
-            "BTRoamOrChase": BTCritters.BTRoamOrChase(self)
-        }
-
-        # Active goal
-        self.currentGoal = None
-
-        # Active behaviour tree
-        self.currentBT = None
-
-        # Individual actions pending execution
-        self.pendingActions = deque()
-
-    async def open_websocket(self):
-        """
-        Establishes the connection with Unity using a websocket. After that, it sends the initial parameters of the
-        agent, obtained previously from the configuration file.
-        """
-        try:
-            self.session = aiohttp.ClientSession()
-            print("Connecting to: " + self.url)
-            self.ws = await self.session.ws_connect(self.url)
-            print("Connected to WebSocket server")
-            param_json = json.dumps(self.AgentParameters)
-            print("Sending the initial parameters: " + param_json)
-            await self.send_message("initial_params", param_json)
-        except:
-            print("Failed connection")
-            self.exit_event.set()
-
-    async def close_websocket(self):
-        """
-        Properly close the websocket connection.
-        """
-        if self.ws:
-            await self.ws.close()
-        if self.session:
-            await self.session.close()
-        print("WebSocket connection properly closed")
-
-    async def send_message(self, msg_type: str, msg_content: str):
-        """
-        Sends a message in json format of type 'msg_type' and with content 'msg_content' to Unity
-        :param msg_type: General type of the message.
-        :param msg_content: Content of the message
-        """
-        msg = {"type": msg_type, "content": msg_content}
-        msg_json = json.dumps(msg)
-        # if msg_type == "action":
-        #     print(msg_content)
-        await self.ws.send_str(msg_json)
-
-    async def receive_messages(self):
-        """
-        Gets the messages that arrive from Unity through the websocket. If the message is not a 'close' message or
-        an error, it calls the function 'process_incoming_message() to process it.
-        """
-        try:
-            # With this loop, we will repeatedly await the next value produced by iterating over self.ws.
-            # At each iteration, the event loop will suspend execution until a new value becomes available
-            # from self.ws. The loop continues iterating over self.ws till the websocket is closed.
-            async for msg in self.ws:
-                if msg.type == aiohttp.WSMsgType.TEXT:
-                    # print(f"MESSAGE: {msg}")
-                    self.process_incoming_message(msg.data)
-                elif msg.type == aiohttp.WSMsgType.CLOSED:
-                    print("Connection closed by Unity")
-                    break
-                elif msg.type == aiohttp.WSMsgType.ERROR:
-                    print(f"WebSocket connection closed with error: {self.ws.exception()}")
-                    break
-        except Exception as e:
-            print(f"Connection failed: {e}")
-        finally:
-            print("Finishing receive_messages")
-            self.exit_event.set()
-
-    def process_incoming_message(self, msg_data: str):
-        """
-        Processes the message 'msg_data' received from Unity. It is expected to be in json format.
-        :param msg_data: Message received in json format.
-        """
-        try:
-            msg_dict = json.loads(msg_data)
-
-            if msg_dict["Type"] == "sensor":
-                self.rc_sensor.set_perception(msg_dict["Content"][0])
-                self.i_state.update_internal_state(msg_dict["Content"][0], msg_dict["Content"][1])
-            elif msg_dict["Type"] == "sim_control":
-                if msg_dict["Content"] == "connection_ready":
-                    self.connection_ready = True
-                elif msg_dict["Content"] == "on_hold":
-                    self.simulation_state = self.ON_HOLD
-                    # print("ON HOLD")
-                elif msg_dict["Content"] == "start":
-                    self.simulation_state = self.RUNNING
-                    # print("RUNNING")
-                elif msg_dict["Content"] == "error":
-                    print("Error creating the agent in Unity.")
-                    self.exit_event.set()
-                else:
-                    print("Received unknown message - Type: " + msg_dict["Type"] + "- Content: " + msg_dict["Content"])
-            elif msg_dict["Type"] == "agent_control":
-                # These kind of messages have the format
-                # command:data
-                try:
-                    command, data = msg_dict["Content"].split(":")
-                    if command == "action":
-                        if self.currentBT:  # If there is a BT running
-                            self.bts[self.currentBT].stop_behaviour_tree()
-                            self.currentBT = None
-                        if self.currentGoal:  # If there is a single Goal running
-                            self.currentGoal = None
-                        self.pendingActions.append(data)
-                    elif command == "goal":
-                        self.pendingActions.append("stop")  # Just in case there is translation action running
-                        self.pendingActions.append("nt")  # Just in case there is rotation action running
-                        if self.currentBT:  # If there is a BT running
-                            self.bts[self.currentBT].stop_behaviour_tree()
-                            self.currentBT = None
-                        self.currentGoal = data
-                    elif command == "bt":
-                        self.pendingActions.append("stop")  # Just in case there is an action running
-                        self.pendingActions.append("nt")  # Just in case there is rotation action running
-                        if self.currentGoal:  # If there is a single Goal running
-                            self.currentGoal = None
-                        self.currentBT = data
-                    else:
-                        print("Agent_control message with an unknown command: " + msg_dict["content"])
-                except Exception as e:
-                    print(f"Exception1: {e}")
-                    print(f"Message: {msg_data}")
-            else:
-                print("Received unknown message - Type: " + msg_dict["Type"] + "- Content: " + msg_dict["Content"])
-        except json.JSONDecodeError as e:
-            print(f"Failed JSON decoding of the received message: {msg_data}")
-        except Exception as e:
-            print(f"Exception2: {e}")
-            raise e
-
-    async def main_loop(self):
-        # Keep going while there is not an event to exit
-        while not self.exit_event.is_set():
-            # Control if we are on hold (simulation paused from Unity)
-            if self.simulation_state == self.ON_HOLD:
-                # Just wait, but allow the other tasks keep running
-                await asyncio.sleep(0)
-            else:
-                # Here is where we perform the agent actions
-                # It can be the case we are executing a single action, a simple goal or a behaviour tree
-                try:
-                    if len(self.pendingActions) > 0:
-                        # Single action
-                        await self.send_message("action", self.pendingActions.popleft())
-                    elif self.currentGoal:
-                        # We are running a simple goal
-                        await self.goals[self.currentGoal].run()
-                    elif self.currentBT:
-                        # We are running a behaviour tree
-                        await self.bts[self.currentBT].tick()
-                    else:
-                        await asyncio.sleep(0)
-                except Exception as e:
-                    print("Execution failed.")
-                    print(f"Exception3: {e}")
-                    self.exit_event.set()
-        print("Finishing main_loop")
-
-    async def run(self):
-        try:
-            # Create the connection task, that will manage the connection with Unity,
-            # and the exit_event task, that will be used to exit if there is an error
-            connect_task = asyncio.create_task(self.open_websocket())
-            awaited_exit_event = asyncio.create_task(self.exit_event.wait())
-
-            # Wait for the connection with Unity to be ready or the exit event, what comes first
-            await asyncio.wait([connect_task, awaited_exit_event], return_when=asyncio.FIRST_COMPLETED)
-
-            if not self.exit_event.is_set():
-                # Now that the connection is established, create the task to start receiving messages from Unity
-                # We are not awaiting this task because it has to run forever till the main loop finishes
-                asyncio.create_task(self.receive_messages())
-                # Wait for the flag "connection_ready" to be True. If it is true, it means we have received an ack
-                # from Unity saying that the connection is fully established and Unity is ready to receive messages
-                while not self.connection_ready:
-                    await asyncio.sleep(0)
-                print("Connection with Unity fully established")
-
-                # We are ready now  to start the main loop of the agent
-                await self.main_loop()
-        except KeyboardInterrupt:
-            print("\nKeyboardInterrupt received! Initiating shutdown...")
-            self.exit_event.set()
-        except Exception as e:
-            print(f"Unexpected error: {e}")
-            self.exit_event.set()
-        finally:
-            # Clean the websocket connection
-            await self.close_websocket()
-            print("Connection with Unity closed")
-
-# Agent TK GUI
-def run_tk(aa_name):
-    app = AAgentInterface(aa_name)
-    app.start()
-
-
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python AAgent_BT.py <init_file.json>")
-    else:
-        # Get the name of the file with the initial parameters
-        init_file = sys.argv[1]
-
-        # Creates an instance of the AAgent_Python class.
-        my_AAgent = AAgent(init_file)
-
-        # Agent TK GUI
-        # Start the python gui monitor interface
-        if my_AAgent.python_gui_monitor:
-            agent_name = my_AAgent.AgentParameters["name"]
-            active_tk_gui = True
-            tk_thread = Thread(target=run_tk, args=(agent_name,))
-            tk_thread.start()
-
-        # Run the AAgent. It creates a new event loop, runs the my_AAgent.run()
-        # coroutine in that event loop, and then closes the event loop when the coroutine completes.
-        asyncio.run(my_AAgent.run())
-
-        # Close the agent TK GUI
-        if my_AAgent.python_gui_monitor:
-            active_tk_gui = False
-            exit_gui = True
-            tk_thread.join()
-
-        print("Bye!!!")
+import sys
+from collections import deque
+from collections.abc import Mapping
+from typing import TYPE_CHECKING
+
+import asyncio
+import importlib
+import itertools
+import json
+import operator
+import os
+import time
+import ActionFilter
+import BinaryFrame
+import Codec
+import Latency
+import Log
+import Recorder
+import Sensors
+
+# The heavy or optional modules are imported where they are used, so an agent (or the Spawner) only pays for the
+# ones it needs: aiohttp when connecting, tkinter when the GUI monitor is on, py_trees, the goals and the behaviour
+# trees when the agent builds them (see lazy_factory) and the profiler when it is enabled
+if TYPE_CHECKING:
+    import aiohttp
+
+from threading import Lock, Thread
+
+
+class LatestValue:
+    """
+    Handoff of the last value between threads, bounded to one value: put() replaces the value that has not been
+    taken yet and take() gets it (None if there is nothing new). Nothing is copied.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.value = None
+
+    def put(self, value):
+        with self.lock:
+            self.value = value
+
+    def take(self):
+        with self.lock:
+            value, self.value = self.value, None
+        return value
+
+
+# Agent TK GUI
+tk = None
+gui_blackboard = LatestValue()
+exit_gui = False
+active_tk_gui = False
+
+
+# Agent TK GUI
+class AAgentInterface:
+    def __init__(self, aa_name):
+        global tk
+        import tkinter as tk
+        self.gui_root = tk.Tk()
+        self.gui_root.title("AAGENT: " + aa_name)
+
+        # One label per ray and per field of the internal state, updated only when its text changes
+        self.frame = tk.Frame(self.gui_root)
+        self.frame.pack(expand=True, fill="both")
+        self.labels = {}
+        self.texts = {}
+
+        self.gui_root.geometry("1200x600")
+        self.update_values()
+
+    def show(self, key, text):
+        if self.texts.get(key) == text:
+            return
+        self.texts[key] = text
+        label = self.labels.get(key)
+        if label is None:
+            label = tk.Label(self.frame, anchor="w", justify="left")
+            label.pack(fill="x")
+            self.labels[key] = label
+        label.config(text=text)
+
+    def update_values(self):
+        try:
+            data = gui_blackboard.take()
+            if data is not None:
+                i_state_data, sensor_data = data
+
+                # Sensor information
+                for s_data in sensor_data:
+                    self.show(("ray", s_data[0]), f"{s_data}")
+
+                # internal_state information
+                for key, value in i_state_data.items():
+                    if key == "nearbyContainerInventoryList" or key == "myInventoryList":
+                        self.show(key, "\n".join([f"{key}:"] + [f"{item}" for item in value]))
+                    else:
+                        self.show(key, f"{key}: {value}")
+        finally:
+            self.gui_root.after(100, self.update_values)
+            if exit_gui:
+                self.gui_root.quit()
+
+    def start(self):
+        self.gui_root.mainloop()
+
+
+class Vec3:
+    """
+    Position (world coordinates) or rotation (y - Yaw, x - Pitch, z - Roll) of the agent, updated in place on every
+    sensor frame. It can be read like the dictionaries of the messages (rotation["y"]), but reading the attributes
+    (rotation.y) is faster.
+    """
+    __slots__ = ("x", "y", "z")
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x = x
+        self.y = y
+        self.z = z
+
+    def copy(self):
+        """
+        :return: a new Vec3 with the current coordinates. The goals that remember a position must copy it, the
+        position of the internal state changes on every frame.
+        """
+        return Vec3(self.x, self.y, self.z)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def items(self):
+        return (("x", self.x), ("y", self.y), ("z", self.z))
+
+    def __repr__(self):
+        return f"Vec3(x={self.x}, y={self.y}, z={self.z})"
+
+
+def flag_property(mask, doc):
+    """
+    :return: bool property that reads and writes the bit 'mask' of InternalState.flags
+    """
+    def getter(self):
+        return self.flags & mask != 0
+
+    def setter(self, value):
+        self.flags = self.flags | mask if value else self.flags & ~mask
+    return property(getter, setter, doc=doc)
+
+
+# Readers of the fields of the decoded internal state: a dictionary (json and orjson backends) or a Codec.AgentState
+# (msgspec backend), read in a single call
+STATE_FIELDS = ("isRotatingRight", "isRotatingLeft", "movingForwards", "movingBackwards", "onRoute",
+                "nearbyContainerInventory", "isFrozen", "speed", "position", "rotation", "currentNamedLoc",
+                "targetNamedLoc", "myInventoryList", "nearbyContainerInventoryList")
+STATE_READERS = {dict: (operator.itemgetter(*STATE_FIELDS), operator.itemgetter("x", "y", "z"))}
+STRUCT_READERS = (operator.attrgetter(*STATE_FIELDS), operator.attrgetter("x", "y", "z"))
+STATE_FIELD_SET = frozenset(STATE_FIELDS)
+
+
+class InternalState:
+    """
+    Internal state
+        Stores the internal state of the agent.
+            isRotatingRight: <bool>
+            isRotatingLeft: <bool>
+            movingForwards: <bool>
+            movingBackwards: <bool>
+            isFrozen: <bool> Indicates if the agent is frozen due to a collision with an enemy
+            speed: <float> Current speed of the agent
+            position: <Vec3 x, y, z> Position using world coordinates
+            rotation: <Vec3 x, y, z> Rotation y - Yaw, x - Pitch, z - Roll
+            currentNamedLoc: <str> Name of the current location (if the agent is in one)
+            onRoute: <bool> Is the agent moving toward a target using the NavMesh system
+            targetNamedLoc: <str> Name of the target location (if the agent is going to one using the NavMesh system)
+            myInventoryList: <list> My current inventory list. Has the form [{'name': '', 'amount': 0}, {'name': '', 'amount': 0}, ...]
+            nearbyContainerInventory: <bool> Is there a nearby container?
+            nearbyContainerInventoryList: <list> Nearby container inventory list. Has the form [{'name': '', 'amount': 0}, {'name': '', 'amount': 0}, ...]
+
+        The goals can wait for a condition on the state (wait_until) instead of polling it: the condition is checked
+        after every update, so they wake up on the first sensor frame that meets it.
+
+        The state is updated in place: the flags (booleans except isFrozen, that is None till the first frame) are
+        packed in the bits of 'flags', and 'position' and 'rotation' are Vec3 whose coordinates are overwritten by
+        every frame (copy them to keep a past value, see Vec3.copy).
+    """
+    __slots__ = ("flags", "isFrozen", "speed", "position", "rotation", "currentNamedLoc", "targetNamedLoc",
+                 "myInventoryList", "nearbyContainerInventoryList", "updates", "watchers")
+
+    # Bits of 'flags'
+    ROTATING_RIGHT = 1
+    ROTATING_LEFT = 2
+    MOVING_FORWARDS = 4
+    MOVING_BACKWARDS = 8
+    ON_ROUTE = 16
+    NEARBY_CONTAINER = 32
+
+    isRotatingRight = flag_property(ROTATING_RIGHT, "Rotating to the right")
+    isRotatingLeft = flag_property(ROTATING_LEFT, "Rotating to the left")
+    movingForwards = flag_property(MOVING_FORWARDS, "Moving forwards")
+    movingBackwards = flag_property(MOVING_BACKWARDS, "Moving backwards")
+    onRoute = flag_property(ON_ROUTE, "Moving toward a target using the NavMesh system")
+    nearbyContainerInventory = flag_property(NEARBY_CONTAINER, "There is a nearby container")
+
+    def __init__(self):
+        self.flags = 0
+        self.isFrozen = None
+        self.speed = 0.0
+        self.position = Vec3()
+        self.rotation = Vec3()
+        self.currentNamedLoc = ""
+        self.targetNamedLoc = ""
+        self.myInventoryList = []
+        self.nearbyContainerInventoryList = []
+        # Number of updates (sensor frames) received
+        self.updates = 0
+        # (condition, future) of the pending wait_until calls
+        self.watchers = []
+
+    def update_internal_state(self, sensor_info, i_state_dict):
+        read_fields, read_vector = STATE_READERS.get(type(i_state_dict), STRUCT_READERS)
+        (rotating_right, rotating_left, moving_forwards, moving_backwards, on_route, nearby_container,
+         self.isFrozen, self.speed, position, rotation, self.currentNamedLoc, self.targetNamedLoc,
+         self.myInventoryList, self.nearbyContainerInventoryList) = read_fields(i_state_dict)
+        # The booleans are shifted to their bits (True << n == 1 << n)
+        self.flags = (rotating_right | rotating_left << 1 | moving_forwards << 2 | moving_backwards << 3
+                      | on_route << 4 | nearby_container << 5)
+        vector = self.position
+        vector.x, vector.y, vector.z = read_vector(position)
+        vector = self.rotation
+        vector.x, vector.y, vector.z = read_vector(rotation)
+        self.updates += 1
+        if self.watchers:
+            self.notify_watchers()
+
+        # Agent TK GUI
+        if active_tk_gui:
+            # The payload is decoded for every message and nobody modifies it afterwards, so it is not copied
+            gui_blackboard.put((i_state_dict, sensor_info))
+
+    def set_state(self, sensor_info, flags, is_frozen, speed, position, rotation, current_loc, target_loc,
+                  inventory, container_inventory):
+        """
+        Updates the whole state with values already unpacked (binary sensor frames, see BinaryFrame.py)
+        :param sensor_info: perception shown by the Tk monitor (only used if it is active)
+        :param flags: the bits of 'flags'
+        :param position: (x, y, z)
+        :param rotation: (x, y, z)
+        """
+        self.flags = flags
+        self.isFrozen = is_frozen
+        self.speed = speed
+        vector = self.position
+        vector.x, vector.y, vector.z = position
+        vector = self.rotation
+        vector.x, vector.y, vector.z = rotation
+        self.currentNamedLoc = current_loc
+        self.targetNamedLoc = target_loc
+        self.myInventoryList = inventory
+        self.nearbyContainerInventoryList = container_inventory
+        self.updates += 1
+        if self.watchers:
+            self.notify_watchers()
+
+        # Agent TK GUI
+        if active_tk_gui:
+            gui_blackboard.put((self.as_dict(), sensor_info))
+
+    def apply_delta(self, sensor_info, changes):
+        """
+        Updates the state with the fields that changed since the previous frame (sensor_delta message)
+        :param changes: {field: new value}. The fields that are not in STATE_FIELDS are ignored
+        """
+        for field, value in changes.items():
+            if field == "position" or field == "rotation":
+                vector = getattr(self, field)
+                vector.x, vector.y, vector.z = value["x"], value["y"], value["z"]
+            elif field in STATE_FIELD_SET:
+                setattr(self, field, value)  # The flags through their properties
+        self.updates += 1
+        if self.watchers:
+            self.notify_watchers()
+
+        # Agent TK GUI
+        if active_tk_gui:
+            # The GUI may skip frames, so it gets the whole state (and the whole perception), not the changes
+            gui_blackboard.put((self.as_dict(), sensor_info))
+
+    def as_dict(self):
+        """
+        :return: the state with the layout of the internal state of the sensor messages
+        """
+        state = {field: getattr(self, field) for field in STATE_FIELDS}
+        state["position"] = dict(self.position.items())
+        state["rotation"] = dict(self.rotation.items())
+        return state
+
+    async def wait_until(self, condition, timeout=None):
+        """
+        Waits till condition(internal state) is true. It is checked now and after every update of the state.
+        :param timeout: maximum seconds to wait (None: no limit)
+        :return: True if the condition was met, False if the timeout expired first
+        """
+        if condition(self):
+            return True
+        watcher = (condition, asyncio.get_running_loop().create_future())
+        self.watchers.append(watcher)
+        try:
+            await asyncio.wait_for(watcher[1], timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            if watcher in self.watchers:
+                self.watchers.remove(watcher)
+
+    async def next_update(self, timeout=None):
+        """
+        Waits for the next update of the state (sensor frame)
+        :return: True if there was an update, False if the timeout expired first
+        """
+        updates = self.updates
+        return await self.wait_until(lambda i_state: i_state.updates > updates, timeout)
+
+    def notify_watchers(self):
+        """
+        Wakes up the wait_until calls whose condition is met by the current state
+        """
+        pending = []
+        for condition, future in self.watchers:
+            if future.done():  # Cancelled or expired
+                continue
+            try:
+                if condition(self):
+                    future.set_result(True)
+                    continue
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            pending.append((condition, future))
+        self.watchers = pending
+
+
+def lazy_factory(module_name, class_name, *args):
+    """
+    :return: callable that imports the module 'module_name' (if not imported yet) and returns class_name(*args)
+    """
+    def factory():
+        return getattr(importlib.import_module(module_name), class_name)(*args)
+    return factory
+
+
+class LazyRegistry(Mapping):
+    """
+    Read-only dictionary of the goals or behaviour trees of an agent. Each one is built the first time it is used
+    and then kept, so an agent only builds what it runs (usually just its initial_task).
+    """
+    def __init__(self, factories):
+        """
+        :param factories: {name: callable without arguments that builds the goal or behaviour tree (lazy_factory)}
+        """
+        self.factories = factories
+        self.instances = {}
+        self.build_times = {}
+        # Called with (name, instance) after building one (e.g. to profile it)
+        self.on_build = None
+
+    def __getitem__(self, name):
+        instance = self.instances.get(name)
+        if instance is None:
+            factory = self.factories[name]
+            start = time.perf_counter()
+            instance = factory()
+            self.build_times[name] = time.perf_counter() - start
+            self.instances[name] = instance
+            if self.on_build:
+                self.on_build(name, instance)
+        return instance
+
+    def __contains__(self, name):
+        return name in self.factories
+
+    def __iter__(self):
+        return iter(self.factories)
+
+    def __len__(self):
+        return len(self.factories)
+
+    def report(self):
+        """
+        :return: the ones built, with their build time, and the number of the ones never built
+        """
+        built = ", ".join(f"{name} ({1000 * t:.2f}ms)" for name, t in self.build_times.items()) or "none"
+        return f"built: {built}  not built: {len(self.factories) - len(self.instances)}"
+
+
+class AAgent:
+    # Constants that define the state of the simulation
+    ON_HOLD = 0
+    RUNNING = 1
+
+    # Number of the agents created in this process (used to name the logs and the session recordings)
+    instance_counter = itertools.count()
+
+    def __init__(self, config_file_path: str, session: "aiohttp.ClientSession" = None):
+        """
+        :param config_file_path: Agent configuration file (json)
+        :param session: aiohttp session shared with other agents (e.g. the ones created by the Spawner).
+                        If None, the agent creates (and closes) its own session.
+        """
+        # Read the agent configuration file and put the info in the 'config' dictionary.
+        with open(config_file_path, 'r') as file:
+            config_data = file.read()
+            self.config = json.loads(config_data)
+        # Extract the parameters of the agent from the config dictionary
+        self.AgentParameters = self.config['AgentParameters']
+        self.python_gui_monitor = self.config['Misc']['python_gui_monitor']
+        # Behaviour tree ticking: "frame" ticks once per fresh sensor frame, "fixed" ticks at a fixed period
+        self.bt_tick_mode = self.config['Misc'].get('bt_tick_mode', "frame")
+        self.bt_min_tick_interval = 1.0 / self.config['Misc'].get('bt_max_tick_rate', 20)
+        self.bt_tick_timeout = self.config['Misc'].get('bt_tick_timeout', 0.2)
+        self.number = next(AAgent.instance_counter)
+
+        # Log levels per module and ring buffer with the last log records of the agent (see Log.py)
+        Log.setup(self.config['Misc'].get('log_level', "INFO"), self.config['Misc'].get('log_levels'))
+        self.log = Log.AgentLog(f"{self.AgentParameters['name']}-{self.number}",
+                                self.config['Misc'].get('log_ring', 200))
+
+        # URL to connect with Unity
+        self.url = f"ws://{self.config['Server']['host']}:{self.config['Server']['port']}/"
+
+        # Agent sensors
+        self.rc_sensor = Sensors.RayCastSensor(self.AgentParameters['ray_perception_sensor_param'])
+        # Ask for delta sensor frames with a keyframe every 'sensor_delta' frames (an extension of the protocol
+        # implemented by LocalServer.py, Unity keeps sending full frames)
+        sensor_delta = self.config['Misc'].get('sensor_delta', 0)
+        if sensor_delta:
+            self.AgentParameters['sensor_delta'] = sensor_delta
+        # Ask for binary sensor frames (see BinaryFrame.py, also implemented only by LocalServer.py). They save
+        # bandwidth, not CPU. The decoder keeps the strings of the connection, it is created with the first binary frame
+        if self.config['Misc'].get('sensor_binary', False):
+            self.AgentParameters['sensor_binary'] = True
+        self.frame_decoder = None
+
+        # Agent internal state
+        self.i_state = InternalState()
+
+        # Filter that suppresses or merges redundant motion actions (see ActionFilter.py)
+        if self.config['Misc'].get('action_filter', True):
+            self.action_filter = ActionFilter.ActionFilter(self.i_state,
+                                                           self.config['Misc'].get('action_filter_window', 0.25))
+        else:
+            self.action_filter = None
+
+        # Sensor-to-action latency histograms (see Latency.py), printed at exit if 'latency_report'
+        self.latency = Latency.LatencyTracker() if self.config['Misc'].get('latency', True) else None
+        self.latency_report = self.config['Misc'].get('latency_report', False)
+
+        # Optional recording of the websocket session (see Recorder.py). The file name can contain {name}, {pid}
+        # and {n} (number of the agent in the process), e.g. "rec/{name}-{pid}-{n}.rec.gz"
+        record_session = self.config['Misc'].get('record_session', "")
+        if record_session:
+            self.recorder = Recorder.SessionRecorder(record_session.format(
+                name=self.AgentParameters["name"], pid=os.getpid(), n=self.number))
+        else:
+            self.recorder = None
+
+        # Misc. variables
+        # Variables used for the websocket connection
+        self.session = session
+        self.owns_session = session is None
+        self.ws = None
+        self.receive_task = None
+        # State of the simulation: ON_HOLD | RUNNING
+        self.simulation_state = self.ON_HOLD
+        # Asyncio exit event used to notify the tasks that they have to finish
+        self.exit_event = asyncio.Event()
+        # Flag that confirms the connection with Unity is fully operative and that Unity is waiting for messages
+        self.connection_ready = False
+        # Asyncio events used to wait, without consuming CPU, for:
+        # the connection to be ready, the simulation to be RUNNING and some work (action, goal or BT) to do
+        self.connection_ready_event = asyncio.Event()
+        self.running_event = asyncio.Event()
+        self.work_event = asyncio.Event()
+        # Set every time a new sensor frame arrives. Used to tick the behaviour trees once per fresh frame
+        self.sensor_frame_event = asyncio.Event()
+        self.sensor_frame_count = 0
+        # Arrival time (time.perf_counter) of the last sensor frame
+        self.sensor_frame_time = None
+        self.ticked_frame_count = 0
+        self.last_tick_time = 0.0
+
+        # Reference to the possible goals the agent can execute
+        # They are built the first time they are used (see LazyRegistry)
+        self.goals = LazyRegistry({
+            "DoNothing": lazy_factory("Goals_BT", "DoNothing", self),
+            "ForwardDist": lazy_factory("Goals_BT", "ForwardDist", self, -1, 5, 10),
+            "BackwardDist": lazy_factory("Goals_BT", "BackwardDist", self, -1, 5, 10),
+            "Turn": lazy_factory("Goals_BT", "Turn", self),
+            "RandomRoam": lazy_factory("Goals_BT", "RandomRoam", self),
+            "Avoid": lazy_factory("Goals_BT", "Avoid", self),
+            "AvoidForMultipleCritters": lazy_factory("Goals_BT", "AvoidForCritters", self)
+        })
+
+        # Reference to the possible behaviour trees the agent can execute
+        self.bts = LazyRegistry({
+            "BTCollectRun": lazy_factory("BTCollectRun", "BTCollectRun", self),
+            "BTRoam": lazy_factory("BTRoam", "BTRoam", self),
+            "BTAstronautAlone": lazy_factory("BTAstronaut_alone", "BTAstronautAlone", self),
+            "BTRoamOrChase": lazy_factory("BTCritters", "BTRoamOrChase", self)
+        })
+        # Runs the goals started by the nodes of the behaviour trees (Goals_BT.goal_runner), created on first use
+        self.goal_runner = None
+
+        # Optional per-node profiler of the behaviour trees (see Profiler.py)
+        self.bt_profiler = None
+        if self.config['Misc'].get('bt_profiler', False):
+            self.enable_bt_profiler()
+
+        # Active goal
+        self.currentGoal = None
+
+        # Active behaviour tree
+        self.currentBT = None
+
+        # Individual actions pending execution
+        self.pendingActions = deque()
+
+    def enable_bt_profiler(self):
+        """
+        Instruments the behaviour trees of the agent with a Profiler.BTProfiler: the ones already built and the
+        ones built later
+        """
+        if self.bt_profiler is None:
+            import Profiler
+            self.bt_profiler = Profiler.BTProfiler()
+            for bt_name, bt in self.bts.instances.items():
+                self.bt_profiler.instrument(bt_name, bt.behaviour_tree)
+            self.bts.on_build = lambda bt_name, bt: self.bt_profiler.instrument(bt_name, bt.behaviour_tree)
+
+    async def open_websocket(self):
+        """
+        Establishes the connection with Unity using a websocket. After that, it sends the initial parameters of the
+        agent, obtained previously from the configuration file.
+        """
+        try:
+            if self.session is None:
+                import aiohttp
+                self.session = aiohttp.ClientSession()
+            print("Connecting to: " + self.url)
+            self.ws = await self.session.ws_connect(self.url)
+            print("Connected to WebSocket server")
+            param_json = Codec.dumps(self.AgentParameters)
+            print("Sending the initial parameters: " + param_json)
+            await self.send_message("initial_params", param_json)
+        except:
+            print("Failed connection")
+            self.exit_event.set()
+
+    async def close_websocket(self):
+        """
+        Properly close the websocket connection. It can be called more than once (e.g. by the Spawner shutdown and
+        by run() itself).
+        """
+        ws, self.ws = self.ws, None
+        if ws:
+            await ws.close()
+        if self.session and self.owns_session:  # A shared session is closed by its owner
+            session, self.session = self.session, None
+            await session.close()
+        if ws:
+            print("WebSocket connection properly closed")
+
+    async def send_message(self, msg_type: str, msg_content: str):
+        """
+        Sends a message in json format of type 'msg_type' and with content 'msg_content' to Unity
+        :param msg_type: General type of the message.
+        :param msg_content: Content of the message
+        """
+        if msg_type == "action" and self.action_filter and not self.action_filter.accept(msg_content):
+            return  # It would not change anything in Unity
+        if self.ws is None or self.ws.closed:
+            return  # Shutting down: goals being cancelled may still try to stop the agent
+        if msg_type == "action" and self.latency:
+            decision_frame = Latency.decision_frame.get()
+            if decision_frame is not None:
+                self.latency.record("frame_to_action", decision_frame)
+        msg = {"type": msg_type, "content": msg_content}
+        msg_json = Codec.dumps(msg)
+        # if msg_type == "action":
+        #     print(msg_content)
+        if self.recorder:
+            self.recorder.record(Recorder.OUTGOING, msg_json)
+        await self.ws.send_str(msg_json)
+
+    async def receive_messages(self):
+        """
+        Gets the messages that arrive from Unity through the websocket. If the message is not a 'close' message or
+        an error, it calls the function 'process_incoming_message() to process it.
+        """
+        from aiohttp import WSMsgType
+        try:
+            # With this loop, we will repeatedly await the next value produced by iterating over self.ws.
+            # At each iteration, the event loop will suspend execution until a new value becomes available
+            # from self.ws. The loop continues iterating over self.ws till the websocket is closed.
+            async for msg in self.ws:
+                if msg.type == WSMsgType.TEXT:
+                    # print(f"MESSAGE: {msg}")
+                    if self.recorder:
+                        self.recorder.record(Recorder.INCOMING, msg.data)
+                    self.process_incoming_message(msg.data, time.perf_counter())
+                elif msg.type == WSMsgType.BINARY:
+                    # Binary sensor frame (Misc.sensor_binary)
+                    if self.recorder:
+                        self.recorder.record(Recorder.INCOMING, msg.data)
+                    self.process_incoming_message(msg.data, time.perf_counter())
+                elif msg.type == WSMsgType.CLOSED:
+                    print("Connection closed by Unity")
+                    break
+                elif msg.type == WSMsgType.ERROR:
+                    print(f"WebSocket connection closed with error: {self.ws.exception()}")
+                    break
+        except Exception as e:
+            print(f"Connection failed: {e}")
+        finally:
+            print("Finishing receive_messages")
+            self.exit_event.set()
+
+    def process_incoming_message(self, msg_data, arrival: float = None):
+        """
+        Processes the message 'msg_data' received from Unity. It is expected to be in json format.
+        It is decoded with the fastest codec available (see Codec.py).
+        :param msg_data: Message received in json format (str) or binary sensor frame (bytes, see BinaryFrame.py).
+        :param arrival: time.perf_counter() when the message arrived (now if None)
+        """
+        try:
+            if isinstance(msg_data, bytes):
+                msg_type, msg_content = "sensor_binary", msg_data
+            else:
+                msg_type, msg_content = Codec.decode_message(msg_data)
+
+            if msg_type == "sensor" or msg_type == "sensor_delta" or msg_type == "sensor_binary":
+                if msg_type == "sensor":
+                    self.rc_sensor.set_perception(msg_content[0])
+                    self.i_state.update_internal_state(msg_content[0], msg_content[1])
+                elif msg_type == "sensor_delta":
+                    # Only the changes since the previous frame, applied in place
+                    self.rc_sensor.set_perception(msg_content["rays"])
+                    self.i_state.apply_delta(self.rc_sensor.perception() if active_tk_gui else msg_content["rays"],
+                                             msg_content["state"])
+                else:
+                    # Decoded straight into the sensor arrays and the internal state
+                    if self.frame_decoder is None:
+                        self.frame_decoder = BinaryFrame.FrameDecoder()
+                    self.frame_decoder.decode(msg_content, self.rc_sensor, self.i_state, active_tk_gui)
+                self.sensor_frame_count += 1
+                self.sensor_frame_time = arrival if arrival is not None else time.perf_counter()
+                self.sensor_frame_event.set()
+            elif msg_type == "sim_control":
+                if msg_content == "connection_ready":
+                    self.connection_ready = True
+                    self.connection_ready_event.set()
+                elif msg_content == "on_hold":
+                    self.set_simulation_state(self.ON_HOLD)
+                    # print("ON HOLD")
+                elif msg_content == "start":
+                    self.set_simulation_state(self.RUNNING)
+                    # print("RUNNING")
+                elif msg_content == "error":
+                    print("Error creating the agent in Unity.")
+                    self.exit_event.set()
+                else:
+                    print("Received unknown message - Type: " + msg_type + "- Content: " + msg_content)
+            elif msg_type == "agent_control":
+                # These kind of messages have the format
+                # command:data
+                try:
+                    command, data = msg_content.split(":")
+                    if command == "action":
+                        if self.currentBT:  # If there is a BT running
+                            self.bts[self.currentBT].stop_behaviour_tree()
+                            self.currentBT = None
+                        if self.currentGoal:  # If there is a single Goal running
+                            self.currentGoal = None
+                        self.queue_action(data)
+                    elif command == "goal":
+                        self.queue_action("stop")  # Just in case there is translation action running
+                        self.queue_action("nt")  # Just in case there is rotation action running
+                        if self.currentBT:  # If there is a BT running
+                            self.bts[self.currentBT].stop_behaviour_tree()
+                            self.currentBT = None
+                        self.currentGoal = data
+                        self.work_event.set()
+                    elif command == "bt":
+                        self.queue_action("stop")  # Just in case there is an action running
+                        self.queue_action("nt")  # Just in case there is rotation action running
+                        if self.currentGoal:  # If there is a single Goal running
+                            self.currentGoal = None
+                        self.currentBT = data
+                        self.work_event.set()
+                    else:
+                        print("Agent_control message with an unknown command: " + msg_content)
+                except Exception as e:
+                    print(f"Exception1: {e}")
+                    print(f"Message: {msg_data}")
+            else:
+                print("Received unknown message - Type: " + msg_type + "- Content: " + msg_content)
+        except Codec.DecodeError:
+            print(f"Failed JSON decoding of the received message: {msg_data}")
+        except Exception as e:
+            print(f"Exception2: {e}")
+            raise e
+
+    def set_simulation_state(self, state):
+        """
+        Changes the state of the simulation (ON_HOLD | RUNNING) and wakes up the main loop if it is waiting for it.
+        """
+        self.simulation_state = state
+        if state == self.RUNNING:
+            self.running_event.set()
+        else:
+            self.running_event.clear()
+
+    def queue_action(self, action: str):
+        """
+        Adds a single action to the queue of pending actions and wakes up the main loop if it is idle.
+        """
+        if self.action_filter:
+            self.action_filter.merge_pending(self.pendingActions, action)
+        else:
+            self.pendingActions.append(action)
+        self.work_event.set()
+
+    async def wait_for(self, event: asyncio.Event):
+        """
+        Waits, without consuming CPU, till 'event' is set or the agent has to exit.
+        """
+        if event.is_set() or self.exit_event.is_set():
+            return
+        waiters = [asyncio.create_task(event.wait()), asyncio.create_task(self.exit_event.wait())]
+        try:
+            await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    async def wait_tick(self, period=0.1):
+        """
+        Waits till the active behaviour tree can be ticked again.
+        In "frame" mode it waits for a sensor frame newer than the one of the previous tick (at most
+        'bt_tick_timeout' seconds) without ticking faster than 'bt_max_tick_rate'.
+        In "fixed" mode it just waits 'period' seconds.
+        """
+        if self.bt_tick_mode != "frame":
+            await asyncio.sleep(period)
+            self.record_tick()
+            return
+        loop = asyncio.get_running_loop()
+        elapsed = loop.time() - self.last_tick_time
+        if elapsed < self.bt_min_tick_interval:
+            await asyncio.sleep(self.bt_min_tick_interval - elapsed)
+        if self.sensor_frame_count == self.ticked_frame_count:
+            self.sensor_frame_event.clear()
+            try:
+                await asyncio.wait_for(self.wait_for(self.sensor_frame_event), self.bt_tick_timeout)
+            except asyncio.TimeoutError:
+                pass  # No fresh frame, tick anyway so the tree notices finished goals
+        self.ticked_frame_count = self.sensor_frame_count
+        self.last_tick_time = loop.time()
+        self.record_tick()
+
+    def record_tick(self):
+        """
+        The behaviour tree is about to be ticked: records the age of the frame it is going to see
+        """
+        if self.latency and self.sensor_frame_time is not None:
+            self.latency.record("frame_to_tick", self.sensor_frame_time)
+        self.mark_decision()
+
+    def mark_decision(self):
+        """
+        Marks the last sensor frame as the one the next actions are decided on (see Latency.py). Called before every
+        behaviour tree tick (the tasks created during the tick inherit it) and by the goals when they look at the
+        sensors again.
+        """
+        Latency.decision_frame.set(self.sensor_frame_time)
+
+    def print_log(self):
+        """
+        Prints the last log records of the agent, e.g. after an error
+        """
+        if self.log.records:
+            print(f"Last log records of {self.log.name}:\n{self.log.dump()}")
+
+    async def main_loop(self):
+        # Keep going while there is not an event to exit
+        while not self.exit_event.is_set():
+            # Control if we are on hold (simulation paused from Unity)
+            if self.simulation_state == self.ON_HOLD:
+                # Wait till Unity starts (or resumes) the simulation. Other tasks keep running meanwhile
+                await self.wait_for(self.running_event)
+            else:
+                # Here is where we perform the agent actions
+                # It can be the case we are executing a single action, a simple goal or a behaviour tree
+                try:
+                    if len(self.pendingActions) > 0:
+                        # Single action, not decided on a sensor frame
+                        Latency.decision_frame.set(None)
+                        await self.send_message("action", self.pendingActions.popleft())
+                    elif self.currentGoal:
+                        # We are running a simple goal
+                        await self.goals[self.currentGoal].run()
+                    elif self.currentBT:
+                        # We are running a behaviour tree
+                        await self.bts[self.currentBT].tick()
+                    else:
+                        # Nothing to do: wait till an action, a goal or a behaviour tree is assigned
+                        self.work_event.clear()
+                        await self.wait_for(self.work_event)
+                except Exception as e:
+                    print("Execution failed.")
+                    print(f"Exception3: {e}")
+                    self.print_log()
+                    self.exit_event.set()
+        print("Finishing main_loop")
+
+    async def connect(self):
+        """
+        Opens the connection with Unity and waits for its "connection_ready" ack.
+        :return: True if the connection is ready, False if the agent has to exit
+        """
+        # Create the connection task, that will manage the connection with Unity,
+        # and the exit_event task, that will be used to exit if there is an error
+        connect_task = asyncio.create_task(self.open_websocket())
+        awaited_exit_event = asyncio.create_task(self.exit_event.wait())
+
+        # Wait for the connection with Unity to be ready or the exit event, what comes first
+        await asyncio.wait([connect_task, awaited_exit_event], return_when=asyncio.FIRST_COMPLETED)
+        awaited_exit_event.cancel()
+
+        if self.exit_event.is_set():
+            connect_task.cancel()
+            return False
+        # Now that the connection is established, create the task to start receiving messages from Unity
+        # We are not awaiting this task because it has to run forever till the main loop finishes
+        self.receive_task = asyncio.create_task(self.receive_messages())
+        # Wait for the flag "connection_ready" to be True. If it is true, it means we have received an ack
+        # from Unity saying that the connection is fully established and Unity is ready to receive messages
+        await self.wait_for(self.connection_ready_event)
+        return self.connection_ready_event.is_set()
+
+    async def run(self, connect_limiter=None):
+        """
+        :param connect_limiter: Optional async context manager that paces the connections of many agents
+        (see Spawner.ConnectionLimiter). It is held while connecting, until Unity acknowledges the connection.
+        """
+        # The tasks of the agent inherit the context, so their log records go to the ring of the agent
+        Log.agent_log.set(self.log)
+        try:
+            if connect_limiter is None:
+                ready = await self.connect()
+            else:
+                async with connect_limiter:
+                    ready = await self.connect()
+
+            if ready:
+                print("Connection with Unity fully established")
+
+                # We are ready now  to start the main loop of the agent
+                await self.main_loop()
+        except KeyboardInterrupt:
+            print("\nKeyboardInterrupt received! Initiating shutdown...")
+            self.exit_event.set()
+        except Exception as e:
+            print(f"Unexpected error: {e}")
+            self.print_log()
+            self.exit_event.set()
+        finally:
+            if self.action_filter:
+                print(self.action_filter.summary())
+            print(f"Goals {self.goals.report()}\nBehaviour trees {self.bts.report()}")
+            if self.goal_runner:
+                print(self.goal_runner.report())
+            if self.latency and self.latency_report:
+                print(self.latency.report(self.AgentParameters["name"]))
+            # Clean the websocket connection
+            await self.close_websocket()
+            if self.recorder:
+                self.recorder.close()
+                print(f"Session recorded in {self.recorder.path} ({self.recorder.records} messages)")
+            print("Connection with Unity closed")
+
+# Agent TK GUI
+def run_tk(aa_name):
+    app = AAgentInterface(aa_name)
+    app.start()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python AAgent_BT.py <init_file.json>")
+    else:
+        # Get the name of the file with the initial parameters
+        init_file = sys.argv[1]
+
+        # Creates an instance of the AAgent_Python class.
+        my_AAgent = AAgent(init_file)
+
+        # Agent TK GUI
+        # Start the python gui monitor interface
+        if my_AAgent.python_gui_monitor:
+            agent_name = my_AAgent.AgentParameters["name"]
+            active_tk_gui = True
+            tk_thread = Thread(target=run_tk, args=(agent_name,))
+            tk_thread.start()
+
+        if my_AAgent.latency:
+            Latency.dump_on_signal(lambda: my_AAgent.latency.report(my_AAgent.AgentParameters["name"]))
+
+        # Run the AAgent. It creates a new event loop, runs the my_AAgent.run()
+        # coroutine in that event loop, and then closes the event loop when the coroutine completes.
+        asyncio.run(my_AAgent.run())
+
+        if my_AAgent.bt_profiler:
+            print(my_AAgent.bt_profiler.table(my_AAgent.AgentParameters["name"]))
+
+        # Close the agent TK GUI
+        if my_AAgent.python_gui_monitor:
+            active_tk_gui = False
+            exit_gui = True
+            tk_thread.join()
+
+        print("Bye!!!")
@@ -0,0 +1,115 @@
+import time
+
+'''
+Semantic filter of the actions sent to Unity.
+● Knows the current motion of the agent: the last motion command sent (during a short window, while Unity has
+  not reported it yet) or the InternalState (movingForwards, movingBackwards, isRotatingRight, isRotatingLeft).
+● Suppresses the actions that would not change it (e.g. "nt" when the agent is not rotating, "mf" when it is
+  already moving forwards). "stop" is always sent: it is the way out when the state is wrong, and it also has to
+  stop a rotation.
+● Merges self-cancelling actions that are still waiting in the queue of pending actions (e.g. "tl" followed
+  by "tr" is just "tr"). A pending "stop" is never replaced: the agent must actually stop.
+'''
+
+# Motion actions: translation (1 forwards, -1 backwards, 0 stopped) and rotation (1 right, -1 left, 0 none)
+TRANSLATION_ACTIONS = {"mf": 1, "mb": -1, "ntm": 0, "stop": 0}
+ROTATION_ACTIONS = {"tr": 1, "tl": -1, "nt": 0}
+
+
+def axis(action):
+    """
+    :return: "translation", "rotation" or None if 'action' is not a motion action
+    """
+    if action in TRANSLATION_ACTIONS:
+        return "translation"
+    if action in ROTATION_ACTIONS:
+        return "rotation"
+    return None
+
+
+class ActionFilter:
+    UNKNOWN = None
+
+    def __init__(self, i_state, window=0.25):
+        """
+        :param i_state: InternalState of the agent
+        :param window: seconds during which the last command sent is trusted over the InternalState
+        """
+        self.i_state = i_state
+        self.window = window
+        self.translation = self.UNKNOWN
+        self.translation_time = float("-inf")
+        self.rotation = self.UNKNOWN
+        self.rotation_time = float("-inf")
+        # Counters
+        self.sent = 0
+        self.suppressed = 0
+        self.merged = 0
+
+    def current_translation(self, now):
+        if now - self.translation_time < self.window:
+            return self.translation
+        if self.i_state.onRoute:  # Moved by the NavMesh system, the flags do not tell the whole story
+            return self.UNKNOWN
+        if self.i_state.movingForwards:
+            return 1
+        if self.i_state.movingBackwards:
+            return -1
+        return 0
+
+    def current_rotation(self, now):
+        if now - self.rotation_time < self.window:
+            return self.rotation
+        if self.i_state.isRotatingRight:
+            return 1
+        if self.i_state.isRotatingLeft:
+            return -1
+        return 0
+
+    def accept(self, action):
+        """
+        Decides if 'action' has to be sent and, if so, records the motion it commands.
+        :return: False if the action would not change the motion of the agent
+        """
+        now = time.monotonic()
+        if action == "stop":
+            # Always sent. The agent stops moving, and may or may not stop rotating
+            self.translation = 0
+            self.rotation = self.UNKNOWN
+            self.translation_time = self.rotation_time = now
+        elif action in TRANSLATION_ACTIONS:
+            target = TRANSLATION_ACTIONS[action]
+            if self.current_translation(now) == target:
+                self.suppressed += 1
+                return False
+            self.translation = target
+            self.translation_time = now
+        elif action in ROTATION_ACTIONS:
+            target = ROTATION_ACTIONS[action]
+            if self.current_rotation(now) == target:
+                self.suppressed += 1
+                return False
+            self.rotation = target
+            self.rotation_time = now
+        else:
+            # Other actions (collect, walk_to, teleport_to...) can change the motion: do not assume anything
+            self.translation = self.rotation = self.UNKNOWN
+            self.translation_time = self.rotation_time = now
+        self.sent += 1
+        return True
+
+    def merge_pending(self, pending_actions, action):
+        """
+        Adds 'action' to the deque of pending actions, replacing the last one if both act on the same motion axis
+        (the last one would be cancelled by 'action' right after being sent), unless the last one is a "stop".
+        """
+        action_axis = axis(action)
+        if pending_actions and action_axis is not None and axis(pending_actions[-1]) == action_axis \
+                and pending_actions[-1] != "stop":
+            pending_actions[-1] = action
+            self.merged += 1
+        else:
+            pending_actions.append(action)
+
+    def summary(self):
+        return f"Actions sent: {self.sent}  suppressed: {self.suppressed}  merged: {self.merged}"
@@ -6,7 +6,7 @@ import asyncio
 import py_trees as pt
 from py_trees import common
 import Goals_BT
-import Sensors
+import Log
 
 '''
 Behavior:
@@ -22,6 +22,9 @@ Behavior:
     to speed up the process (since the return trip in this scenario is always safe).
 '''
 
+log = Log.get_logger(__name__)
+
+
 # Node: Check if inventory is full
 class BN_CheckInventoryFull(pt.behaviour.Behaviour):
     def __init__(self, aagent):
@@ -30,12 +33,12 @@ class BN_CheckInventoryFull(pt.behaviour.Behaviour):
 
     def update(self):
         # Check if the inventory is full (amount >= 2
-        print("START OF BEHAVIOR TREE")
+        log.debug("START OF BEHAVIOR TREE")
         # print('Checking inventory...')
         for item in self.my_agent.i_state.myInventoryList:
             # print(item["name"], item["amount"])
             if item["name"] == "AlienFlower" and item["amount"] >= 2:
-                print("Inventory full")
+                log.debug("Inventory full")
                 return pt.common.Status.SUCCESS
         return pt.common.Status.FAILURE
 
@@ -51,7 +54,7 @@ class BN_GoToBase(pt.behaviour.Behaviour):
 
     def update(self):
         if self.my_agent.i_state.currentNamedLoc == "Base" and self.my_agent.i_state.onRoute == False:
-            print('Reached base. SUCCESS')
+            log.info('Reached base. SUCCESS')
             return pt.common.Status.SUCCESS
         else:
             #print('running to base...')
@@ -78,9 +81,9 @@ class BN_UnloadFlowers(pt.behaviour.Behaviour):
         else:
             for item in self.my_agent.i_state.myInventoryList:
                 if item["name"] == "AlienFlower":
-                    print('failure unloading flowers...')# in case there are still flowers in the inventory return failure
+                    log.info('failure unloading flowers...')# in case there are still flowers in the inventory return failure
                     return pt.common.Status.FAILURE
-            print('Unloaded flowers. SUCCESS')
+            log.info('Unloaded flowers. SUCCESS')
             return pt.common.Status.SUCCESS
 
     def terminate(self, new_status: common.Status):
@@ -95,16 +98,13 @@ class BN_DetectFlower(pt.behaviour.Behaviour):
         self.my_agent = aagent
 
     def update(self):
-        sensor_info = self.my_agent.rc_sensor.sensor_rays[Sensors.RayCastSensor.OBJECT_INFO]
-        for i in range(len(sensor_info)):
-            if sensor_info[i] and sensor_info[i]["tag"] == "AlienFlower":
-                print("BN_DetectFlower SUCCESS")
-                return pt.common.Status.SUCCESS
-        print("BN_DetectFlower FAILURE")
+        if self.my_agent.rc_sensor.has("AlienFlower"):
+            log.debug("BN_DetectFlower SUCCESS")
+            return pt.common.Status.SUCCESS
+        log.debug("BN_DetectFlower FAILURE")
         return pt.common.Status.FAILURE
     
     
-sensor_degree = {0:-45, 1:-22.5, 2:0, 3:22.5, 4:45}
 # Node: Turn to flower 
 class BN_TurnToFlower(pt.behaviour.Behaviour):
     def __init__(self, aagent):
@@ -113,58 +113,50 @@ class BN_TurnToFlower(pt.behaviour.Behaviour):
         self.task = None
         self.turn_angle = None
         self.new_heading = None
+        self.heading = Goals_BT.HeadingController(aagent)
 
     def initialise(self):
-        sensor_info = self.my_agent.rc_sensor.sensor_rays[Sensors.RayCastSensor.OBJECT_INFO]
-        min_distance = 10000
+        sensor = self.my_agent.rc_sensor
         turn_angle = None
 
-        for i in range(len(sensor_info)):
-            if sensor_info[i] and sensor_info[i]["tag"] == "AlienFlower":
-                if i == 2: # no turn needed. flower is in front of the astronaut
-                    print("BN_TurnToFlower: flower detected in front SUCCESS")
-                    self.new_heading = self.my_agent.i_state.rotation["y"]
-                    return pt.common.Status.SUCCESS
-                if sensor_info[i]["distance"] < min_distance:# look for the closest flower
-                    min_distance = sensor_info[i]["distance"]
-                    turn_angle = sensor_degree[i]# get the angle to turn to flower based on the sensor index
+        if sensor.center_ray in sensor.rays_with("AlienFlower"): # no turn needed. flower is in front of the astronaut
+            log.debug("BN_TurnToFlower: flower detected in front SUCCESS")
+            self.new_heading = self.my_agent.i_state.rotation["y"]
+            self.heading.start(self.new_heading)
+            return pt.common.Status.SUCCESS
+        closest_flower = sensor.nearest("AlienFlower")# look for the closest flower
+        if closest_flower:
+            turn_angle = closest_flower.angle# get the angle to turn to flower based on the ray that hits it
 
         if turn_angle is not None:
             current_heading = self.my_agent.i_state.rotation["y"]
             self.new_heading = (current_heading + turn_angle) % 360
 
             if turn_angle > 0:
-                print(f"TR_Turning to flower at angle {turn_angle}")
-                self.task = asyncio.create_task(self.my_agent.send_message("action", "tr"))
+                log.debug("TR_Turning to flower at angle %s", turn_angle)
             else:
-                print(f"TL_Turning to flower at angle {turn_angle}")
-                self.task = asyncio.create_task(self.my_agent.send_message("action", "tl"))
+                log.debug("TL_Turning to flower at angle %s", turn_angle)
+            self.heading.send(self.heading.start(self.new_heading))
         else:
-            print("No flower found to turn to.")
+            log.debug("No flower found to turn to.")
             self.task = None
             self.new_heading = None  # Important fallback
 
     def update(self):
-        def angle_difference(a, b):
-            diff = (a - b + 180) % 360 - 180
-            return abs(diff)
-
         if self.new_heading is None:
             return pt.common.Status.FAILURE  # No target
 
-        current_heading = self.my_agent.i_state.rotation["y"]
-        if angle_difference(current_heading, self.new_heading) < 5:
-            print('Turned to flower. SUCCESS')
-            self.task = asyncio.create_task(self.my_agent.send_message("action", "nt"))
+        self.heading.send(self.heading.update())
+        if self.heading.done:
+            log.info('Turned to flower. SUCCESS')
             return pt.common.Status.SUCCESS
         
         # print('Turning to flower... RUNNING')
         return pt.common.Status.RUNNING
 
     def terminate(self, new_status: common.Status):
-        if self.task and not self.task.done():
-            self.task.cancel()
-        self.task = None
+        # Stops the turn if the node is interrupted (if it succeeded, the stop is already sent)
+        self.heading.send(self.heading.stop())
 
 # Node: Move to flower (move forward)
 class BN_MoveToFlower(pt.behaviour.Behaviour):
@@ -172,40 +164,30 @@ class BN_MoveToFlower(pt.behaviour.Behaviour):
         super().__init__("MoveToFlower")
         self.my_agent = aagent
         self.task = None  
+        self.runner = Goals_BT.goal_runner(aagent)
 
     def initialise(self):
-        sensor_info = self.my_agent.rc_sensor.sensor_rays[Sensors.RayCastSensor.OBJECT_INFO]
-        closest_flower = None
-        min_distance = float('inf')
-        
-        self.task = asyncio.create_task(self.my_agent.send_message("action", "nt"))
-        for i in range(len(sensor_info)):
-            if sensor_info[i] and sensor_info[i]["tag"] == "AlienFlower":
-                if sensor_info[i]["distance"] < min_distance: #choose the closest flower
-                    min_distance = sensor_info[i]["distance"]
-                    closest_flower = sensor_info[i]
+        closest_flower = self.my_agent.rc_sensor.nearest("AlienFlower") #choose the closest flower
 
         if closest_flower:
-            self.task = asyncio.create_task(Goals_BT.ForwardDist(self.my_agent, min_distance, 1, 100).run())
+            min_distance = closest_flower.distance
+            self.runner.start(self, Goals_BT.ForwardDist, min_distance, 1, 100, pre_actions=("nt",))
             # print(f"Moving to flower at distance {min_distance}")
         else:
-            print("No flower found to move to.")
+            log.debug("No flower found to move to.")
+            self.task = asyncio.create_task(self.my_agent.send_message("action", "nt"))
 
     def update(self):
-        if not self.task:
-            return pt.common.Status.FAILURE
-        if not self.task.done():
+        status = self.runner.status(self)
+        if status == Goals_BT.GoalRunner.RUNNING:
             return pt.common.Status.RUNNING
-        if self.task.exception():
-            print(f"Exception while moving to flower: {self.task.exception()}")
+        if status == Goals_BT.GoalRunner.ERROR:  # No flower, or the goal failed
             return pt.common.Status.FAILURE
-        print(f"BN_MoveToFlower SUCCESS")
+        log.info("BN_MoveToFlower SUCCESS")
         return pt.common.Status.SUCCESS
 
     def terminate(self, new_status: common.Status):
-        if self.task and not self.task.done():
-            self.task.cancel()
-        self.task = None
+        self.runner.cancel(self)
 
 # Node: Collect flower (action: collect)                       
 class BN_CollectFlower(pt.behaviour.Behaviour):
@@ -222,7 +204,7 @@ class BN_CollectFlower(pt.behaviour.Behaviour):
             return pt.common.Status.FAILURE
         if not self.collect_task.done():
             return pt.common.Status.RUNNING
-        print(f"BN_CollectFlower SUCCESS")
+        log.info("BN_CollectFlower SUCCESS")
         return pt.common.Status.SUCCESS
 
     def terminate(self, new_status: common.Status):
@@ -234,28 +216,26 @@ class BN_Wander(pt.behaviour.Behaviour):
     def __init__(self, aagent):
         super().__init__("Wander")
         self.my_agent = aagent
-        self.wander_task = None
+        self.runner = Goals_BT.goal_runner(aagent)
         self.is_wandering = False
 
     def initialise(self):
         if not self.is_wandering:
-            self.wander_task = asyncio.create_task(Goals_BT.Avoid(self.my_agent).run())
+            self.runner.start(self, Goals_BT.Avoid)
             self.is_wandering = True
             # print("Started wandering")
 
     def update(self):
-        sensor_info = self.my_agent.rc_sensor.sensor_rays[Sensors.RayCastSensor.OBJECT_INFO]
-        for i in range(len(sensor_info)):
-            if sensor_info[i] and sensor_info[i]["tag"] == "AlienFlower":
-                print("Flower detected during wandering! Returning SUCCESS.")
-                return pt.common.Status.SUCCESS  # Exit wander and move to detect+collect
+        if self.my_agent.rc_sensor.has("AlienFlower"):
+            log.debug("Flower detected during wandering! Returning SUCCESS.")
+            return pt.common.Status.SUCCESS  # Exit wander and move to detect+collect
         if not self.is_wandering:
             self.initialise()
         return pt.common.Status.RUNNING  # Keep wandering
 
     def terminate(self, new_status: common.Status):
-        if self.wander_task and not self.wander_task.done():
-            self.wander_task.cancel()
+        if self.runner.status(self) == Goals_BT.GoalRunner.RUNNING:
+            self.runner.cancel(self)
             # print("Stopped wandering")
         self.is_wandering = False
 
@@ -300,10 +280,10 @@ class BTAstronautAlone:
 
     async def tick(self):
         try:
+            await self.aagent.wait_tick()  # Wait for a fresh sensor frame (or 0.1s in fixed mode)
             self.behaviour_tree.tick()
-            await asyncio.sleep(0.1)  # Small delay to prevent CPU overload
         except Exception as e:
-            print(f"Error in behavior tree tick: {e}")
+            log.error("Error in behavior tree tick: %s", e)
             raise
 
     def stop_behaviour_tree(self):
@@ -6,6 +6,7 @@ import asyncio
 import py_trees as pt
 from py_trees import common
 import Goals_BT
+import Log
 import Sensors
 
 '''
@@ -25,6 +26,9 @@ Behavior:
 but now with an added requirement: active avoidance of the Critters.
 '''
 
+log = Log.get_logger(__name__)
+
+
 # Node: Detect frozen state
 class BN_DetectFrozen(pt.behaviour.Behaviour):
     def __init__(self, aagent):
@@ -36,7 +40,7 @@ class BN_DetectFrozen(pt.behaviour.Behaviour):
         pass
     def update(self):
         if self.my_agent.i_state.isFrozen == True:
-            print('Frozen branch. astronaut is frozen!!!')
+            log.debug('Frozen branch. astronaut is frozen!!!')
             return pt.common.Status.SUCCESS
         return pt.common.Status.FAILURE
     def terminate(self, new_status: common.Status):
@@ -47,18 +51,21 @@ class BN_DoNothing(pt.behaviour.Behaviour):
     def __init__(self, aagent):
         super().__init__("DoNothing")
         self.my_agent = aagent
-        self.task = None  
+        self.runner = Goals_BT.goal_runner(aagent)
 
     def initialise(self):
-        self.task = asyncio.create_task(Goals_BT.DoNothing(self.my_agent).run())
+        self.runner.start(self, Goals_BT.DoNothing)
 
     def update(self):
-        if self.task.done():
-            print("DoNothing task completed.")
+        if self.runner.status(self) != Goals_BT.GoalRunner.RUNNING:
+            log.debug("DoNothing task completed.")
             return pt.common.Status.SUCCESS
         # print("Doint nothing... RUNNING")
         return pt.common.Status.RUNNING  
 
+    def terminate(self, new_status: common.Status):
+        self.runner.cancel(self)
+
 # Node: Detect Critter nearby
 class BN_DetectCritter(pt.behaviour.Behaviour):
     def __init__(self, aagent):
@@ -66,12 +73,10 @@ class BN_DetectCritter(pt.behaviour.Behaviour):
         self.my_agent = aagent
 
     def update(self):
-        sensor_info = self.my_agent.rc_sensor.sensor_rays[Sensors.RayCastSensor.OBJECT_INFO]
-        for i in range(len(sensor_info)):
-            if sensor_info[i] and sensor_info[i]["tag"] == "CritterMantaRay":
-                print("BN_DetectCritter SUCCESS")
-                return pt.common.Status.SUCCESS
-        print("BN_DetectCritter FAILURE")
+        if self.my_agent.rc_sensor.has("CritterMantaRay"):
+            log.debug("BN_DetectCritter SUCCESS")
+            return pt.common.Status.SUCCESS
+        log.debug("BN_DetectCritter FAILURE")
         return pt.common.Status.FAILURE
 
 # Node: Move away from Critter (move backward)
@@ -80,31 +85,28 @@ class BN_MoveAwayFromCritter(pt.behaviour.Behaviour):
         super().__init__("BN_MoveAwayFromCritter")
         self.my_agent = aagent
         self.task = None  
+        self.runner = Goals_BT.goal_runner(aagent)
 
     def initialise(self):
         distance = 6
-        self.task = asyncio.create_task(self.my_agent.send_message("action", "nt"))
-        self.task = asyncio.create_task(Goals_BT.BackwardDist(self.my_agent, distance, 1, 100).run())
+        self.runner.start(self, Goals_BT.BackwardDist, distance, 1, 100, pre_actions=("nt",))
 
     def update(self):
         if self.my_agent.i_state.isFrozen:
-            print('Frozen...')
-            return pt.common.Status.FAILURE
-        if not self.task:
+            log.debug('Frozen...')
             return pt.common.Status.FAILURE
-        if not self.task.done():
+        status = self.runner.status(self)
+        if status == Goals_BT.GoalRunner.RUNNING:
             return pt.common.Status.RUNNING
-        if self.task.exception():
-            print(f"Exception while moving away from critter: {self.task.exception()}")
+        if status == Goals_BT.GoalRunner.ERROR:
             return pt.common.Status.FAILURE
-        print("Astronaut moved away from critter. SUCCESS")
+        log.info("Astronaut moved away from critter. SUCCESS")
         self.task = asyncio.create_task(self.my_agent.send_message("action", "stop"))
         return pt.common.Status.SUCCESS
 
     def terminate(self, new_status: common.Status):
-        if self.task and not self.task.done():
-            self.task.cancel()
-        self.task = None    
+        # The stop sent on success is not cancelled
+        self.runner.cancel(self)
     
 # Node: Turn away from Critter (turn left or right)
 class BN_TurnAwayFromCritter(pt.behaviour.Behaviour):
@@ -114,43 +116,36 @@ class BN_TurnAwayFromCritter(pt.behaviour.Behaviour):
         self.task = None
         self.turn_angle = None
         self.new_heading = None
+        self.heading = Goals_BT.HeadingController(aagent)
 
     def initialise(self):
-        current_heading = int(self.my_agent.i_state.rotation["y"])
-        self.task = asyncio.create_task(self.my_agent.send_message("action", "nt"))
+        current_heading = self.my_agent.i_state.rotation["y"]
 
         self.turn_angle = 60 
         sensor_hits = self.my_agent.rc_sensor.sensor_rays[Sensors.RayCastSensor.HIT]
-        # check sensor hits for a better performance
+        # check sensor hits for a better performance (the controller turns right for +60 and left for -60)
         if sensor_hits[0] == 1 or  sensor_hits[1] == 1 or sensor_hits[2] == 1: # left side blocked
             self.new_heading = (current_heading + self.turn_angle) % 360
-            self.task = asyncio.create_task(self.my_agent.send_message("action", "tr"))
         elif sensor_hits[3] == 1 or sensor_hits[4] == 1: #right side blocked
             self.new_heading = (current_heading - self.turn_angle) % 360
-            self.task = asyncio.create_task(self.my_agent.send_message("action", "tl"))
         else: # no side blocked. turn left
             self.new_heading = (current_heading - self.turn_angle) % 360
-            self.task = asyncio.create_task(self.my_agent.send_message("action", "tl"))
+        self.heading.send(self.heading.start(self.new_heading))
 
     def update(self):
-        def angle_difference(a, b):
-            diff = (a - b + 180) % 360 - 180
-            return abs(diff)
-        current_heading = self.my_agent.i_state.rotation["y"]
-        if angle_difference(current_heading, self.new_heading) < 5:
-            print('Turned away from critter. SUCCESS')
-            self.task = asyncio.create_task(self.my_agent.send_message("action", "nt"))
+        self.heading.send(self.heading.update())
+        if self.heading.done:
+            log.info('Turned away from critter. SUCCESS')
             return pt.common.Status.SUCCESS
         if self.my_agent.i_state.isFrozen:
-            print('Agent frozen during turn away from critter... FAILURE')
+            log.debug('Agent frozen during turn away from critter... FAILURE')
             return pt.common.Status.FAILURE
         # print('Turning away from critter... RUNNING')
         return pt.common.Status.RUNNING
 
     def terminate(self, new_status: common.Status):
-        if self.task and not self.task.done():
-            self.task.cancel()
-        self.task = None
+        # Stops the turn if the node is interrupted (if it succeeded, the stop is already sent)
+        self.heading.send(self.heading.stop())
 
 # Node: Leave Critter (move away from critter by moving forward)
 class BN_LeaveCritter(pt.behaviour.Behaviour):
@@ -158,35 +153,38 @@ class BN_LeaveCritter(pt.behaviour.Behaviour):
         super().__init__("MoveAwayCritter")
         self.my_agent = aagent
         self.task = None  
+        self.runner = Goals_BT.goal_runner(aagent)
+        self.failed = False  # Front blocked when initialised (py_trees ignores the status returned by initialise)
 
     def initialise(self): 
-        self.task = asyncio.create_task(self.my_agent.send_message("action", "nt"))
+        self.failed = False
         sensor_hits = self.my_agent.rc_sensor.sensor_rays[Sensors.RayCastSensor.HIT]
         if sensor_hits[2] == 1: #check if the front is blocked to avoid getting stuck
-            print('something on front. failure moving away from critter')
-            return pt.common.Status.FAILURE  
-        self.task = asyncio.create_task(Goals_BT.ForwardDist(self.my_agent, 4, 1, 100).run())
+            log.debug('something on front. failure moving away from critter')
+            self.task = asyncio.create_task(self.my_agent.send_message("action", "nt"))
+            self.failed = True  # No goal started
+            return
+        self.runner.start(self, Goals_BT.ForwardDist, 4, 1, 100, pre_actions=("nt",))
        
     def update(self):
+        if self.failed:
+            return pt.common.Status.FAILURE
+
         #check if the agent is frozen
         if self.my_agent.i_state.isFrozen: 
-            print('Frozen...')
+            log.debug('Frozen...')
             return pt.common.Status.FAILURE
         
-        if not self.task:
-            return pt.common.Status.FAILURE
-        if not self.task.done():
+        status = self.runner.status(self)
+        if status == Goals_BT.GoalRunner.RUNNING:
             return pt.common.Status.RUNNING
-        if self.task.exception():
-            print(f"Exception while moving away from critter: {self.task.exception()}")
+        if status == Goals_BT.GoalRunner.ERROR:
             return pt.common.Status.FAILURE
-        print(f"BN_LeaveCritter SUCCESS")
+        log.info("BN_LeaveCritter SUCCESS")
         return pt.common.Status.SUCCESS
 
     def terminate(self, new_status: common.Status):
-        if self.task and not self.task.done():
-            self.task.cancel()
-        self.task = None
+        self.runner.cancel(self)
 
 # Node: Check if inventory is full
 class BN_CheckInventoryFull(pt.behaviour.Behaviour):
@@ -197,9 +195,9 @@ class BN_CheckInventoryFull(pt.behaviour.Behaviour):
     def update(self):
         # Check if the inventory is full (amount >= 2
         for item in self.my_agent.i_state.myInventoryList:
-            print(item["name"], item["amount"])
+            log.debug("%s %s", item["name"], item["amount"])
             if item["name"] == "AlienFlower" and item["amount"] >= 2:
-                print("Inventory full")
+                log.debug("Inventory full")
                 return pt.common.Status.SUCCESS
         return pt.common.Status.FAILURE
 
@@ -210,16 +208,16 @@ class BN_GoToBase(pt.behaviour.Behaviour):
         self.task = None
 
     def initialise(self):
-        print('Going to base')
+        log.info('Going to base')
         # Start the task to walk to the base
         self.task = asyncio.create_task(self.my_agent.send_message("action", "walk_to,Base"))
 
     def update(self):
         if self.my_agent.i_state.isFrozen == True:
-            print('Frozen while going to base...') #astronaut loses one flower when frozen. 
+            log.debug('Frozen while going to base...') #astronaut loses one flower when frozen. 
             return pt.common.Status.FAILURE
         if self.my_agent.i_state.currentNamedLoc == "Base" and self.my_agent.i_state.onRoute == False: #astronaut in base and not going to target location
-            print('Reached base. SUCCESS')
+            log.info('Reached base. SUCCESS')
             return pt.common.Status.SUCCESS
         else:
             return pt.common.Status.RUNNING
@@ -241,14 +239,14 @@ class BN_UnloadFlowers(pt.behaviour.Behaviour):
 
     def update(self):
         if not self.unload_task.done():
-            print('Unloading flowers... RUNNING')
+            log.debug('Unloading flowers... RUNNING')
             return pt.common.Status.RUNNING  
         else:
             for item in self.my_agent.i_state.myInventoryList:
                 if item["name"] == "AlienFlower":  # in case there are still flowers in the inventory return failure
-                    print('failure unloading flowers...')
+                    log.info('failure unloading flowers...')
                     return pt.common.Status.FAILURE
-            print('Unloaded flowers. SUCCESS')
+            log.info('Unloaded flowers. SUCCESS')
             return pt.common.Status.SUCCESS
 
     def terminate(self, new_status: common.Status):
@@ -262,15 +260,12 @@ class BN_DetectFlower(pt.behaviour.Behaviour):
         self.my_agent = aagent
 
     def update(self):
-        sensor_info = self.my_agent.rc_sensor.sensor_rays[Sensors.RayCastSensor.OBJECT_INFO]
-        for i in range(len(sensor_info)):
-            if sensor_info[i] and sensor_info[i]["tag"] == "AlienFlower":
-                print("BN_DetectFlower SUCCESS")
-                return pt.common.Status.SUCCESS
-        print("BN_DetectFlower FAILURE")
+        if self.my_agent.rc_sensor.has("AlienFlower"):
+            log.debug("BN_DetectFlower SUCCESS")
+            return pt.common.Status.SUCCESS
+        log.debug("BN_DetectFlower FAILURE")
         return pt.common.Status.FAILURE
     
-sensor_degree = {0:-45, 1:-22.5, 2:0, 3:22.5, 4:45}
 # Node: Turn to flower 
 class BN_TurnToFlower(pt.behaviour.Behaviour):
     def __init__(self, aagent):
@@ -279,57 +274,49 @@ class BN_TurnToFlower(pt.behaviour.Behaviour):
         self.task = None
         self.turn_angle = None
         self.new_heading = None
+        self.heading = Goals_BT.HeadingController(aagent)
 
     def initialise(self):
-        sensor_info = self.my_agent.rc_sensor.sensor_rays[Sensors.RayCastSensor.OBJECT_INFO]
-        min_distance = 10000
+        sensor = self.my_agent.rc_sensor
         turn_angle = None
 
-        for i in range(len(sensor_info)):
-            if sensor_info[i] and sensor_info[i]["tag"] == "AlienFlower":
-                if i == 2: # no turn needed. flower is in front of the astronaut
-                    print("BN_TurnToFlower: flower detected in front SUCCESS")
-                    self.new_heading = self.my_agent.i_state.rotation["y"]
-                    return pt.common.Status.SUCCESS
-                if sensor_info[i]["distance"] < min_distance: # look for the closest flower
-                    min_distance = sensor_info[i]["distance"]
-                    turn_angle = sensor_degree[i] # get the angle to turn to flower based on the sensor index
+        if sensor.center_ray in sensor.rays_with("AlienFlower"): # no turn needed. flower is in front of the astronaut
+            log.debug("BN_TurnToFlower: flower detected in front SUCCESS")
+            self.new_heading = self.my_agent.i_state.rotation["y"]
+            self.heading.start(self.new_heading)
+            return pt.common.Status.SUCCESS
+        closest_flower = sensor.nearest("AlienFlower") # look for the closest flower
+        if closest_flower:
+            turn_angle = closest_flower.angle # get the angle to turn to flower based on the ray that hits it
 
         if turn_angle is not None:
             current_heading = self.my_agent.i_state.rotation["y"]
             self.new_heading = (current_heading + turn_angle) % 360
             if turn_angle > 0:
-                print(f"TR_Turning to flower at angle {turn_angle}")
-                self.task = asyncio.create_task(self.my_agent.send_message("action", "tr"))
+                log.debug("TR_Turning to flower at angle %s", turn_angle)
             else:
-                print(f"TL_Turning to flower at angle {turn_angle}")
-                self.task = asyncio.create_task(self.my_agent.send_message("action", "tl"))
+                log.debug("TL_Turning to flower at angle %s", turn_angle)
+            self.heading.send(self.heading.start(self.new_heading))
         else:
-            print("No flower found to turn to.")
+            log.debug("No flower found to turn to.")
             self.task = None
             self.new_heading = None  
 
     def update(self):
-        def angle_difference(a, b):
-            diff = (a - b + 180) % 360 - 180
-            return abs(diff)
-
         if self.new_heading is None:
             return pt.common.Status.FAILURE  # No target
 
-        current_heading = self.my_agent.i_state.rotation["y"]
-        if angle_difference(current_heading, self.new_heading) < 5:
-            print('Turned to flower. SUCCESS')
-            self.task = asyncio.create_task(self.my_agent.send_message("action", "nt"))
+        self.heading.send(self.heading.update())
+        if self.heading.done:
+            log.info('Turned to flower. SUCCESS')
             return pt.common.Status.SUCCESS
 
         # print('Turning to flower... RUNNING')
         return pt.common.Status.RUNNING
 
     def terminate(self, new_status: common.Status):
-        if self.task and not self.task.done():
-            self.task.cancel()
-        self.task = None
+        # Stops the turn if the node is interrupted (if it succeeded, the stop is already sent)
+        self.heading.send(self.heading.stop())
 
 # Node: Move to flower (move forward)
 class BN_MoveToFlower(pt.behaviour.Behaviour):
@@ -337,40 +324,30 @@ class BN_MoveToFlower(pt.behaviour.Behaviour):
         super().__init__("MoveToFlower")
         self.my_agent = aagent
         self.task = None  
+        self.runner = Goals_BT.goal_runner(aagent)
 
     def initialise(self):
-        sensor_info = self.my_agent.rc_sensor.sensor_rays[Sensors.RayCastSensor.OBJECT_INFO]
-        closest_flower = None
-        min_distance = float('inf')
-        
-        self.task = asyncio.create_task(self.my_agent.send_message("action", "nt"))
-        for i in range(len(sensor_info)):
-            if sensor_info[i] and sensor_info[i]["tag"] == "AlienFlower":
-                if sensor_info[i]["distance"] < min_distance: #choose the closest flower
-                    min_distance = sensor_info[i]["distance"]
-                    closest_flower = sensor_info[i]
+        closest_flower = self.my_agent.rc_sensor.nearest("AlienFlower") #choose the closest flower
 
         if closest_flower:
-            self.task = asyncio.create_task(Goals_BT.ForwardDist(self.my_agent, min_distance, 1, 100).run()) #move forward to the flower
+            min_distance = closest_flower.distance
+            self.runner.start(self, Goals_BT.ForwardDist, min_distance, 1, 100, pre_actions=("nt",)) #move forward to the flower
             # print(f"Moving to flower at distance {min_distance}")
         else:
-            print("No flower found to move to.")
+            log.debug("No flower found to move to.")
+            self.task = asyncio.create_task(self.my_agent.send_message("action", "nt"))
 
     def update(self):
-        if not self.task:
-            return pt.common.Status.FAILURE
-        if not self.task.done():
+        status = self.runner.status(self)
+        if status == Goals_BT.GoalRunner.RUNNING:
             return pt.common.Status.RUNNING
-        if self.task.exception():
-            print(f"Exception while moving to flower: {self.task.exception()}")
+        if status == Goals_BT.GoalRunner.ERROR:  # No flower, or the goal failed
             return pt.common.Status.FAILURE
-        print(f"BN_MoveToFlower SUCCESS")
+        log.info("BN_MoveToFlower SUCCESS")
         return pt.common.Status.SUCCESS
 
     def terminate(self, new_status: common.Status):
-        if self.task and not self.task.done():
-            self.task.cancel()
-        self.task = None
+        self.runner.cancel(self)
 
 # Node: Collect flower (action: collect)            
 class BN_CollectFlower(pt.behaviour.Behaviour):
@@ -387,7 +364,7 @@ class BN_CollectFlower(pt.behaviour.Behaviour):
             return pt.common.Status.FAILURE
         if not self.collect_task.done():
             return pt.common.Status.RUNNING
-        print(f"BN_CollectFlower SUCCESS")
+        log.info("BN_CollectFlower SUCCESS")
         return pt.common.Status.SUCCESS
 
     def terminate(self, new_status: common.Status):
@@ -399,32 +376,30 @@ class BN_Wander(pt.behaviour.Behaviour):
     def __init__(self, aagent):
         super().__init__("Wander")
         self.my_agent = aagent
-        self.wander_task = None
+        self.runner = Goals_BT.goal_runner(aagent)
         self.is_wandering = False
 
     def initialise(self):
         if not self.is_wandering:
-            self.wander_task = asyncio.create_task(Goals_BT.Avoid(self.my_agent).run()) #execute avoid goal for better environment exploration
+            self.runner.start(self, Goals_BT.Avoid) #execute avoid goal for better environment exploration
             self.is_wandering = True
             # print("Started wandering")
 
     def update(self):
-        sensor_info = self.my_agent.rc_sensor.sensor_rays[Sensors.RayCastSensor.OBJECT_INFO]
-        for i in range(len(sensor_info)):
-            if sensor_info[i] and sensor_info[i]["tag"] == "AlienFlower":
-                print("Flower detected during wandering! Returning SUCCESS.")
-                return pt.common.Status.SUCCESS  # Exit wander and move to detect+collect
-            elif sensor_info[i] and sensor_info[i]["tag"] == "CritterMantaRay":
-                print("Critter detected during wandering! Returning SUCCESS.")
-                return pt.common.Status.SUCCESS  # Exit wander to avoid critter
+        if self.my_agent.rc_sensor.has("AlienFlower"):
+            log.debug("Flower detected during wandering! Returning SUCCESS.")
+            return pt.common.Status.SUCCESS  # Exit wander and move to detect+collect
+        elif self.my_agent.rc_sensor.has("CritterMantaRay"):
+            log.debug("Critter detected during wandering! Returning SUCCESS.")
+            return pt.common.Status.SUCCESS  # Exit wander to avoid critter
 
         if not self.is_wandering:
             self.initialise()
         return pt.common.Status.RUNNING  # Keep wandering
 
     def terminate(self, new_status: common.Status):
-        if self.wander_task and not self.wander_task.done():
-            self.wander_task.cancel()
+        if self.runner.status(self) == Goals_BT.GoalRunner.RUNNING:
+            self.runner.cancel(self)
             # print("Stopped wandering")
         self.is_wandering = False
 
@@ -487,10 +462,10 @@ class BTCollectRun:
 
     async def tick(self):
         try:
+            await self.aagent.wait_tick()  # Wait for a fresh sensor frame (or 0.1s in fixed mode)
             self.behaviour_tree.tick()
-            await asyncio.sleep(0.1)  # Small delay to prevent CPU overload
         except Exception as e:
-            print(f"Error in behavior tree tick: {e}")
+            log.error("Error in behavior tree tick: %s", e)
             raise
 
     def stop_behaviour_tree(self):
@@ -8,8 +8,8 @@ import py_trees as pt
 from py_trees import common
 import math
 import random
-import Sensors
 import Goals_BT
+import Log
 import time
 
 
@@ -32,6 +32,9 @@ TIPS:
 ● If you want to try with multiple critters, use the Spawner.py tool and the two Spawn Areas (“HarvestZone” or “SmallHarvestZone”).
 ● Use a manually controlled Astronaut to test your Critters.
 '''
+
+log = Log.get_logger(__name__)
+
 # Behavior Tree Critter
 class BTRoamOrChase:
     def __init__(self, aagent):
@@ -62,10 +65,10 @@ class BTRoamOrChase:
 
     async def tick(self):
         try:
+            await self.aagent.wait_tick()
             self.behaviour_tree.tick()
-            await asyncio.sleep(0.1)
         except Exception as e:
-            print(f"[BTRoamOrChase] Tick error: {e}")
+            log.error("[BTRoamOrChase] Tick error: %s", e)
             raise
 
     def stop_behaviour_tree(self):
@@ -80,48 +83,43 @@ class BN_Wander(pt.behaviour.Behaviour):
     def __init__(self, aagent):
         super().__init__("Wander")
         self.my_agent = aagent
-        self.wander_task = None
+        self.runner = Goals_BT.goal_runner(aagent)
         self.is_wandering = False
 
     def initialise(self):
         if not self.is_wandering:
-            self.wander_task = asyncio.create_task(Goals_BT.AvoidForCritters(self.my_agent).run()) #avoid goal for critters (includes critter avoidance)
+            self.runner.start(self, Goals_BT.AvoidForCritters) #avoid goal for critters (includes critter avoidance)
             self.is_wandering = True
             # print("Started wandering")
 
     def update(self):
-        sensor_info = self.my_agent.rc_sensor.sensor_rays[Sensors.RayCastSensor.OBJECT_INFO]
-        for i in range(len(sensor_info)):
-            if sensor_info[i] and sensor_info[i]["tag"] == "Astronaut":
-                print("      From critter: Astronaut detected during wandering! BN_Wander SUCCESS.")
-                return pt.common.Status.SUCCESS  # Exit wander and move to detect astronaut
+        if self.my_agent.rc_sensor.has("Astronaut"):
+            log.debug("      From critter: Astronaut detected during wandering! BN_Wander SUCCESS.")
+            return pt.common.Status.SUCCESS  # Exit wander and move to detect astronaut
         if not self.is_wandering:
             self.initialise()
         return pt.common.Status.RUNNING  # Keep wandering
 
     def terminate(self, new_status: common.Status):
-        if self.wander_task and not self.wander_task.done():
-            self.wander_task.cancel()
-            print("      From critter: Stopped wandering")
+        if self.runner.status(self) == Goals_BT.GoalRunner.RUNNING:
+            self.runner.cancel(self)
+            log.debug("      From critter: Stopped wandering")
         self.is_wandering = False
 
 
 class BN_DetectAstronaut(pt.behaviour.Behaviour):
-    print("      From critter: BNdetectAstronaut")
     def __init__(self, aagent):
         super().__init__("BN_DetectAstronaut")
+        log.debug("      From critter: BNdetectAstronaut")
         self.aagent = aagent
 
     def update(self):   
-        sensor_info = self.aagent.rc_sensor.sensor_rays[Sensors.RayCastSensor.OBJECT_INFO]
-        for i in range(len(sensor_info)):
-            if sensor_info[i] and sensor_info[i]["tag"] == "Astronaut": #look for astronaut in the sensor info
-                print("      From critter: Detected astronaut")
-                return pt.common.Status.SUCCESS
+        if self.aagent.rc_sensor.has("Astronaut"): #look for astronaut in the sensor info
+            log.debug("      From critter: Detected astronaut")
+            return pt.common.Status.SUCCESS
         return pt.common.Status.FAILURE # no astronaut detected
     
 
-sensor_degree = {0:-45, 1:-22.5, 2:0, 3:22.5, 4:45}
 # node: turn to astronaut
 class BN_TurnToAstronaut(pt.behaviour.Behaviour):
     def __init__(self, aagent):
@@ -130,152 +128,119 @@ class BN_TurnToAstronaut(pt.behaviour.Behaviour):
         self.task = None
         self.turn_angle = None
         self.new_heading = None
+        self.heading = Goals_BT.HeadingController(aagent)
 
     def initialise(self):
-        print('      From critter: Turning to astronaut ...')
-        sensor_info = self.my_agent.rc_sensor.sensor_rays[Sensors.RayCastSensor.OBJECT_INFO]
-        min_distance = 10000
+        log.debug('      From critter: Turning to astronaut ...')
+        sensor = self.my_agent.rc_sensor
         turn_angle = None
 
-        for i in range(len(sensor_info)):
-            if sensor_info[i] and sensor_info[i]["tag"] == "Astronaut":
-                if i == 2: ## Front ray
-                    print("      From critter: astronaut detected from the front ray SUCCESS")
-                    self.new_heading = self.my_agent.i_state.rotation["y"]
-                    return pt.common.Status.SUCCESS
-                if sensor_info[i]["distance"] < min_distance:
-                    min_distance = sensor_info[i]["distance"]
-                    turn_angle = sensor_degree[i]
+        if sensor.center_ray in sensor.rays_with("Astronaut"): ## Front ray
+            log.debug("      From critter: astronaut detected from the front ray SUCCESS")
+            self.new_heading = self.my_agent.i_state.rotation["y"]
+            self.heading.start(self.new_heading)
+            return pt.common.Status.SUCCESS
+        closest_astronaut = sensor.nearest("Astronaut")
+        if closest_astronaut:
+            turn_angle = closest_astronaut.angle
 
         if turn_angle is not None:
             current_heading = self.my_agent.i_state.rotation["y"]
             self.new_heading = (current_heading + turn_angle) % 360
             if turn_angle > 0:
-                print(f"      From critter: TR__Turning to flower at angle {turn_angle}")
-                self.task = asyncio.create_task(self.my_agent.send_message("action", "tr"))
+                log.debug("      From critter: TR__Turning to flower at angle %s", turn_angle)
             else:
-                print(f"      From critter: TL__Turning to flower at angle {turn_angle}")
-                self.task = asyncio.create_task(self.my_agent.send_message("action", "tl"))
+                log.debug("      From critter: TL__Turning to flower at angle %s", turn_angle)
+            self.heading.send(self.heading.start(self.new_heading))
         else:
-            print("      From critter: No astronaut found to turn to.")
+            log.debug("      From critter: No astronaut found to turn to.")
             self.task = None
             self.new_heading = None  
 
     def update(self):
-        def angle_difference(a, b):
-            diff = (a - b + 180) % 360 - 180
-            return diff
-
         if self.new_heading is None:
             return pt.common.Status.FAILURE  # No target
 
-        current_heading = self.my_agent.i_state.rotation["y"]
-        if abs(angle_difference(current_heading, self.new_heading)) < 5:
-            print('      From critter: Turned to astronaut. SUCCESS')
-            self.task = asyncio.create_task(self.my_agent.send_message("action", "nt"))
+        # The controller turns back by itself if it overshoots
+        self.heading.send(self.heading.update())
+        if self.heading.done:
+            log.info('      From critter: Turned to astronaut. SUCCESS')
             return pt.common.Status.SUCCESS
-            
-        turn_speed = "tl" if angle_difference(current_heading, self.new_heading) > 0 else "tr"
-        # Only send new command if not already turning
-        if not self.task or self.task.done():
-            self.task = asyncio.create_task(self.my_agent.send_message("action", turn_speed))
         return pt.common.Status.RUNNING
     
     def terminate(self, new_status: common.Status):
-        if self.task and not self.task.done():
-            self.task.cancel()
-        self.task = None
+        # Stops the turn if the node is interrupted (if it succeeded, the stop is already sent)
+        self.heading.send(self.heading.stop())
 
 #node: move to astronaut
 class BN_MoveToAstronaut(pt.behaviour.Behaviour):
-    print("      From critter: BNMoveToAstronaut")
     def __init__(self, aagent):
         super().__init__("BN_MoveToAstronaut")
+        log.debug("      From critter: BNMoveToAstronaut")
         self.my_agent = aagent
         self.task = None  
+        self.runner = Goals_BT.goal_runner(aagent)
+        self.failed = False  # No target when initialised (py_trees ignores the status returned by initialise)
 
     def initialise(self):
-        sensor_info = self.my_agent.rc_sensor.sensor_rays[Sensors.RayCastSensor.OBJECT_INFO]
-        closest_astronaut = None
-        min_distance = float('inf')
-        
-        self.task = asyncio.create_task(self.my_agent.send_message("action", "nt"))
-        for i in range(len(sensor_info)):
-            if sensor_info[i] and sensor_info[i]["tag"] == "Astronaut":
-                if sensor_info[i]["distance"] < min_distance: #look for the closest astronaut
-                    min_distance = sensor_info[i]["distance"]
-                    closest_astronaut = sensor_info[i]
+        self.failed = False
+        closest_astronaut = self.my_agent.rc_sensor.nearest("Astronaut") #look for the closest astronaut
 
         if closest_astronaut:
-            self.task = asyncio.create_task(Goals_BT.ForwardDist(self.my_agent, min_distance-1.4, 1, 100).run()) #move forward to the astronaut with a margin to avoid collision
-            print(f"      From critter: Moving to astronaut at distance {min_distance}")
+            min_distance = closest_astronaut.distance
+            self.runner.start(self, Goals_BT.ForwardDist, min_distance-1.4, 1, 100, pre_actions=("nt",)) #move forward to the astronaut with a margin to avoid collision
+            log.debug("      From critter: Moving to astronaut at distance %s", min_distance)
         else:
-            print("      From critter: No astronaut found to move to.")
-            return pt.common.Status.FAILURE  # No target
+            log.debug("      From critter: No astronaut found to move to.")
+            self.task = asyncio.create_task(self.my_agent.send_message("action", "nt"))
+            self.failed = True  # No target, no goal started
 
     def update(self):
-        if not self.task:
+        if self.failed:
             return pt.common.Status.FAILURE
-        if not self.task.done():
+        status = self.runner.status(self)
+        if status == Goals_BT.GoalRunner.RUNNING:
             return pt.common.Status.RUNNING
-        if self.task.exception():
-            print(f"Exception while moving to astronaut: {self.task.exception()}")
+        if status == Goals_BT.GoalRunner.ERROR:
             return pt.common.Status.FAILURE
         
-        sensor_info = self.my_agent.rc_sensor.sensor_rays[Sensors.RayCastSensor.OBJECT_INFO]
-        for i in range(len(sensor_info)):
-            if sensor_info[i] and sensor_info[i]["tag"] == "Astronaut":
-                if sensor_info[i]["distance"] < 0.9:
-                    print(f"      From critter: Arrived at astronaut. SUCCESS")
-                    return pt.common.Status.SUCCESS
-        print("      From critter: No astronaut detected after moving. FAILURE")
+        closest_astronaut = self.my_agent.rc_sensor.nearest("Astronaut")
+        if closest_astronaut and closest_astronaut.distance < 0.9:
+            log.info("      From critter: Arrived at astronaut. SUCCESS")
+            return pt.common.Status.SUCCESS
+        log.info("      From critter: No astronaut detected after moving. FAILURE")
         # print(sensor_info)
         return pt.common.Status.FAILURE 
 
     def terminate(self, new_status: common.Status):
-        if self.task and not self.task.done():
-            self.task.cancel()
-        self.task = None
+        self.runner.cancel(self)
         
 # node: move away from astronaut if bitten       
 class BN_MoveAwayFromAstronaut(pt.behaviour.Behaviour):   
     def __init__(self, aagent):
         super().__init__("BN_MoveAwayFromAstronaut")
         self.my_agent = aagent
-        self.task = None  
+        self.runner = Goals_BT.goal_runner(aagent)
+        self.heading = Goals_BT.HeadingController(aagent)
 
     def initialise(self):
         distance = 10
-        self.task = asyncio.create_task(self.my_agent.send_message("action", "nt"))
-        self.task = asyncio.create_task(Goals_BT.BackwardDist(self.my_agent, distance, 1, 100).run())
-        
-        # turn to avoid critter from continuously attacking astronaut
-        current_heading = int(self.my_agent.i_state.rotation["y"])
+        # turn to avoid critter from continuously attacking astronaut, while moving backward
+        current_heading = self.my_agent.i_state.rotation["y"]
         self.new_heading = (current_heading + 60) % 360
-        self.task = asyncio.create_task(self.my_agent.send_message("action", "tr"))
-        print(f"      From critter: Moving AWAY")
+        turn = self.heading.start(self.new_heading)  # "tr"
+        self.runner.start(self, Goals_BT.BackwardDist, distance, 1, 100, pre_actions=("nt", turn))
+        log.debug("      From critter: Moving AWAY")
 
     def update(self):
-        def angle_difference(a, b):
-            diff = (a - b + 180) % 360 - 180
-            return abs(diff)
-
-        current_heading = self.my_agent.i_state.rotation["y"]
-        if angle_difference(current_heading, self.new_heading) < 5:
-            print('Turned away from critter. SUCCESS')
-            self.task = asyncio.create_task(self.my_agent.send_message("action", "nt"))
+        self.heading.send(self.heading.update())
+        if self.heading.done:
+            log.info('Turned away from critter. SUCCESS')
             return pt.common.Status.SUCCESS
-        if not self.task:
-            return pt.common.Status.FAILURE
-        if not self.task.done():
+        if self.runner.status(self) == Goals_BT.GoalRunner.RUNNING:
             return pt.common.Status.RUNNING
-        if self.task.exception():
-            print(f"Exception while moving to astronaut: {self.task.exception()}")
-            return pt.common.Status.FAILURE
-        else:
-            return pt.common.Status.FAILURE
+        return pt.common.Status.FAILURE
             
     def terminate(self, new_status: common.Status):
-        if self.task and not self.task.done():
-            self.task.cancel()
-        self.task = None    
\ No newline at end of file
+        self.heading.send(self.heading.stop())
+        self.runner.cancel(self)    
\ No newline at end of file
@@ -1,27 +1,28 @@
-import asyncio
 import random
 import py_trees
 import py_trees as pt
 from py_trees import common
 import Goals_BT
-import Sensors
+import Log
 
+log = Log.get_logger(__name__)
 
 class BN_DoNothing(pt.behaviour.Behaviour):
     def __init__(self, aagent):
         self.my_agent = aagent
-        self.my_goal = None
-        print("Initializing BN_DoNothing")
+        self.runner = Goals_BT.goal_runner(aagent)
+        log.debug("Initializing BN_DoNothing")
         super(BN_DoNothing, self).__init__("BN_DoNothing")
 
     def initialise(self):
-        self.my_goal = asyncio.create_task(Goals_BT.DoNothing(self.my_agent).run())
+        self.runner.start(self, Goals_BT.DoNothing)
 
     def update(self):
-        if not self.my_goal.done():
+        status = self.runner.status(self)
+        if status == Goals_BT.GoalRunner.RUNNING:
             return pt.common.Status.RUNNING
         else:
-            if self.my_goal.result():
+            if status == Goals_BT.GoalRunner.SUCCESS:
                 # print("BN_DoNothing completed with SUCCESS")
                 return pt.common.Status.SUCCESS
             else:
@@ -30,28 +31,29 @@ class BN_DoNothing(pt.behaviour.Behaviour):
 
     def terminate(self, new_status: common.Status):
         # Finishing the behaviour, therefore we have to stop the associated task
-        self.my_goal.cancel()
+        self.runner.cancel(self)
 
 
 class BN_ForwardRandom(pt.behaviour.Behaviour):
     def __init__(self, aagent):
-        self.my_goal = None
-        print("Initializing BN_ForwardRandom")
+        self.runner = Goals_BT.goal_runner(aagent)
+        log.debug("Initializing BN_ForwardRandom")
         super(BN_ForwardRandom, self).__init__("BN_ForwardRandom")
         self.logger.debug("Initializing BN_ForwardRandom")
         self.my_agent = aagent
 
     def initialise(self):
-        print("Create Goals_BT.ForwardDist task")
-        self.logger.debug("Create Goals_BT.ForwardDist task")
-        self.my_goal = asyncio.create_task(Goals_BT.ForwardDist(self.my_agent, -1, 1, 5).run())
+        log.debug("Start Goals_BT.ForwardDist")
+        self.logger.debug("Start Goals_BT.ForwardDist")
+        self.runner.start(self, Goals_BT.ForwardDist, -1, 1, 5)
 
     def update(self):
-        if not self.my_goal.done():
-            print("BN_ForwardRandom is running...")
+        status = self.runner.status(self)
+        if status == Goals_BT.GoalRunner.RUNNING:
+            log.debug("BN_ForwardRandom is running...")
             return pt.common.Status.RUNNING
         else:
-            if self.my_goal.result():
+            if status == Goals_BT.GoalRunner.SUCCESS:
                 self.logger.debug("BN_ForwardRandom completed with SUCCESS")
                 # print("BN_ForwardRandom completed with SUCCESS")
                 return pt.common.Status.SUCCESS
@@ -63,27 +65,27 @@ class BN_ForwardRandom(pt.behaviour.Behaviour):
     def terminate(self, new_status: common.Status):
         # Finishing the behaviour, therefore we have to stop the associated task
         self.logger.debug("Terminate BN_ForwardRandom")
-        self.my_goal.cancel()
+        self.runner.cancel(self)
 
 
 class BN_TurnRandom(pt.behaviour.Behaviour):
     def __init__(self, aagent):
-        self.my_goal = None
-        print("Initializing BN_TurnRandom")
+        self.runner = Goals_BT.goal_runner(aagent)
+        log.debug("Initializing BN_TurnRandom")
         super(BN_TurnRandom, self).__init__("BN_TurnRandom")
         self.my_agent = aagent
 
     def initialise(self):
-        print("Create Goals_BT.Turn task")
-        self.my_goal = asyncio.create_task(Goals_BT.Turn(self.my_agent).run())
+        log.debug("Start Goals_BT.Turn")
+        self.runner.start(self, Goals_BT.Turn)
 
     def update(self):
-        if not self.my_goal.done():
-            print("BN_TurnRandom is running...")
+        status = self.runner.status(self)
+        if status == Goals_BT.GoalRunner.RUNNING:
+            log.debug("BN_TurnRandom is running...")
             return pt.common.Status.RUNNING
         else:
-            res = self.my_goal.result()
-            if res:
+            if status == Goals_BT.GoalRunner.SUCCESS:
                 # print("BN_Turn completed with SUCCESS")
                 return pt.common.Status.SUCCESS
             else:
@@ -93,13 +95,13 @@ class BN_TurnRandom(pt.behaviour.Behaviour):
     def terminate(self, new_status: common.Status):
         # Finishing the behaviour, therefore we have to stop the associated task
         self.logger.debug("Terminate BN_TurnRandom")
-        self.my_goal.cancel()
+        self.runner.cancel(self)
 
 
 class BN_DetectFlower(pt.behaviour.Behaviour):
     def __init__(self, aagent):
         self.my_goal = None
-        print("Initializing BN_DetectFlower")
+        log.debug("Initializing BN_DetectFlower")
         super(BN_DetectFlower, self).__init__("BN_DetectFlower")
         self.my_agent = aagent
 
@@ -107,13 +109,10 @@ class BN_DetectFlower(pt.behaviour.Behaviour):
         pass
 
     def update(self):
-        sensor_obj_info = self.my_agent.rc_sensor.sensor_rays[Sensors.RayCastSensor.OBJECT_INFO]
-        for index, value in enumerate(sensor_obj_info):
-            if value:  # there is a hit with an object
-                if value["tag"] == "AlienFlower":  # If it is a flower
-                    # print("Flower detected!")
-                    # print("BN_DetectFlower completed with SUCCESS")
-                    return pt.common.Status.SUCCESS
+        if self.my_agent.rc_sensor.has("AlienFlower"):  # If a ray hits a flower
+            # print("Flower detected!")
+            # print("BN_DetectFlower completed with SUCCESS")
+            return pt.common.Status.SUCCESS
         # print("No flower...")
         # print("BN_DetectFlower completed with FAILURE")
         return pt.common.Status.FAILURE
@@ -161,8 +160,8 @@ class BTRoam:
         self.set_invalid_state(self.root)
 
     async def tick(self):
+        await self.aagent.wait_tick(period=0)
         self.behaviour_tree.tick()
-        await asyncio.sleep(0)
 
 
 
@@ -0,0 +1,711 @@
+#################################################
+# Benchmarks of the agents against the local stand-in server
+#################################################
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+# Slowdown, relative to the baseline, reported as a regression by the hot_paths benchmark. Above the spread of the
+# calibrated results of unchanged code (within +-10% on a busy machine)
+REGRESSION_THRESHOLD = 0.15
+# Key of the calibrated results in the hot_paths baseline
+CALIBRATED = "calibrated"
+# Windows of a calibrated measure
+CALIBRATION_WINDOWS = 20
+
+'''
+Usage: python Benchmarks.py <benchmark> [options]
+
+Benchmarks:
+● idle_cpu: CPU used by agents that are connected but idle (simulation on hold)
+● codec: sensor messages decoded and action messages encoded per second (one core) with each codec backend
+● sessions: memory and connect time per agent with one aiohttp session per agent vs one shared session
+● ramp_up: time to get many agents connected all at once vs paced by Spawner.ConnectionLimiter, and time to shut
+  them down one by one vs in parallel
+● startup: import time of AAgent_BT and Spawner (python -X importtime) and time from the start of an agent process
+  to its first action received by a local server
+● construction: time and memory per agent building all its goals and behaviour trees vs only its initial task
+● hot_paths: calls per second of the hot paths of an agent (sensor frame processing, action sending and one tick
+  of every behaviour tree) on a fake agent, without server. The results are compared with the stored baseline
+  (--baseline, default Benchmarks-baseline.json) and stored as the new baseline with --save-baseline.
+  The comparison uses calibrated results: every measure alternates short windows of the hot path with windows of a
+  fixed pure Python loop (calibration_work), and the result is the median of their ratios. A machine that is just
+  faster or slower than the one of the baseline, or whose speed changes during the run, does not show changes.
+  With a baseline without calibrated results the comparison is only informational. The baseline has to be saved
+  again when a change alters what a benchmark measures.
+● internal_state: cost of the update of the internal state of an agent with a sensor frame and of reading its pose
+  (distance condition and heading, as the goals do), with every codec backend, and memory per InternalState
+● sensor_frames: bytes per second of sensor frames and time to decode and apply a frame per agent, with full json
+  frames, with delta frames (Misc.sensor_delta) and with binary frames (Misc.sensor_binary), running 'agents' agents
+  for 'duration' seconds against a local server
+● logging: calls per second, on the agent's thread, of a print vs a disabled and an enabled log call (Log.py), all
+  of them written to os.devnull
+'''
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_config(base_config_file, port, misc=None):
+    """
+    Copies an agent configuration file pointing it to the local server at 'port'.
+    :return: path of the temporary configuration file
+    """
+    with open(base_config_file, 'r') as file:
+        config = json.load(file)
+    config["Server"]["host"] = "127.0.0.1"
+    config["Server"]["port"] = port
+    if misc:
+        config["Misc"].update(misc)
+    fd, path = tempfile.mkstemp(suffix=".json", prefix="aape_bench_")
+    with os.fdopen(fd, 'w') as file:
+        json.dump(config, file)
+    return path
+
+
+def sample_sensor_message(rays_per_direction=2):
+    """
+    :return: json string of a realistic "sensor" message as sent by Unity
+    """
+    rays = []
+    tags = ["AlienFlower", "Wall", "CritterMantaRay", "Astronaut"]
+    for i in range((rays_per_direction * 2) + 1):
+        if i % 2:
+            tag = tags[i % len(tags)]
+            rays.append([i, 1, {"name": f"{tag}_{i}", "tag": tag, "distance": 1.5 + i * 0.25}])
+        else:
+            rays.append([i, 0, None])
+    i_state = {"isRotatingRight": False, "isRotatingLeft": True, "movingForwards": True, "movingBackwards": False,
+               "isFrozen": False, "speed": 2.0,
+               "position": {"x": 12.345, "y": 0.0, "z": -3.21}, "rotation": {"x": 0.0, "y": 123.456, "z": 0.0},
+               "currentNamedLoc": "", "onRoute": False, "targetNamedLoc": "",
+               "myInventoryList": [{"name": "AlienFlower", "amount": 1}],
+               "nearbyContainerInventory": False, "nearbyContainerInventoryList": []}
+    return json.dumps({"Type": "sensor", "Content": [rays, i_state]})
+
+
+def best_rate(func, arg, min_time=1.0, repeat=5):
+    """
+    :return: best calls per second of func(arg) in 'repeat' measures of 'min_time' / 'repeat' seconds each
+    (the slower measures are the ones disturbed by other processes)
+    """
+    return max(rate(func, arg, min_time / repeat) for _ in range(repeat))
+
+
+def rate(func, arg, min_time=1.0):
+    """
+    :return: calls per second of func(arg), measured during at least 'min_time' seconds
+    """
+    calls = 0
+    batch = 1000
+    start = time.perf_counter()
+    while True:
+        for _ in range(batch):
+            func(arg)
+        calls += batch
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return calls / elapsed
+
+
+def calibration_work(n):
+    """
+    Fixed pure Python work (dictionary, arithmetic and sort), the unit of the calibrated results
+    """
+    totals = {}
+    for i in range(n):
+        totals[i % 7] = totals.get(i % 7, 0.0) + i * 0.5
+    return sorted(totals.items())
+
+
+def calibration_rate(window):
+    return rate(calibration_work, 100, window)
+
+
+def calibrated_rate(func, arg, min_time=1.0, windows=CALIBRATION_WINDOWS):
+    """
+    Alternates 'windows' measures of func(arg) with measures of calibration_work, each of min_time / windows seconds
+    :return: best calls per second and median of the calls per calibration_work call of every window
+    """
+    window = min_time / windows
+    rates, calibrated = [], []
+    for _ in range(windows):
+        rates.append(rate(func, arg, window))
+        calibrated.append(rates[-1] / calibration_rate(window))
+    return max(rates), statistics.median(calibrated)
+
+
+async def async_calibrated_rate(func, arg, min_time=1.0, windows=CALIBRATION_WINDOWS):
+    """
+    calibrated_rate of await func(arg)
+    """
+    window = min_time / windows
+    rates, calibrated = [], []
+    for _ in range(windows):
+        rates.append(await async_rate(func, arg, window))
+        calibrated.append(rates[-1] / calibration_rate(window))
+    return max(rates), statistics.median(calibrated)
+
+
+async def async_rate(func, arg, min_time=1.0):
+    """
+    :return: calls per second of await func(arg), measured during at least 'min_time' seconds
+    """
+    calls = 0
+    batch = 1000
+    start = time.perf_counter()
+    while True:
+        for _ in range(batch):
+            await func(arg)
+        calls += batch
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return calls / elapsed
+
+
+class FakeWebSocket:
+    """
+    Stands for the open websocket of an agent: counts the messages sent and discards them
+    """
+    closed = False
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_str(self, data):
+        self.sent += 1
+
+
+def fake_agent(config_file, sensor_message):
+    """
+    :return: an AAgent that is not connected to any server, with a FakeWebSocket, the simulation running and the
+    perception and internal state of 'sensor_message'
+    """
+    from AAgent_BT import AAgent
+
+    agent = AAgent(config_file)
+    agent.ws = FakeWebSocket()
+    agent.set_simulation_state(agent.RUNNING)
+    agent.process_incoming_message(sensor_message)
+    return agent
+
+
+async def tick_rate(agent, bt_name, min_time=1.0, windows=CALIBRATION_WINDOWS):
+    """
+    Ticks the behaviour tree 'bt_name' of 'agent' in 'windows' windows alternated with calibration_work (see
+    calibrated_rate). Only the ticks are timed: between two ticks the event loop runs the tasks (goals, messages)
+    started by the nodes.
+    :return: best ticks per second and median of the ticks per calibration_work call of every window
+    """
+    behaviour_tree = agent.bts[bt_name].behaviour_tree
+    window = min_time / windows
+    rates, calibrated = [], []
+    try:
+        for _ in range(windows):
+            ticks = 0
+            elapsed = 0.0
+            while elapsed < window:
+                for _ in range(100):
+                    start = time.perf_counter()
+                    behaviour_tree.tick()
+                    elapsed += time.perf_counter() - start
+                    await asyncio.sleep(0)
+                ticks += 100
+            rates.append(ticks / elapsed)
+            calibrated.append(rates[-1] / calibration_rate(window))
+    finally:
+        behaviour_tree.interrupt()  # Cancels the tasks of the running nodes
+        agent.exit_event.set()
+        pending = asyncio.all_tasks() - {asyncio.current_task()}
+        for task in pending:
+            task.cancel()  # Goals started by nodes that are not running any more
+        if pending:
+            await asyncio.wait(pending, timeout=1)
+    return max(rates), statistics.median(calibrated)
+
+
+def import_times(module, runs=5):
+    """
+    Imports 'module' in new interpreters with "python -X importtime"
+    :return: best cumulative import time of 'module' (seconds) and {module imported by it: cumulative seconds} of
+    that run
+    """
+    import subprocess
+
+    best = None
+    for _ in range(runs):
+        stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                capture_output=True, text=True, check=True).stderr
+        total = None
+        children = {}
+        # Lines: "import time: <self us> | <cumulative us> | <indentation><name>", children before their parent
+        for line in stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line.split("|")
+            if name.strip() == module and not name.startswith("   "):
+                total = int(cumulative) / 1e6
+            elif name.startswith("   ") and not name.startswith("    "):  # Imported directly by 'module'
+                children[name.strip()] = int(cumulative) / 1e6
+        if best is None or total < best[0]:
+            best = (total, children)
+    return best
+
+
+async def bench_startup(args):
+    """
+    Measures the import time of AAgent_BT and Spawner, with their heaviest direct imports, and the time to first
+    action: from the start of a "python AAgent_BT.py <config>" process to the first action it sends to a local
+    server (best of 'args.agents' runs, 3 if not given).
+    """
+    from LocalServer import LocalServer
+
+    for module in ("AAgent_BT", "Spawner"):
+        total, children = import_times(module)
+        heaviest = sorted(children.items(), key=lambda item: -item[1])[:5]
+        print(f"import {module}: {1000 * total:.1f} ms  (" +
+              ", ".join(f"{name} {1000 * t:.1f}" for name, t in heaviest) + ")")
+
+    port = free_port()
+    server = LocalServer(verbose=False)
+    await server.start("127.0.0.1", port)
+    config_file = make_config(args.config, port)
+    runs = args.agents if args.agents_given else 3
+    times = []
+    try:
+        for _ in range(runs):
+            start = time.monotonic()  # Same clock as the server's first_action_at (system wide)
+            process = await asyncio.create_subprocess_exec(sys.executable, "AAgent_BT.py", config_file,
+                                                           stdout=asyncio.subprocess.DEVNULL,
+                                                           stderr=asyncio.subprocess.DEVNULL)
+            first_action = None
+            while first_action is None and time.monotonic() - start < 30:
+                await asyncio.sleep(0.005)
+                first_action = next((agent.first_action_at for agent in server.world.agents.values()
+                                     if agent.first_action_at is not None), None)
+            process.terminate()
+            await process.wait()
+            await asyncio.sleep(0.2)  # Let the server notice the disconnection
+            if first_action is not None:
+                times.append(first_action - start)
+    finally:
+        await server.stop()
+        os.remove(config_file)
+    if times:
+        print(f"time to first action: best {1000 * min(times):.1f} ms  mean {1000 * sum(times) / len(times):.1f} ms"
+              f"  ({len(times)} runs)")
+    else:
+        print("time to first action: no action received")
+
+
+async def bench_construction(args):
+    """
+    Creates 'args.agents' agents (100 if not given) twice: building every goal and behaviour tree, as the agents
+    did before the LazyRegistry, and building only the behaviour tree of their initial task.
+    """
+    import tracemalloc
+    from AAgent_BT import AAgent
+
+    num_agents = args.agents if args.agents_given else 100
+    with open(args.config, 'r') as file:
+        initial_task = json.load(file)["AgentParameters"]["initial_task"]
+    command, task = initial_task.split(":")
+
+    def build_agent(eager):
+        agent = AAgent(args.config)
+        if eager:
+            for name in agent.goals:
+                agent.goals[name]
+            for name in agent.bts:
+                agent.bts[name]
+        elif command == "bt":
+            agent.bts[task]
+        elif command == "goal":
+            agent.goals[task]
+        return agent
+
+    print(f"{'agents':>7}{'build':>8}{'time/agent (ms)':>17}{'memory/agent (KiB)':>20}")
+    results = {}
+    for mode in ("eager", "lazy"):
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            build_agent(True)  # Warm up (imports, caches)
+            tracemalloc.start()
+            memory_start = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            agents = [build_agent(mode == "eager") for _ in range(num_agents)]
+            elapsed = time.perf_counter() - start
+            memory = tracemalloc.get_traced_memory()[0] - memory_start
+            tracemalloc.stop()
+        results[mode] = (elapsed, memory)
+        print(f"{num_agents:>7}{mode:>8}{1000 * elapsed / num_agents:>17.2f}{memory / num_agents / 1024:>20.1f}")
+        del agents
+    saved = results["eager"][1] - results["lazy"][1]
+    print(f"Saved per agent: {1000 * (results['eager'][0] - results['lazy'][0]) / num_agents:.2f} ms, "
+          f"{saved / num_agents / 1024:.1f} KiB")
+
+
+async def bench_hot_paths(args):
+    """
+    Measures the hot paths of an agent, compares them with the baseline and optionally saves them as the new one.
+    """
+    import AAgent_BT
+    import BinaryFrame
+    import Codec
+
+    min_time = args.duration / 5
+    config_file = args.config
+    with open(config_file, 'r') as file:
+        rays_per_direction = json.load(file)["AgentParameters"]["ray_perception_sensor_param"][0]
+    message = sample_sensor_message(rays_per_direction)
+    rays, i_state = Codec.decode_message(message)[1]
+
+    results = {}
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        agent = fake_agent(config_file, message)
+        results["set_perception"] = calibrated_rate(agent.rc_sensor.set_perception, rays, min_time)
+        results["process_incoming_message"] = calibrated_rate(agent.process_incoming_message, message, min_time)
+        encoder = BinaryFrame.FrameEncoder()
+        agent.process_incoming_message(encoder.encode(*json.loads(message)["Content"]))  # Sends the strings
+        binary_message = encoder.encode(*json.loads(message)["Content"])
+        results["process_binary_message"] = calibrated_rate(agent.process_incoming_message, binary_message, min_time)
+        results["update_internal_state"] = calibrated_rate(lambda s: agent.i_state.update_internal_state(rays, s),
+                                                           i_state, min_time)
+
+        def update_with_gui(s):
+            agent.i_state.update_internal_state(rays, s)
+            AAgent_BT.gui_blackboard.take()  # The GUI takes every frame
+        AAgent_BT.active_tk_gui = True
+        try:
+            results["update_internal_state_gui"] = calibrated_rate(update_with_gui, i_state, min_time)
+        finally:
+            AAgent_BT.active_tk_gui = False
+
+        async def send_action(action):
+            await agent.send_message("action", action)
+        agent.action_filter = None  # Every action is serialized and sent
+        results["send_message"] = await async_calibrated_rate(send_action, "mf", min_time)
+        for bt_name in agent.bts:
+            agent = fake_agent(config_file, message)
+            agent.currentBT = bt_name
+            results[f"tick_{bt_name}"] = await tick_rate(agent, bt_name, min_time)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+    baseline_calibrated = baseline.pop(CALIBRATED, {})
+    if baseline and not baseline_calibrated:
+        print(f"{args.baseline} has no calibrated results: the changes are only informational")
+    print(f"{'benchmark':<28}{'calls/s':>14}{'baseline':>14}{'change':>9}")
+    for name, (value, calibrated) in results.items():
+        line = f"{name:<28}{value:>14,.0f}"
+        if name in baseline_calibrated:
+            change = calibrated / baseline_calibrated[name] - 1
+            line += f"{baseline[name]:>14,.0f}{100 * change:>+8.1f}%"
+            if change < -REGRESSION_THRESHOLD:
+                line += "  REGRESSION"
+        elif name in baseline:
+            line += f"{baseline[name]:>14,.0f}{100 * (value / baseline[name] - 1):>+8.1f}%"
+        print(line)
+    if args.save_baseline:
+        saved = {name: round(value, 1) for name, (value, _) in results.items()}
+        saved[CALIBRATED] = {name: round(calibrated, 4) for name, (_, calibrated) in results.items()}
+        with open(args.baseline, 'w') as file:
+            json.dump(saved, file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+
+
+async def bench_codec(args):
+    """
+    Decodes realistic sensor messages and encodes action messages with every codec backend available.
+    """
+    import Codec
+
+    action = {"type": "action", "content": "mf"}
+    print(f"{'backend':<10}{'rays':>6}{'decode msg/s':>16}{'encode msg/s':>16}")
+    for rays_per_direction in (2, 50):
+        message = sample_sensor_message(rays_per_direction)
+        for name in Codec.BACKENDS:
+            Codec.use_backend(name)
+            decoded = rate(Codec.decode_message, message, args.duration / 4)
+            encoded = rate(Codec.dumps, action, args.duration / 4)
+            print(f"{name:<10}{(rays_per_direction * 2) + 1:>6}{decoded:>16,.0f}{encoded:>16,.0f}")
+
+
+async def bench_idle_cpu(args):
+    """
+    Connects 'args.agents' agents to a local server that keeps the simulation on hold and measures the CPU time
+    consumed during 'args.duration' seconds.
+    """
+    from AAgent_BT import AAgent
+    from LocalServer import LocalServer
+
+    port = free_port()
+    server = LocalServer(hold=True, verbose=False)
+    await server.start("127.0.0.1", port)
+    config_file = make_config(args.config, port)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            agents = [AAgent(config_file) for _ in range(args.agents)]
+            tasks = [asyncio.create_task(agent.run()) for agent in agents]
+            while not all(agent.connection_ready for agent in agents):
+                await asyncio.sleep(0.05)
+            await asyncio.sleep(0.5)  # Let the connections settle
+
+            cpu_start = time.process_time()
+            wall_start = time.perf_counter()
+            await asyncio.sleep(args.duration)
+            cpu = time.process_time() - cpu_start
+            wall = time.perf_counter() - wall_start
+
+            for agent in agents:
+                agent.exit_event.set()
+            await asyncio.wait(tasks, timeout=5)
+    finally:
+        await server.stop()
+        os.remove(config_file)
+
+    print(f"Idle agents: {args.agents}  wall: {wall:.2f}s  cpu: {cpu:.3f}s")
+    print(f"Process CPU: {100 * cpu / wall:.1f}%  per agent: {100 * cpu / wall / args.agents:.2f}%")
+
+
+async def bench_sessions(args):
+    """
+    Connects 10, 100 and 1000 agents (or just 'args.agents' if given) to a local server, first with one aiohttp
+    session per agent and then with a session shared by all of them, and measures the memory allocated by the
+    connections and the connect time per agent.
+    """
+    import tracemalloc
+    from AAgent_BT import AAgent
+    from LocalServer import LocalServer
+    from Spawner import create_session
+
+    port = free_port()
+    server = LocalServer(hold=True, verbose=False)
+    await server.start("127.0.0.1", port)
+    config_file = make_config(args.config, port)
+
+    async def timed_connect(agent):
+        start = time.perf_counter()
+        await agent.open_websocket()
+        return time.perf_counter() - start
+
+    print(f"{'agents':>7}{'session':>10}{'memory/agent (KiB)':>20}{'connect mean (ms)':>19}{'connect max (ms)':>18}")
+    try:
+        for num_agents in ([args.agents] if args.agents_given else [10, 100, 1000]):
+            for mode in ("per-agent", "shared"):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    tracemalloc.start()
+                    session = create_session() if mode == "shared" else None
+                    agents = [AAgent(config_file, session) for _ in range(num_agents)]
+                    memory_start = tracemalloc.get_traced_memory()[0]
+                    times = await asyncio.gather(*(timed_connect(agent) for agent in agents))
+                    memory = tracemalloc.get_traced_memory()[0] - memory_start
+                    tracemalloc.stop()
+                    await asyncio.gather(*(agent.close_websocket() for agent in agents))
+                    if session:
+                        await session.close()
+                print(f"{num_agents:>7}{mode:>10}{memory / num_agents / 1024:>20.1f}"
+                      f"{1000 * sum(times) / len(times):>19.2f}{1000 * max(times):>18.2f}")
+    finally:
+        await server.stop()
+        os.remove(config_file)
+
+
+async def bench_ramp_up(args):
+    """
+    Connects 'args.agents' agents (500 if not given) to a local server all at once and then paced by a
+    ConnectionLimiter, measuring the time until all of them are ready and the slowest connection. Then shuts them
+    down closing the websockets one by one and in parallel (Spawner.shutdown_agents).
+    """
+    from AAgent_BT import AAgent
+    from LocalServer import LocalServer
+    from Spawner import ConnectionLimiter, create_session, shutdown_agents
+
+    num_agents = args.agents if args.agents_given else 500
+    port = free_port()
+    server = LocalServer(hold=True, verbose=False)
+    await server.start("127.0.0.1", port)
+    config_file = make_config(args.config, port)
+
+    async def timed_connect(agent, limiter):
+        start = time.perf_counter()
+        async with limiter:
+            await agent.connect()
+        return time.perf_counter() - start
+
+    print(f"{'connect':<22}{'all ready (s)':>14}{'slowest (ms)':>14}{'shutdown':>12}{'close all (s)':>15}")
+    try:
+        for connect_mode, limiter, shutdown_mode in (("all at once", ConnectionLimiter(), "sequential"),
+                                                     ("rate 1000/s, conc 50", ConnectionLimiter(1000, 50),
+                                                      "parallel")):
+            with contextlib.redirect_stdout(io.StringIO()):
+                session = create_session()
+                agents = [AAgent(config_file, session) for _ in range(num_agents)]
+                start = time.perf_counter()
+                times = await asyncio.gather(*(timed_connect(agent, limiter) for agent in agents))
+                ready = time.perf_counter() - start
+
+                start = time.perf_counter()
+                if shutdown_mode == "parallel":
+                    await shutdown_agents(agents, [])  # No main loops running
+                else:
+                    for agent in agents:
+                        agent.exit_event.set()
+                        await agent.close_websocket()
+                closed = time.perf_counter() - start
+                await session.close()
+            print(f"{connect_mode:<22}{ready:>14.2f}{1000 * max(times):>14.1f}{shutdown_mode:>12}{closed:>15.2f}")
+    finally:
+        await server.stop()
+        os.remove(config_file)
+
+
+async def bench_internal_state(args):
+    """
+    Measures InternalState.update_internal_state and a read of the pose with the state decoded by every codec backend,
+    and the memory of an InternalState (with the objects it keeps from the last frame)
+    """
+    import tracemalloc
+    import Codec
+    from AAgent_BT import InternalState
+    from Goals_BT import distance_reached
+
+    min_time = args.duration / 5
+    message = sample_sensor_message()
+    default_backend = Codec.backend
+    print(f"{'backend':<10}{'update (ns)':>13}{'pose read (ns)':>16}{'memory/state (bytes)':>22}")
+    try:
+        for backend in Codec.BACKENDS:
+            Codec.use_backend(backend)
+            rays, decoded_state = Codec.decode_message(message)[1]
+            i_state = InternalState()
+            update_rate = best_rate(lambda s: i_state.update_internal_state(rays, s), decoded_state, min_time)
+            reached = distance_reached(i_state.position.copy(), 1.0)
+            read_rate = best_rate(lambda s: reached(s) or s.rotation.y, i_state, min_time)
+
+            states = []
+            tracemalloc.start()
+            for _ in range(1000):
+                states.append(InternalState())
+                states[-1].update_internal_state(None, Codec.decode_message(message)[1][1])
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            print(f"{backend:<10}{1e9 / update_rate:>13.0f}{1e9 / read_rate:>16.0f}{memory / len(states):>22.0f}")
+    finally:
+        Codec.use_backend(default_backend)
+
+
+async def bench_sensor_frames(args):
+    """
+    Runs 'args.agents' agents against a local server with full json sensor frames, with delta frames (a keyframe
+    every 20 frames) and with binary frames, and measures the bytes per second received and the time of
+    process_incoming_message per agent
+    """
+    from AAgent_BT import AAgent
+    from LocalServer import LocalServer
+
+    def timed(agent, stats):
+        process = agent.process_incoming_message
+
+        def wrapper(msg_data, arrival=None):
+            start = time.perf_counter()
+            process(msg_data, arrival)
+            stats[0] += 1
+            stats[1] += time.perf_counter() - start
+        return wrapper
+
+    print(f"{'frames':<14}{'bytes/s/agent':>15}{'bytes/frame':>13}{'process (us/frame)':>20}")
+    for mode, misc in (("full", {}), ("delta (1/20)", {"sensor_delta": 20}), ("binary", {"sensor_binary": True})):
+        port = free_port()
+        server = LocalServer(verbose=False, seed=0)
+        await server.start("127.0.0.1", port)
+        config_file = make_config(args.config, port, misc)
+        stats = [0, 0.0]  # Messages processed by all the agents and their time
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                agents = [AAgent(config_file) for _ in range(args.agents)]
+                for agent in agents:
+                    agent.process_incoming_message = timed(agent, stats)
+                tasks = [asyncio.create_task(agent.run()) for agent in agents]
+                await asyncio.sleep(args.duration)
+                for agent in agents:
+                    agent.exit_event.set()
+                await asyncio.wait(tasks, timeout=5)
+            agent_stats = server.stats()
+        finally:
+            await server.stop()
+            os.remove(config_file)
+        frames = max(sum(s["frames_sent"] for s in agent_stats), 1)
+        bytes_sent = sum(s["bytes_sent"] for s in agent_stats)
+        print(f"{mode:<14}{sum(s['bytes_per_sec'] for s in agent_stats) / len(agent_stats):>15,.0f}"
+              f"{bytes_sent / frames:>13.0f}{1e6 * stats[1] / max(stats[0], 1):>20.1f}")
+
+
+async def bench_logging(args):
+    """
+    Measures the cost, for the agent, of a print and of a log call with the level disabled and enabled (the enabled
+    records are written by the writer thread, its time is not counted)
+    """
+    import Log
+
+    log = Log.get_logger("Benchmarks")
+    ring = Log.AgentLog("Benchmarks")
+    Log.agent_log.set(ring)
+    turn_angle = 45.0
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        Log.setup("INFO")
+        results = [("print", best_rate(lambda angle: print(f"TR_Turning to flower at angle {angle}"), turn_angle)),
+                   ("log.debug (disabled)",
+                    best_rate(lambda angle: log.debug("TR_Turning to flower at angle %s", angle), turn_angle)),
+                   ("log.info (enabled)",
+                    best_rate(lambda angle: log.info("TR_Turning to flower at angle %s", angle), turn_angle))]
+        Log.shutdown()
+    print(f"{'call':<24}{'calls/s':>14}{'us/call':>10}")
+    for name, calls in results:
+        print(f"{name:<24}{calls:>14,.0f}{1e6 / calls:>10.2f}")
+
+
+BENCHMARKS = {
+    "idle_cpu": bench_idle_cpu,
+    "codec": bench_codec,
+    "sessions": bench_sessions,
+    "ramp_up": bench_ramp_up,
+    "startup": bench_startup,
+    "construction": bench_construction,
+    "hot_paths": bench_hot_paths,
+    "internal_state": bench_internal_state,
+    "sensor_frames": bench_sensor_frames,
+    "logging": bench_logging,
+}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmarks of the AAPE agents")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--config", default="AAgent-2.json", help="Agent configuration file used as template")
+    parser.add_argument("--agents", type=int, default=None, help="Number of agents (default 7)")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds to measure")
+    parser.add_argument("--baseline", default="Benchmarks-baseline.json", help="Baseline of the hot_paths benchmark")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the hot_paths results as the baseline")
+    args = parser.parse_args(argv)
+    args.agents_given = args.agents is not None
+    if not args.agents_given:
+        args.agents = 7
+    return args
+
+
+if __name__ == "__main__":
+    arguments = parse_args(sys.argv[1:])
+    asyncio.run(BENCHMARKS[arguments.benchmark](arguments))
@@ -0,0 +1,170 @@
+#################################################
+# Binary format of the sensor frames
+#################################################
+import struct
+
+import numpy as np
+
+import Sensors
+
+'''
+Optional binary format of the "sensor" messages (Misc.sensor_binary, implemented by LocalServer.py). The agent asks
+for it adding "sensor_binary": true to its initial_params, and then every sensor frame arrives as a binary websocket
+message instead of [rays, i_state] in json. Unity ignores the parameter and keeps sending json frames.
+
+Layout of a frame (little-endian, no padding):
+● HEADER: MAGIC, number of rays, of items of the inventory, of items of the nearby container, of new tags and of
+  new strings
+● STATE: flags (the bits of AAgent_BT.InternalState.flags plus FROZEN), speed, position x, y, z, rotation x, y, z,
+  ids of the currentNamedLoc and targetNamedLoc strings
+● One RAY_DTYPE record per ray, in order: hit, ids of the tag and name strings, distance (-1 if there is no hit)
+● One ITEM_DTYPE record per item of the inventory and then per item of the nearby container: id of the name, amount
+● The tags and then the other strings used for the first time in this frame: STRING_HEADER (id, length in bytes)
+  followed by the utf-8 bytes
+The tags and the other strings (names, locations) are interned per connection, each kind with its own ids: each one
+is sent once and then referred to by its id. The id 0 is the empty string (no tag, no location). The agent maps the
+ids of the tags to the tag ids of its sensor (Sensors.intern_tag) when it receives them.
+
+The rays are read with numpy.frombuffer, as a view of the message, and copied straight into the arrays of the
+RayCastSensor: no Python object is created per ray. The information of the object hit by each ray (OBJECT_INFO) is
+only built if somebody reads it (Sensors.ObjectInfoView).
+The format saves bandwidth (about 8 times fewer bytes than a full json frame), not CPU: with the few rays of the
+agents, the fixed cost of the numpy calls makes a binary frame slower to decode than a json one
+("Benchmarks.py sensor_frames").
+'''
+
+MAGIC = b"AAB\x01"
+HEADER = struct.Struct("<4sHHHHH")
+STATE = struct.Struct("<Bf3f3fHH")
+RAY = struct.Struct("<BHHf")
+RAY_DTYPE = np.dtype([("hit", "u1"), ("tag", "<u2"), ("name", "<u2"), ("distance", "<f4")])
+ITEM = struct.Struct("<Hi")
+ITEM_DTYPE = np.dtype([("name", "<u2"), ("amount", "<i4")])
+STRING_HEADER = struct.Struct("<HH")
+
+# Bits of the flags of the state, the first ones as in AAgent_BT.InternalState.flags
+ROTATING_RIGHT = 1
+ROTATING_LEFT = 2
+MOVING_FORWARDS = 4
+MOVING_BACKWARDS = 8
+ON_ROUTE = 16
+NEARBY_CONTAINER = 32
+FROZEN = 64
+FLAG_FIELDS = (("isRotatingRight", ROTATING_RIGHT), ("isRotatingLeft", ROTATING_LEFT),
+               ("movingForwards", MOVING_FORWARDS), ("movingBackwards", MOVING_BACKWARDS), ("onRoute", ON_ROUTE),
+               ("nearbyContainerInventory", NEARBY_CONTAINER), ("isFrozen", FROZEN))
+
+
+class FrameEncoder:
+    """
+    Encodes the sensor frames of one connection (server side)
+    """
+    def __init__(self):
+        # tag -> id and string -> id, "" is always 0
+        self.tag_ids = {"": 0}
+        self.string_ids = {"": 0}
+
+    def encode(self, rays, state):
+        """
+        :param rays: [[<num_ray_cast>, <hit>, <hit_object_info or None>] ...] in order, as in the json frames
+        :param state: internal state as in the json frames
+        :return: bytes of the binary frame
+        """
+        new_tags = []
+        new_strings = []
+
+        def tag_id(text):
+            text_id = self.tag_ids.get(text)
+            if text_id is None:
+                text_id = self.tag_ids[text] = len(self.tag_ids)
+                new_tags.append((text_id, text.encode()))
+            return text_id
+
+        def string_id(text):
+            text_id = self.string_ids.get(text)
+            if text_id is None:
+                text_id = self.string_ids[text] = len(self.string_ids)
+                new_strings.append((text_id, text.encode()))
+            return text_id
+
+        flags = 0
+        for field, bit in FLAG_FIELDS:
+            if state[field]:
+                flags |= bit
+        position = state["position"]
+        rotation = state["rotation"]
+        parts = [b"",  # The header, once the new strings are known
+                 STATE.pack(flags, state["speed"], position["x"], position["y"], position["z"],
+                            rotation["x"], rotation["y"], rotation["z"],
+                            string_id(state["currentNamedLoc"]), string_id(state["targetNamedLoc"]))]
+        for _, hit, info in rays:
+            if info is None:
+                parts.append(RAY.pack(hit, 0, 0, -1.0))
+            else:
+                parts.append(RAY.pack(hit, tag_id(info["tag"]), string_id(info["name"]), info["distance"]))
+        for inventory in (state["myInventoryList"], state["nearbyContainerInventoryList"]):
+            for item in inventory:
+                parts.append(ITEM.pack(string_id(item["name"]), item["amount"]))
+        for text_id, text in new_tags + new_strings:
+            parts.append(STRING_HEADER.pack(text_id, len(text)))
+            parts.append(text)
+        parts[0] = HEADER.pack(MAGIC, len(rays), len(state["myInventoryList"]),
+                               len(state["nearbyContainerInventoryList"]), len(new_tags), len(new_strings))
+        return b"".join(parts)
+
+
+class FrameDecoder:
+    """
+    Decodes the sensor frames of one connection (agent side) into the sensor and the internal state of the agent
+    """
+    def __init__(self):
+        # id of the tag -> Sensors tag id
+        self.tag_ids = np.array([Sensors.NO_TAG], dtype=np.int16)
+        # id -> string
+        self.strings = [""]
+
+    def decode(self, data, rc_sensor, i_state, gui=False):
+        """
+        Updates 'rc_sensor' (RayCastSensor) and 'i_state' (InternalState) with the binary frame 'data'
+        :param gui: True if the Tk monitor is active (it gets the whole perception)
+        """
+        magic, num_rays, num_items, num_container_items, num_tags, num_strings = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError("Not a binary sensor frame")
+        offset = HEADER.size + STATE.size
+        rays = np.frombuffer(data, RAY_DTYPE, num_rays, offset)
+        offset += RAY_DTYPE.itemsize * num_rays
+        if num_items or num_container_items:
+            items = np.frombuffer(data, ITEM_DTYPE, num_items + num_container_items, offset).tolist()
+            offset += ITEM_DTYPE.itemsize * (num_items + num_container_items)
+        else:
+            items = []
+        if num_tags or num_strings:
+            self.read_strings(data, offset, num_tags, num_strings)
+
+        tag_ids = self.tag_ids[rays["tag"]]
+        rc_sensor.set_perception_arrays(rays["hit"], rays["distance"], tag_ids,
+                                        Sensors.ObjectInfoView(rays["name"], tag_ids, rays["distance"], self.strings))
+
+        (flags, speed, px, py, pz, rx, ry, rz, current_loc, target_loc) = STATE.unpack_from(data, HEADER.size)
+        strings = self.strings
+        inventory = [{"name": strings[name], "amount": amount} for name, amount in items]
+        i_state.set_state(rc_sensor.perception() if gui else None, flags & ~FROZEN, bool(flags & FROZEN), speed,
+                          (px, py, pz), (rx, ry, rz), strings[current_loc], strings[target_loc],
+                          inventory[:num_items], inventory[num_items:])
+
+    def read_strings(self, data, offset, num_tags, num_strings):
+        """
+        Reads the new tags (interning them in the sensor) and the new strings of a frame
+        """
+        tag_ids = self.tag_ids.tolist()
+        for i in range(num_tags + num_strings):
+            text_id, length = STRING_HEADER.unpack_from(data, offset)
+            offset += STRING_HEADER.size
+            text = bytes(data[offset:offset + length]).decode()
+            offset += length
+            table = tag_ids if i < num_tags else self.strings
+            if text_id != len(table):
+                raise ValueError(f"Unexpected string id {text_id}")
+            table.append(Sensors.intern_tag(text) if i < num_tags else text)
+        self.tag_ids = np.array(tag_ids, dtype=np.int16)
@@ -0,0 +1,177 @@
+#################################################
+# Codec of the websocket messages
+#################################################
+import json
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+'''
+Encoding and decoding of the messages exchanged with Unity.
+● Uses msgspec or orjson when they are installed (in that order) and the standard json module otherwise.
+● With msgspec, the "sensor" messages are decoded directly into typed structs: the rays into
+  (<num_ray_cast>, <hit>, HitInfo | None) tuples and the internal state into an AgentState.
+  The structs can be read like the dictionaries of the other backends (info["tag"], state["position"]["y"]),
+  so RayCastSensor and InternalState work the same with every backend.
+● "sensor_delta" messages (see LocalServer.py) are decoded into a SensorDelta: the changed rays typed like the ones
+  of the "sensor" messages and the changed fields of the internal state as a dictionary (only the ones present).
+'''
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _getitem(self, key):
+    try:
+        return getattr(self, key)
+    except AttributeError:
+        raise KeyError(key)
+
+
+def _get(self, key, default=None):
+    return getattr(self, key, default)
+
+
+def _items(self):
+    return ((field, getattr(self, field)) for field in self.__struct_fields__)
+
+
+if msgspec is not None:
+    class HitInfo(msgspec.Struct):
+        """
+        Object hit by a ray
+        """
+        name: str = ""
+        tag: str = ""
+        distance: float = -1.0
+        __getitem__ = _getitem
+        get = _get
+        items = _items
+
+    class Vector(msgspec.Struct):
+        """
+        Position (world coordinates) or rotation (y - Yaw, x - Pitch, z - Roll)
+        """
+        x: float = 0.0
+        y: float = 0.0
+        z: float = 0.0
+        __getitem__ = _getitem
+        get = _get
+        items = _items
+
+    class InventoryItem(msgspec.Struct):
+        name: str = ""
+        amount: int = 0
+        __getitem__ = _getitem
+        get = _get
+        items = _items
+
+    class AgentState(msgspec.Struct):
+        """
+        Internal state of the agent as sent by Unity (see InternalState)
+        """
+        isRotatingRight: bool = False
+        isRotatingLeft: bool = False
+        movingForwards: bool = False
+        movingBackwards: bool = False
+        isFrozen: Optional[bool] = None
+        speed: float = 0.0
+        position: Vector = msgspec.field(default_factory=Vector)
+        rotation: Vector = msgspec.field(default_factory=Vector)
+        currentNamedLoc: str = ""
+        onRoute: bool = False
+        targetNamedLoc: str = ""
+        myInventoryList: List[InventoryItem] = []
+        nearbyContainerInventory: bool = False
+        nearbyContainerInventoryList: List[InventoryItem] = []
+        __getitem__ = _getitem
+        get = _get
+        items = _items
+
+    Ray = Tuple[int, int, Optional[HitInfo]]
+
+    class SensorDelta(msgspec.Struct):
+        """
+        Changes since the previous sensor frame: rays that changed and {field: value} of the internal state
+        """
+        rays: List[Ray] = []
+        state: Dict[str, Any] = {}
+        __getitem__ = _getitem
+        get = _get
+        items = _items
+
+    class _Envelope(msgspec.Struct):
+        """
+        Message from Unity. The content is a string (sim_control, agent_control), the [rays, i_state] of a sensor
+        message or the SensorDelta of a sensor_delta message, so everything is decoded in a single pass
+        """
+        Type: str
+        Content: Union[str, Tuple[List[Ray], AgentState], SensorDelta] = ""
+
+    _envelope_decoder = msgspec.json.Decoder(_Envelope, strict=False)
+    _encoder = msgspec.json.Encoder()
+
+
+def _msgspec_loads(data):
+    return msgspec.json.decode(data)
+
+
+def _msgspec_dumps(obj):
+    return _encoder.encode(obj).decode()
+
+
+def _msgspec_decode_message(data):
+    try:
+        envelope = _envelope_decoder.decode(data)
+    except msgspec.ValidationError:
+        # Valid json with an unexpected layout: decode it without types
+        msg_dict = msgspec.json.decode(data)
+        return msg_dict["Type"], msg_dict["Content"]
+    return envelope.Type, envelope.Content
+
+
+def _orjson_dumps(obj):
+    return orjson.dumps(obj).decode()
+
+
+def _orjson_decode_message(data):
+    msg_dict = orjson.loads(data)
+    return msg_dict["Type"], msg_dict["Content"]
+
+
+def _json_decode_message(data):
+    msg_dict = json.loads(data)
+    return msg_dict["Type"], msg_dict["Content"]
+
+
+BACKENDS = {"json": (json.loads, json.dumps, _json_decode_message, (json.JSONDecodeError,))}
+if orjson is not None:
+    BACKENDS["orjson"] = (orjson.loads, _orjson_dumps, _orjson_decode_message, (orjson.JSONDecodeError,))
+if msgspec is not None:
+    BACKENDS["msgspec"] = (_msgspec_loads, _msgspec_dumps, _msgspec_decode_message,
+                           (msgspec.DecodeError, json.JSONDecodeError))
+
+backend = None
+loads = None
+dumps = None
+decode_message = None
+DecodeError = None
+
+
+def use_backend(name):
+    """
+    Selects the codec used by loads(), dumps() and decode_message()
+    :param name: "msgspec", "orjson" or "json"
+    """
+    global backend, loads, dumps, decode_message, DecodeError
+    loads, dumps, decode_message, DecodeError = BACKENDS[name]
+    backend = name
+
+
+# The fastest backend available
+use_backend("msgspec" if msgspec is not None else "orjson" if orjson is not None else "json")
@@ -0,0 +1,188 @@
+#################################################
+# Web dashboard of the agents of a Spawner run
+#################################################
+import asyncio
+import queue
+import threading
+import time
+
+from aiohttp import web
+
+'''
+One page with a table of all the agents of a Spawner run ("python Spawner.py ... --dashboard 8080", then open
+http://127.0.0.1:8080/):
+● Every worker samples its agents at a fixed rate (--dashboard-rate, 2 per second by default) reading their
+  current state: nothing is copied on the receive path of the agents.
+● The rows (position, current behaviour tree node or goal, frozen state and inventory) are sent to the Spawner
+  process through a bounded queue. If the dashboard falls behind, the samples are dropped, never the agents
+  blocked.
+● The Spawner serves the page and the last rows of every worker (/agents.json) from a background thread.
+'''
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>AAPE agents</title>
+<style>
+body { font-family: sans-serif; font-size: 13px; }
+table { border-collapse: collapse; }
+th, td { padding: 2px 8px; text-align: left; border-bottom: 1px solid #ddd; }
+td.num { text-align: right; font-family: monospace; }
+tr.frozen { background: #dbeafe; }
+</style>
+</head>
+<body>
+<h3>AAPE agents: <span id="count">0</span></h3>
+<table>
+<thead><tr><th>worker</th><th>#</th><th>agent</th><th>task</th><th>node</th><th>x</th><th>z</th><th>frozen</th>
+<th>inventory</th><th>age (s)</th></tr></thead>
+<tbody id="agents"></tbody>
+</table>
+<script>
+function cell(value, cls) {
+  const td = document.createElement("td");
+  td.textContent = value === null ? "" : value;
+  if (cls) td.className = cls;
+  return td;
+}
+async function refresh() {
+  try {
+    const response = await fetch("agents.json");
+    const data = await response.json();
+    const body = document.createElement("tbody");
+    body.id = "agents";
+    for (const row of data.agents) {
+      const tr = document.createElement("tr");
+      if (row.frozen) tr.className = "frozen";
+      tr.append(cell(row.worker), cell(row.id), cell(row.name), cell(row.task), cell(row.node),
+                cell(row.x, "num"), cell(row.z, "num"), cell(row.frozen ? "yes" : ""), cell(row.inventory),
+                cell(row.age, "num"));
+      body.append(tr);
+    }
+    document.getElementById("agents").replaceWith(body);
+    document.getElementById("count").textContent = data.agents.length;
+  } catch (e) {}
+  setTimeout(refresh, 500);
+}
+refresh();
+</script>
+</body>
+</html>
+"""
+
+
+def agent_row(agent_id, agent):
+    """
+    :return: the state shown in the dashboard of 'agent', read from its current attributes
+    """
+    i_state = agent.i_state
+    if agent.currentBT:
+        task = agent.currentBT
+        tip = agent.bts[task].behaviour_tree.tip() if task in agent.bts.instances else None
+        node = tip.name if tip else ""
+    else:
+        task = agent.currentGoal or ""
+        node = ""
+    return {"id": agent_id, "name": agent.AgentParameters["name"], "task": task, "node": node,
+            "x": round(i_state.position.x, 2), "z": round(i_state.position.z, 2),
+            "frozen": bool(i_state.isFrozen),
+            "inventory": " ".join(f"{item['name']}:{item['amount']}" for item in i_state.myInventoryList)}
+
+
+async def sample_agents(agents, publish, rate=2.0):
+    """
+    Publishes the rows of all the 'agents' 'rate' times per second till cancelled
+    :param publish: function that receives the list of rows
+    """
+    while True:
+        publish([agent_row(agent_id, agent) for agent_id, agent in enumerate(agents)])
+        await asyncio.sleep(1.0 / rate)
+
+
+def publish_to_queue(rows_queue, worker_id, rows):
+    """
+    Sends the rows of a worker to the dashboard. Drops them if the queue is full.
+    """
+    try:
+        rows_queue.put_nowait((worker_id, time.time(), rows))
+    except queue.Full:
+        pass
+
+
+class Dashboard:
+    def __init__(self, rows_queue, rate=2.0):
+        """
+        :param rows_queue: multiprocessing queue where the workers publish their rows (see publish_to_queue)
+        :param rate: times per second the queue is read
+        """
+        self.rows_queue = rows_queue
+        self.rate = rate
+        # worker id -> (time of the sample, rows)
+        self.rows = {}
+        self.app = web.Application()
+        self.app.router.add_get("/", self.handle_page)
+        self.app.router.add_get("/agents.json", self.handle_agents)
+        self.runner = None
+        self.loop = None
+        self.thread = None
+
+    async def handle_page(self, request):
+        return web.Response(text=PAGE, content_type="text/html")
+
+    async def handle_agents(self, request):
+        now = time.time()
+        agents = []
+        for worker_id in sorted(self.rows):
+            sampled_at, rows = self.rows[worker_id]
+            age = round(now - sampled_at, 1)
+            agents.extend(dict(row, worker=worker_id, age=age) for row in rows)
+        return web.json_response({"agents": agents})
+
+    async def read_queue(self):
+        while True:
+            try:
+                while True:
+                    worker_id, sampled_at, rows = self.rows_queue.get_nowait()
+                    self.rows[worker_id] = (sampled_at, rows)
+            except queue.Empty:
+                pass
+            await asyncio.sleep(1.0 / self.rate)
+
+    async def serve(self, host, port, started):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        reader = asyncio.create_task(self.read_queue())
+        started.set()
+        try:
+            await asyncio.Event().wait()  # Till the loop is stopped
+        finally:
+            reader.cancel()
+            await self.runner.cleanup()
+
+    def start(self, host="127.0.0.1", port=8080):
+        """
+        Serves the dashboard from a background thread with its own event loop
+        """
+        started = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            task = self.loop.create_task(self.serve(host, port, started))
+            try:
+                self.loop.run_until_complete(task)
+            except asyncio.CancelledError:
+                pass
+            finally:
+                self.loop.close()
+
+        self.thread = threading.Thread(target=run, name="Dashboard", daemon=True)
+        self.thread.start()
+        started.wait(timeout=5)
+        print(f"Dashboard at http://{host}:{port}/")
+
+    def stop(self):
+        if self.loop and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(lambda: [task.cancel() for task in asyncio.all_tasks(self.loop)])
+            self.thread.join(timeout=5)
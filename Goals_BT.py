@@ -1,9 +1,12 @@
 import math
 import random
 import asyncio
+import time
+import Log
 import Sensors
 from collections import Counter
 
+log = Log.get_logger(__name__)
 
 def calculate_distance(point_a, point_b):
     distance = math.sqrt((point_b['x'] - point_a['x']) ** 2 +
@@ -12,9 +15,238 @@ def calculate_distance(point_a, point_b):
     return distance
 
 
+def distance_reached(origin, dist):
+    """
+    :return: condition for InternalState.wait_until, true once the agent is 'dist' or farther from 'origin'
+    """
+    x, y, z = origin["x"], origin["y"], origin["z"]
+    # Checked on every frame: reads the attributes of the position (AAgent_BT.Vec3), faster than its keys
+    return lambda i_state: math.dist((x, y, z), (i_state.position.x, i_state.position.y, i_state.position.z)) >= dist
+
+
+def heading_difference(target, current):
+    """
+    :return: shortest rotation (degrees, from -180 to 180) from the heading 'current' to 'target'. Positive to
+    the right
+    """
+    return (target - current + 180) % 360 - 180
+
+
+class HeadingController:
+    """
+    Turns the agent to a target heading (rotation y):
+    ● Turns to the side of the shortest rotation, so the targets around 0/360 degrees are reached the short way.
+    ● Estimates the rotation speed and the time between sensor frames from the successive frames, and sends the
+      stop ("nt") on the last frame before the target when stopping there lands closer than stopping on the next
+      one, instead of waiting to be within the tolerance (which overshoots by up to a frame of rotation).
+    ● If the agent overshoots anyway, turns back (counted in 'corrections').
+    The goals use turn_to. The behaviour tree nodes call start in initialise, update in every tick and stop in
+    terminate, and send the actions they return with send.
+    """
+    TOLERANCE = 5  # degrees
+
+    def __init__(self, a_agent, tolerance=TOLERANCE):
+        self.a_agent = a_agent
+        self.i_state = a_agent.i_state
+        self.tolerance = tolerance
+        self.target = None
+        self.direction = 0  # 1 turning right, -1 turning left, 0 not turning
+        self.done = True
+        # Estimations, kept from one turn to the next
+        self.rate = None  # degrees per second
+        self.frame_interval = None  # seconds
+        # (update number, heading, arrival time, rotating) of the last sensor frame checked
+        self.last_frame = None
+        self.corrections = 0
+        self.task = None
+
+    def start(self, target):
+        """
+        Starts turning to the heading 'target'
+        :return: action to send, None if the agent is already within the tolerance
+        """
+        self.target = target % 360
+        self.direction = 0
+        self.done = False
+        return self.update()
+
+    def update(self):
+        """
+        Checks the last sensor frame (once per frame while turning)
+        :return: action to send or None
+        """
+        i_state = self.i_state
+        if self.done or (self.direction and self.last_frame[0] == i_state.updates):
+            return None
+        heading = i_state.rotation.y
+        arrival = self.a_agent.sensor_frame_time
+        rotating = i_state.isRotatingRight or i_state.isRotatingLeft
+        # The arrival times are None before the first sensor frame: nothing to estimate from
+        if self.last_frame and self.last_frame[0] == i_state.updates - 1 and arrival is not None \
+                and self.last_frame[2] is not None and arrival > self.last_frame[2]:
+            elapsed = arrival - self.last_frame[2]
+            self.frame_interval = elapsed if self.frame_interval is None else 0.8 * self.frame_interval + 0.2 * elapsed
+            if rotating and self.last_frame[3]:  # Rotating during the whole interval
+                rate = abs(heading_difference(heading, self.last_frame[1])) / elapsed
+                self.rate = rate if self.rate is None else 0.5 * self.rate + 0.5 * rate
+        self.last_frame = (i_state.updates, heading, arrival, rotating)
+
+        remaining = heading_difference(self.target, heading)
+        side = 1 if remaining > 0 else -1
+        if self.direction == 0 or side != self.direction:
+            if abs(remaining) <= self.tolerance:
+                return self.finish()
+            if self.direction:  # Overshot, turn back
+                self.corrections += 1
+            self.direction = side
+            return "tr" if side > 0 else "tl"
+        # Turning towards the target: stop now if it lands closer than stopping on the next frame
+        if self.rate and self.frame_interval:
+            if abs(remaining) <= self.rate * self.frame_interval / 2:
+                return self.finish()
+        elif abs(remaining) <= self.tolerance:
+            return self.finish()
+        return None
+
+    def finish(self):
+        self.done = True
+        if self.direction:
+            self.direction = 0
+            return "nt"
+        return None
+
+    def stop(self):
+        """
+        Interrupts the turn
+        :return: action to send or None
+        """
+        return None if self.done else self.finish()
+
+    def send(self, action):
+        """
+        Sends 'action' (if any) in a new task, for the behaviour tree nodes. The task waits for the one of the
+        previous action, so the actions are sent in order and 'task' is the only one to wait for or cancel.
+        """
+        if action:
+            self.task = asyncio.create_task(self.send_after(self.task, action))
+
+    async def send_after(self, previous, action):
+        if previous is not None:
+            await previous  # Cancelled with this task
+        try:
+            await self.a_agent.send_message("action", action)
+        except Exception as e:
+            log.warning("Could not send the action %s: %s", action, e)
+
+    async def turn_to(self, target):
+        """
+        Turns to the heading 'target', sending the actions and waiting for the sensor frames
+        :return: True when done
+        """
+        action = self.start(target)
+        while True:
+            if action:
+                await self.a_agent.send_message("action", action)
+            if self.done:
+                return True
+            await self.i_state.next_update(0.5)
+            self.a_agent.mark_decision()
+            action = self.update()
+
+
+def goal_runner(a_agent):
+    """
+    :return: the GoalRunner of 'a_agent', created the first time
+    """
+    if a_agent.goal_runner is None:
+        a_agent.goal_runner = GoalRunner(a_agent)
+    return a_agent.goal_runner
+
+
+class GoalRunner:
+    """
+    Runs the motion goals started by the behaviour tree nodes of an agent (one per agent, see goal_runner):
+    ● At most one goal is active. Starting a goal cancels the active one, and the new one runs once the cancelled one
+      has finished (e.g. after sending its stop action), so their actions never interleave.
+    ● One object is created per goal class and reused, with the new parameters (configure), every time it starts.
+    ● The node that started a goal polls its status and cancels it when it terminates. Neither affects the goal
+      started afterwards by another node.
+    """
+    RUNNING = 0
+    SUCCESS = 1  # The goal returned True
+    FAILURE = 2  # The goal returned False (e.g. stuck)
+    ERROR = 3  # The goal raised an exception, or the node's goal was replaced by another one
+
+    def __init__(self, a_agent):
+        self.a_agent = a_agent
+        # goal class -> goal object
+        self.goals = {}
+        self.goal = None
+        self.task = None
+        self.owner = None
+        self.tasks_created = 0
+        self.start_time = time.monotonic()
+
+    def start(self, owner, goal_class, *args, pre_actions=()):
+        """
+        Starts goal_class with the parameters 'args' (the ones of its constructor after the agent)
+        :param owner: node that starts the goal
+        :param pre_actions: actions sent before running the goal, e.g. "nt" to stop turning
+        """
+        previous = self.task
+        if previous and not previous.done():
+            previous.cancel()
+        goal = self.goals.get(goal_class)
+        if goal is None:
+            goal = self.goals[goal_class] = goal_class(self.a_agent, *args)
+        self.goal = goal
+        self.task = asyncio.create_task(self.run_goal(previous, goal, args, pre_actions))
+        self.owner = owner
+        self.tasks_created += 1
+
+    async def run_goal(self, previous, goal, args, pre_actions):
+        if previous and not previous.done():
+            await asyncio.wait([previous])
+        if hasattr(goal, "configure"):
+            goal.configure(*args)
+        for action in pre_actions:
+            if action:
+                await self.a_agent.send_message("action", action)
+        return await goal.run()
+
+    def status(self, owner):
+        """
+        :return: status of the goal started by 'owner': RUNNING, SUCCESS, FAILURE or ERROR
+        """
+        if owner is not self.owner or self.task is None:
+            return self.ERROR
+        if not self.task.done():
+            return self.RUNNING
+        if self.task.cancelled():
+            return self.ERROR
+        if self.task.exception():
+            log.warning("Exception in goal %s: %s", type(self.goal).__name__, self.task.exception())
+            return self.ERROR
+        return self.SUCCESS if self.task.result() else self.FAILURE
+
+    def cancel(self, owner):
+        """
+        Cancels the goal started by 'owner', if it is still the active one
+        """
+        if owner is self.owner:
+            if self.task and not self.task.done():
+                self.task.cancel()
+            self.owner = None
+
+    def report(self):
+        minutes = max(time.monotonic() - self.start_time, 1e-9) / 60
+        return (f"Goals started: {self.tasks_created} ({self.tasks_created / minutes:.1f}/min)  "
+                f"goal objects: {len(self.goals)}")
+
+
 class DoNothing:
     """
-    Does nothing
+    Does nothing for a second, or till the agent is unfrozen if it is frozen
     """
     def __init__(self, a_agent):
         self.a_agent = a_agent
@@ -23,7 +255,10 @@ class DoNothing:
 
     async def run(self):
         # print("Doing nothing")
-        await asyncio.sleep(1)
+        if self.i_state.isFrozen:
+            await self.i_state.wait_until(lambda i_state: not i_state.isFrozen, timeout=1)
+        else:
+            await asyncio.sleep(1)
         return True
 
 class ForwardDist:
@@ -40,11 +275,17 @@ class ForwardDist:
         self.a_agent = a_agent
         self.rc_sensor = a_agent.rc_sensor
         self.i_state = a_agent.i_state
+        self.configure(dist, d_min, d_max)
+        self.starting_pos = a_agent.i_state.position.copy()
+
+    def configure(self, dist, d_min, d_max):
+        """
+        Sets the distance of the next run (see GoalRunner)
+        """
         self.original_dist = dist
         self.target_dist = dist
         self.d_min = d_min
         self.d_max = d_max
-        self.starting_pos = a_agent.i_state.position
         self.state = self.STOPPED
 
     async def run(self):
@@ -53,7 +294,7 @@ class ForwardDist:
             while True:
                 if self.state == self.STOPPED:
                     # starting position before moving
-                    self.starting_pos = self.a_agent.i_state.position
+                    self.starting_pos = self.a_agent.i_state.position.copy()
                     # Before start moving, calculate the distance we want to move
                     if self.original_dist < 0:
                         self.target_dist = random.randint(self.d_min, self.d_max)
@@ -65,8 +306,10 @@ class ForwardDist:
                     self.state = self.MOVING
 
                 elif self.state == self.MOVING:
-                    # If we are moving
-                    await asyncio.sleep(0.5)  # Wait for a little movement
+                    # If we are moving, wait till the first sensor frame past the target distance (at most 0.5s, to
+                    # check that we are not stuck)
+                    await self.i_state.wait_until(distance_reached(self.starting_pos, self.target_dist), 0.5)
+                    self.a_agent.mark_decision()  # Decide on the last sensor frame (see Latency.py)
                     current_dist = calculate_distance(self.starting_pos, self.i_state.position)
 
                     if current_dist >= self.target_dist:  # Check if we already have covered the required distance
@@ -80,10 +323,10 @@ class ForwardDist:
                         return False
                     previous_dist = current_dist
                 else:
-                    print("Unknown state: " + str(self.state))
+                    log.error("Unknown state: %s", self.state)
                     return False
         except asyncio.CancelledError:
-            print("***** TASK Forward CANCELLED")
+            log.debug("***** TASK Forward CANCELLED")
             await self.a_agent.send_message("action", "ntm")
             self.state = self.STOPPED
 
@@ -101,11 +344,17 @@ class BackwardDist:
         self.a_agent = a_agent
         self.rc_sensor = a_agent.rc_sensor
         self.i_state = a_agent.i_state
+        self.configure(dist, d_min, d_max)
+        self.starting_pos = a_agent.i_state.position.copy()
+
+    def configure(self, dist, d_min, d_max):
+        """
+        Sets the distance of the next run (see GoalRunner)
+        """
         self.original_dist = dist
         self.target_dist = dist
         self.d_min = d_min
         self.d_max = d_max
-        self.starting_pos = a_agent.i_state.position
         self.state = self.STOPPED
 
     async def run(self):
@@ -114,7 +363,7 @@ class BackwardDist:
             while True:
                 if self.state == self.STOPPED:
                     # starting position before moving
-                    self.starting_pos = self.a_agent.i_state.position
+                    self.starting_pos = self.a_agent.i_state.position.copy()
                     # Before start moving, calculate the distance we want to move
                     if self.original_dist < 0:
                         self.target_dist = random.randint(self.d_min, self.d_max)
@@ -122,13 +371,14 @@ class BackwardDist:
                         self.target_dist = self.original_dist
                     
                     # Start moving
-                    print(f"Starting movement to target distance: {self.target_dist}")
+                    log.debug("Starting movement to target distance: %s", self.target_dist)
                     await self.a_agent.send_message("action", "mb")
                     self.state = self.MOVING
 
                 elif self.state == self.MOVING:
                     # If we are moving
-                    await asyncio.sleep(0.5)  # Wait for a little movement
+                    await self.i_state.wait_until(distance_reached(self.starting_pos, self.target_dist), 0.5)
+                    self.a_agent.mark_decision()
                     current_dist = calculate_distance(self.starting_pos, self.i_state.position)
 
                     if current_dist >= self.target_dist:  # Check if we already have covered the required distance
@@ -144,10 +394,10 @@ class BackwardDist:
                         return False
                     previous_dist = current_dist
                 else:
-                    print("Unknown state: " + str(self.state))
+                    log.error("Unknown state: %s", self.state)
                     return False
         except asyncio.CancelledError:
-            print("***** TASK Forward CANCELLED")
+            log.debug("***** TASK Forward CANCELLED")
             await self.a_agent.send_message("action", "ntm")
             self.state = self.STOPPED
 
@@ -169,43 +419,41 @@ class Turn:
 
         self.current_heading = 0
         self.new_heading = 0
+        self.heading = HeadingController(a_agent)
 
         self.state = self.SELECTING
 
+    def configure(self):
+        """
+        Starts with a new turn in the next run (see GoalRunner)
+        """
+        self.state = self.SELECTING
+
     async def run(self):
         try:
             while True:
+                self.a_agent.mark_decision()
                 if self.state == self.SELECTING:
                     # print("SELECTING NEW TURN")
                     rotation_direction = random.choice([-1, 1])
                     # print(f"Rotation direction: {rotation_direction}")
                     rotation_degrees = random.uniform(1, 180) * rotation_direction
                     # print("Degrees: " + str(rotation_degrees))
-                    current_heading = self.i_state.rotation["y"]
+                    current_heading = self.i_state.rotation.y
                     # print(f"Current heading: {current_heading}")
                     self.new_heading = (current_heading + rotation_degrees) % 360
                     if self.new_heading == 360:
                         self.new_heading = 0.0
                     # print(f"New heading: {self.new_heading}")
-                    if rotation_direction == self.RIGHT:
-                        await self.a_agent.send_message("action", "tr")
-                    else:
-                        await self.a_agent.send_message("action", "tl")
                     self.state = self.TURNING
                 elif self.state == self.TURNING:
-                    # check if we have finished the rotation
-                    current_heading = self.i_state.rotation["y"]
-                    final_condition = abs(current_heading - self.new_heading)
-                    if final_condition < 5:
-                        await self.a_agent.send_message("action", "nt")
-                        current_heading = self.i_state.rotation["y"]
-                        # print(f"Current heading: {current_heading}")
-                        # print("TURNING DONE.")
-                        self.state = self.SELECTING
-                        return True
-                await asyncio.sleep(0)
+                    # The shortest rotation is to the side of rotation_direction (at most 180 degrees)
+                    await self.heading.turn_to(self.new_heading)
+                    # print("TURNING DONE.")
+                    self.state = self.SELECTING
+                    return True
         except asyncio.CancelledError:
-            print("***** TASK Turn CANCELLED")
+            log.debug("***** TASK Turn CANCELLED")
             await self.a_agent.send_message("action", "nt")
 
             
@@ -224,6 +472,7 @@ class RandomRoam:
             # Initialize the probabilities for the different actions
             probabilities = {"resume": 0.5, "turn": 0.3, "stop": 0.2}
             while True:
+                self.a_agent.mark_decision()
                 action = random.choices(list(probabilities.keys()), list(probabilities.values()))[0]
                 if action == "turn":
                     sensor_hits = self.rc_sensor.sensor_rays[Sensors.RayCastSensor.HIT]
@@ -243,7 +492,7 @@ class RandomRoam:
                     await self.a_agent.send_message("action", "mf")
                     await asyncio.sleep(3)
         except asyncio.CancelledError:
-            print("***** TASK RandomRoam CANCELLED")
+            log.debug("***** TASK RandomRoam CANCELLED")
             await self.a_agent.send_message("action", "stop")
 import random  
 
@@ -259,9 +508,10 @@ class Avoid:
     
     async def run(self):
         try:
-            print("AVOID (from goals)")
+            log.info("AVOID (from goals)")
             await self.a_agent.send_message("action", "mf")
             while True:
+                self.a_agent.mark_decision()
                 sensor_hits = self.rc_sensor.sensor_rays[Sensors.RayCastSensor.HIT]
                 
                 if any(ray_hit == 1 for ray_hit in sensor_hits):             
@@ -292,7 +542,7 @@ class Avoid:
                     await self.a_agent.send_message("action", "nt")
                 
         except asyncio.CancelledError:
-            print("***** TASK Avoid CANCELLED")
+            log.debug("***** TASK Avoid CANCELLED")
             await self.a_agent.send_message("action", "stop")
             
 class AvoidForCritters:
@@ -306,15 +556,15 @@ class AvoidForCritters:
     
     async def run(self):
         try:
-            print("AvoidForCritters (from goals)")
+            log.debug("AvoidForCritters (from goals)")
             await self.a_agent.send_message("action", "mf")
             while True:
+                self.a_agent.mark_decision()
                 sensor_hits = self.rc_sensor.sensor_rays[Sensors.RayCastSensor.HIT]
-                sensor_info = self.rc_sensor.sensor_rays[Sensors.RayCastSensor.OBJECT_INFO]
 
-                critter_nearby = any(info and info.get("tag") == "CritterMantaRay" for info in sensor_info)
+                critter_nearby = self.rc_sensor.has("CritterMantaRay")
                 if critter_nearby: ## Check if any of the sensors detected a critter
-                    print("      From Avoid: Another critter detected! Swerving...")
+                    log.debug("      From Avoid: Another critter detected! Swerving...")
                     await self.a_agent.send_message("action", "stop")
                     await self.a_agent.send_message("action", "tr") # Move right
                     await asyncio.sleep(0.5)
@@ -351,6 +601,6 @@ class AvoidForCritters:
                     await self.a_agent.send_message("action", "nt")
 
         except asyncio.CancelledError:
-            print("***** TASK AvoidForCritters CANCELLED")
+            log.debug("***** TASK AvoidForCritters CANCELLED")
             await self.a_agent.send_message("action", "stop")
 
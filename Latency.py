@@ -0,0 +1,167 @@
+#################################################
+# Sensor-to-action latency histograms
+#################################################
+import contextvars
+import signal
+import time
+
+'''
+Latency measurement of the agents.
+● Every "sensor" frame is timestamped when it arrives (AAgent.receive_messages).
+● The frame a decision is based on is kept in the context variable 'decision_frame': AAgent.wait_tick sets it
+  before every behaviour tree tick, so the tasks created by the nodes during the tick inherit it, and the goals
+  mark their own decision points (AAgent.mark_decision) when they look at the sensors again.
+● AAgent.send_message records, for every action, the time since the arrival of its decision frame.
+● AAgent prints its histograms at exit if Misc.latency_report is true. Spawner prints the histograms of all its
+  agents at exit, and both print them on demand when the process receives SIGUSR1 (kill -USR1 <pid>).
+● The values are aggregated in HDR-style histograms: exact up to 'SUB_BUCKETS' microseconds and log-linear after
+  that (relative error below 1 / (SUB_BUCKETS / 2)), so the memory is fixed and histograms can be merged.
+'''
+
+# Arrival time (time.perf_counter) of the sensor frame the current decision is based on
+decision_frame = contextvars.ContextVar("decision_frame", default=None)
+
+SUB_BITS = 7
+SUB_BUCKETS = 1 << SUB_BITS
+HALF_BUCKETS = SUB_BUCKETS >> 1
+MAX_VALUE_US = 60_000_000  # Longer latencies are counted as 60 s
+
+
+def bucket_index(value_us):
+    if value_us < SUB_BUCKETS:
+        return value_us
+    shift = value_us.bit_length() - SUB_BITS
+    return SUB_BUCKETS + (shift - 1) * HALF_BUCKETS + ((value_us >> shift) - HALF_BUCKETS)
+
+
+def bucket_value(index):
+    """
+    :return: highest value (microseconds) counted in the bucket 'index'
+    """
+    if index < SUB_BUCKETS:
+        return index
+    shift = (index - SUB_BUCKETS) // HALF_BUCKETS + 1
+    sub = (index - SUB_BUCKETS) % HALF_BUCKETS + HALF_BUCKETS
+    return ((sub + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """
+    Histogram of latencies. The values are recorded in seconds and stored in microseconds.
+    """
+    def __init__(self):
+        self.counts = [0] * (bucket_index(MAX_VALUE_US) + 1)
+        self.count = 0
+        self.total_us = 0
+        self.min_us = None
+        self.max_us = 0
+
+    def record(self, seconds):
+        value_us = min(max(int(seconds * 1_000_000), 0), MAX_VALUE_US)
+        self.counts[bucket_index(value_us)] += 1
+        self.count += 1
+        self.total_us += value_us
+        if self.min_us is None or value_us < self.min_us:
+            self.min_us = value_us
+        if value_us > self.max_us:
+            self.max_us = value_us
+
+    def percentile(self, p):
+        """
+        :param p: percentile, from 0 to 100
+        :return: latency in seconds (upper bound of its bucket) or None if the histogram is empty
+        """
+        if not self.count:
+            return None
+        target = max(1, -(-self.count * p // 100))  # ceil
+        accumulated = 0
+        for index, bucket_count in enumerate(self.counts):
+            accumulated += bucket_count
+            if accumulated >= target:
+                return min(bucket_value(index), self.max_us) / 1_000_000
+        return self.max_us / 1_000_000
+
+    def mean(self):
+        return self.total_us / self.count / 1_000_000 if self.count else None
+
+    def merge(self, other):
+        for index, bucket_count in enumerate(other.counts):
+            if bucket_count:
+                self.counts[index] += bucket_count
+        self.count += other.count
+        self.total_us += other.total_us
+        if other.min_us is not None and (self.min_us is None or other.min_us < self.min_us):
+            self.min_us = other.min_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def to_dict(self):
+        """
+        :return: compact representation (only the non-empty buckets), e.g. to send it to another process
+        """
+        return {"count": self.count, "total_us": self.total_us, "min_us": self.min_us, "max_us": self.max_us,
+                "buckets": {index: c for index, c in enumerate(self.counts) if c}}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.count = data["count"]
+        histogram.total_us = data["total_us"]
+        histogram.min_us = data["min_us"]
+        histogram.max_us = data["max_us"]
+        for index, bucket_count in data["buckets"].items():
+            histogram.counts[int(index)] = bucket_count
+        return histogram
+
+    def summary(self):
+        if not self.count:
+            return "no samples"
+        ms = [1000 * v for v in (self.percentile(50), self.percentile(95), self.percentile(99))]
+        return (f"n={self.count}  p50={ms[0]:.1f}ms  p95={ms[1]:.1f}ms  p99={ms[2]:.1f}ms  "
+                f"max={self.max_us / 1000:.1f}ms")
+
+
+class LatencyTracker:
+    """
+    Latency histograms of an agent:
+    ● frame_to_tick: age of the newest sensor frame when the behaviour tree is ticked (cost of the tick waits).
+    ● frame_to_action: time from the arrival of the decision frame to the action leaving send_message.
+    """
+    KINDS = ("frame_to_tick", "frame_to_action")
+
+    def __init__(self):
+        self.histograms = {kind: LatencyHistogram() for kind in self.KINDS}
+
+    def record(self, kind, since):
+        """
+        Records the time elapsed since the perf_counter timestamp 'since'
+        """
+        self.histograms[kind].record(time.perf_counter() - since)
+
+    def merge(self, other):
+        for kind, histogram in other.histograms.items():
+            self.histograms[kind].merge(histogram)
+
+    def to_dict(self):
+        return {kind: histogram.to_dict() for kind, histogram in self.histograms.items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        tracker = cls()
+        for kind, histogram in data.items():
+            tracker.histograms[kind] = LatencyHistogram.from_dict(histogram)
+        return tracker
+
+    def report(self, title):
+        lines = [f"Latency {title}:"]
+        for kind, histogram in self.histograms.items():
+            lines.append(f"  {kind:<16}{histogram.summary()}")
+        return "\n".join(lines)
+
+
+def dump_on_signal(report):
+    """
+    Prints report() every time the process receives SIGUSR1. Must be called from the main thread.
+    Does nothing where SIGUSR1 does not exist (Windows).
+    """
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: print(report(), flush=True))
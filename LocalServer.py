@@ -0,0 +1,611 @@
+#################################################
+# Headless local stand-in for the Unity AAPE server
+#################################################
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+
+from aiohttp import web, WSMsgType
+
+import BinaryFrame
+
+'''
+Speaks the same websocket protocol as the AAPE Unity server so the agents (AAgent_BT.py / Spawner.py) can run
+without Unity:
+● Agent -> Server: {"type": <msg_type>, "content": <msg_content>}
+    ○ initial_params: json string with the AgentParameters of the agent. Extension: "sensor_delta": <n> asks for
+      delta frames with a keyframe every n frames, "sensor_binary": true asks for binary sensor frames
+    ○ action: mf, mb, tr, tl, nt, ntm, stop, collect, walk_to,<loc>, teleport_to,<loc>, leave,<item>,<amount>
+● Server -> Agent: {"Type": <msg_type>, "Content": <msg_content>}
+    ○ sim_control: connection_ready | start | on_hold | error
+    ○ agent_control: <command>:<data> (the initial_task of the agent, e.g. bt:BTCollectRun)
+    ○ sensor: [rays, i_state]
+    ○ sensor_delta (only to the agents that asked for it): {"rays": <rays that changed>, "state": {<fields of
+      i_state that changed>: <value>}} since the previous frame. The first frame and every n-th one are full sensor
+      frames (keyframes).
+    ○ Binary websocket messages (only to the agents that asked for them): the sensor frames in the format of
+      BinaryFrame.py, instead of the json sensor and sensor_delta messages
+
+The world is a flat square arena (x, z plane) surrounded by walls, with some inner walls, a Base outpost and
+alien flowers spread over the harvest zone. Critters that touch an astronaut freeze her for 5 seconds and she
+loses one flower.
+
+Usage: python LocalServer.py [--port 4649] [--rate 20] [--flowers 12] [--hold] [--seed 0]
+'''
+
+ASTRONAUT_TAG = "Astronaut"
+CRITTER_TAG = "CritterMantaRay"
+FLOWER_TAG = "AlienFlower"
+WALL_TAG = "Wall"
+
+AGENT_TAGS = {"AAgentAstronaut": ASTRONAUT_TAG,
+              "AAgentCritterMantaRay": CRITTER_TAG}
+
+
+class NamedLocation:
+    """
+    Rectangular named area of the world (e.g. the Base outpost). It can hold a container inventory.
+    """
+    def __init__(self, name, x_min, z_min, x_max, z_max, container=False):
+        self.name = name
+        self.x_min = x_min
+        self.z_min = z_min
+        self.x_max = x_max
+        self.z_max = z_max
+        self.container = container
+        self.inventory = {}
+
+    def contains(self, x, z):
+        return self.x_min <= x <= self.x_max and self.z_min <= z <= self.z_max
+
+    def center(self):
+        return (self.x_min + self.x_max) / 2, (self.z_min + self.z_max) / 2
+
+
+class WorldObject:
+    """
+    Circular object of the world that can be hit by the sensor rays (flowers)
+    """
+    def __init__(self, name, tag, x, z, radius):
+        self.name = name
+        self.tag = tag
+        self.x = x
+        self.z = z
+        self.radius = radius
+
+
+class SimAgent:
+    """
+    Server side representation of a connected agent
+    """
+    STOPPED = 0
+    FORWARD = 1
+    BACKWARD = -1
+
+    def __init__(self, ws, params, agent_id, x, z, yaw):
+        self.ws = ws
+        self.params = params
+        self.agent_id = agent_id
+        self.name = f"{params.get('name', 'AAgent')}_{agent_id}"
+        self.tag = AGENT_TAGS.get(params.get("type", ""), ASTRONAUT_TAG)
+        self.radius = 0.5
+        self.x = x
+        self.z = z
+        self.yaw = yaw
+        self.translation = self.STOPPED
+        self.rotation = 0  # -1 left, 1 right
+        self.frozen_until = 0.0
+        self.bite_cooldown_until = 0.0
+        self.inventory = {}
+        self.route_target = None
+        self.route_name = ""
+        self.running = False
+
+        ray_param = params.get("ray_perception_sensor_param", [2, 45, 0, 5])
+        self.rays_per_direction = ray_param[0]
+        self.max_ray_degrees = ray_param[1]
+        self.sphere_cast_radius = ray_param[2]
+        self.ray_length = ray_param[3]
+        if self.rays_per_direction > 0:
+            step = self.max_ray_degrees / self.rays_per_direction
+        else:
+            step = 0.0
+        self.ray_angles = [(r - self.rays_per_direction) * step for r in range((self.rays_per_direction * 2) + 1)]
+
+        # Delta frames (0: only full frames), see LocalServer.sensor_message
+        self.sensor_delta = int(params.get("sensor_delta") or 0)
+        self.last_rays = None
+        self.last_state = None
+        self.frames_since_keyframe = 0
+        # Binary frames (see BinaryFrame.py), the encoder keeps the strings already sent
+        self.frame_encoder = BinaryFrame.FrameEncoder() if params.get("sensor_binary") else None
+
+        # Statistics
+        self.frames_sent = 0
+        self.delta_frames_sent = 0
+        self.bytes_sent = 0
+        self.actions_received = 0
+        self.connected_at = time.monotonic()
+        self.first_action_at = None
+
+    def is_frozen(self, now):
+        return now < self.frozen_until
+
+
+class World:
+    """
+    Simple 2D world: walls are segments, flowers and agents are circles
+    """
+    def __init__(self, size=40.0, num_flowers=12, seed=None):
+        self.random = random.Random(seed)
+        self.size = size
+        half = size / 2
+        # Exterior walls plus a couple of inner walls
+        self.walls = [(-half, -half, half, -half), (half, -half, half, half),
+                      (half, half, -half, half), (-half, half, -half, -half),
+                      (-5.0, 5.0, 5.0, 5.0), (8.0, -8.0, 8.0, 2.0)]
+        self.base = NamedLocation("Base", -half + 1, -half + 1, -half + 7, -half + 7, container=True)
+        self.locations = {self.base.name: self.base}
+        self.flowers = []
+        self.flower_count = 0
+        for _ in range(num_flowers):
+            self.spawn_flower()
+        self.agents = {}
+
+    def random_free_point(self, margin=2.0):
+        half = self.size / 2 - margin
+        while True:
+            x = self.random.uniform(-half, half)
+            z = self.random.uniform(-half, half)
+            if self.base.contains(x, z):
+                continue
+            if any(self.distance_to_wall(x, z, w) < margin for w in self.walls[4:]):
+                continue
+            return x, z
+
+    def spawn_flower(self):
+        x, z = self.random_free_point()
+        self.flower_count += 1
+        self.flowers.append(WorldObject(f"AlienFlower_{self.flower_count}", FLOWER_TAG, x, z, 0.3))
+
+    @staticmethod
+    def distance_to_wall(x, z, wall):
+        x1, z1, x2, z2 = wall
+        dx, dz = x2 - x1, z2 - z1
+        length2 = dx * dx + dz * dz
+        t = 0.0 if length2 == 0 else max(0.0, min(1.0, ((x - x1) * dx + (z - z1) * dz) / length2))
+        return math.hypot(x - (x1 + t * dx), z - (z1 + t * dz))
+
+    def blocked(self, agent, x, z):
+        if any(self.distance_to_wall(x, z, w) < agent.radius for w in self.walls):
+            return True
+        for other in self.agents.values():
+            if other is not agent and math.hypot(other.x - x, other.z - z) < agent.radius + other.radius:
+                # Allow moving away from an agent we are already touching
+                if math.hypot(other.x - x, other.z - z) < math.hypot(other.x - agent.x, other.z - agent.z):
+                    return True
+        return False
+
+    def cast_ray(self, agent, angle):
+        """
+        Casts a ray from the agent with a relative angle (degrees, positive to the right).
+        :return: (distance, name, tag) of the closest hit or None
+        """
+        heading = math.radians(agent.yaw + angle)
+        dx, dz = math.sin(heading), math.cos(heading)
+        best = None
+        length = agent.ray_length
+        sphere = agent.sphere_cast_radius
+
+        def consider(dist, name, tag):
+            nonlocal best
+            if 0.0 <= dist <= length and (best is None or dist < best[0]):
+                best = (dist, name, tag)
+
+        for obj in self.flowers:
+            consider(self.ray_circle(agent.x, agent.z, dx, dz, obj.x, obj.z, obj.radius + sphere), obj.name, obj.tag)
+        for other in self.agents.values():
+            if other is not agent:
+                consider(self.ray_circle(agent.x, agent.z, dx, dz, other.x, other.z, other.radius + sphere),
+                         other.name, other.tag)
+        for i, wall in enumerate(self.walls):
+            dist = self.ray_segment(agent.x, agent.z, dx, dz, wall)
+            if dist is not None:
+                consider(max(0.0, dist - sphere), f"Wall_{i}", WALL_TAG)
+        return best
+
+    @staticmethod
+    def ray_circle(ox, oz, dx, dz, cx, cz, radius):
+        fx, fz = ox - cx, oz - cz
+        b = fx * dx + fz * dz
+        c = fx * fx + fz * fz - radius * radius
+        disc = b * b - c
+        if disc < 0:
+            return -1.0
+        sq = math.sqrt(disc)
+        t = -b - sq
+        if t < 0:
+            t = -b + sq if c > 0 else 0.0
+        return t
+
+    @staticmethod
+    def ray_segment(ox, oz, dx, dz, wall):
+        x1, z1, x2, z2 = wall
+        ex, ez = x2 - x1, z2 - z1
+        denom = dx * ez - dz * ex
+        if abs(denom) < 1e-9:
+            return None
+        t = ((x1 - ox) * ez - (z1 - oz) * ex) / denom
+        u = ((x1 - ox) * dz - (z1 - oz) * dx) / denom
+        if t >= 0 and 0 <= u <= 1:
+            return t
+        return None
+
+    def location_of(self, x, z):
+        for location in self.locations.values():
+            if location.contains(x, z):
+                return location
+        return None
+
+
+class LocalServer:
+    def __init__(self, rate=20.0, num_flowers=12, hold=False, seed=None, move_speed=2.0, turn_speed=90.0,
+                 verbose=True):
+        self.world = World(num_flowers=num_flowers, seed=seed)
+        self.rate = rate
+        self.hold = hold
+        self.move_speed = move_speed
+        self.turn_speed = turn_speed
+        self.verbose = verbose
+        self.next_agent_id = 0
+        self.started_at = time.monotonic()
+        self.app = web.Application()
+        self.app.router.add_get("/", self.handle_ws)
+        self.app.router.add_get("/stats", self.handle_stats)
+        self.runner = None
+        self.sim_task = None
+        self.finished_agents = []
+
+    def log(self, text):
+        if self.verbose:
+            print(text)
+
+    async def start(self, host="127.0.0.1", port=4649):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        self.sim_task = asyncio.create_task(self.simulation_loop())
+        self.log(f"Local AAPE server listening on ws://{host}:{port}/")
+
+    async def stop(self):
+        if self.sim_task:
+            self.sim_task.cancel()
+        for agent in list(self.world.agents.values()):
+            await agent.ws.close()
+        if self.runner:
+            await self.runner.cleanup()
+
+    async def send(self, agent, msg_type, content):
+        msg_json = json.dumps({"Type": msg_type, "Content": content})
+        await agent.ws.send_str(msg_json)
+        return len(msg_json)
+
+    async def set_running(self, running):
+        """
+        Pauses (on_hold) or resumes (start) the simulation for all the connected agents
+        """
+        self.hold = not running
+        for agent in list(self.world.agents.values()):
+            agent.running = running
+            await self.send(agent, "sim_control", "start" if running else "on_hold")
+
+    async def handle_ws(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        agent = None
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    if msg.type == WSMsgType.ERROR:
+                        self.log(f"WebSocket error: {ws.exception()}")
+                    continue
+                try:
+                    msg_dict = json.loads(msg.data)
+                except json.JSONDecodeError:
+                    self.log(f"Failed JSON decoding of the received message: {msg.data}")
+                    continue
+                if msg_dict["type"] == "initial_params":
+                    agent = await self.create_agent(ws, json.loads(msg_dict["content"]))
+                elif msg_dict["type"] == "action" and agent:
+                    agent.actions_received += 1
+                    if agent.first_action_at is None:
+                        agent.first_action_at = time.monotonic()
+                    self.apply_action(agent, msg_dict["content"])
+                else:
+                    self.log(f"Unknown message: {msg.data}")
+        finally:
+            if agent:
+                self.world.agents.pop(agent.agent_id, None)
+                self.finished_agents.append(agent)
+                self.log(f"{agent.name} disconnected")
+        return ws
+
+    async def create_agent(self, ws, params):
+        self.next_agent_id += 1
+        if params.get("type") == "AAgentAstronaut" and not params.get("spawn_area"):
+            # Astronauts start next to the Base outpost
+            x = self.world.base.x_max + params.get("spawn_distance", 2)
+            z = self.world.base.center()[1]
+        else:
+            x, z = self.world.random_free_point()
+        agent = SimAgent(ws, params, self.next_agent_id, x, z, self.world.random.uniform(0, 360))
+        self.world.agents[agent.agent_id] = agent
+        self.log(f"{agent.name} connected ({agent.tag})")
+        await self.send(agent, "sim_control", "connection_ready")
+        if params.get("initial_task"):
+            await self.send(agent, "agent_control", params["initial_task"])
+        if not self.hold:
+            agent.running = True
+            await self.send(agent, "sim_control", "start")
+        else:
+            await self.send(agent, "sim_control", "on_hold")
+        return agent
+
+    def apply_action(self, agent, action):
+        if action == "mf":
+            agent.translation = SimAgent.FORWARD
+            agent.route_target = None
+        elif action == "mb":
+            agent.translation = SimAgent.BACKWARD
+            agent.route_target = None
+        elif action in ("ntm", "stop"):
+            agent.translation = SimAgent.STOPPED
+            agent.route_target = None
+        elif action == "tr":
+            agent.rotation = 1
+        elif action == "tl":
+            agent.rotation = -1
+        elif action == "nt":
+            agent.rotation = 0
+        elif action == "collect":
+            self.collect(agent)
+        else:
+            command, _, data = action.partition(",")
+            if command == "walk_to" and data in self.world.locations:
+                agent.route_target = self.world.locations[data].center()
+                agent.route_name = data
+                agent.translation = SimAgent.STOPPED
+                agent.rotation = 0
+            elif command == "teleport_to" and data in self.world.locations:
+                agent.x, agent.z = self.world.locations[data].center()
+                agent.route_target = None
+            elif command == "leave":
+                item, _, amount = data.partition(",")
+                self.leave(agent, item, int(amount or 1))
+            else:
+                self.log(f"{agent.name}: unknown action {action}")
+
+    def collect(self, agent):
+        for flower in self.world.flowers:
+            if math.hypot(flower.x - agent.x, flower.z - agent.z) <= agent.radius + flower.radius + 1.0:
+                self.world.flowers.remove(flower)
+                agent.inventory[flower.tag] = agent.inventory.get(flower.tag, 0) + 1
+                self.world.spawn_flower()
+                return
+
+    def leave(self, agent, item, amount):
+        location = self.world.location_of(agent.x, agent.z)
+        if location is None or not location.container:
+            return
+        amount = min(amount, agent.inventory.get(item, 0))
+        if amount <= 0:
+            return
+        agent.inventory[item] -= amount
+        if agent.inventory[item] == 0:
+            del agent.inventory[item]
+        location.inventory[item] = location.inventory.get(item, 0) + amount
+
+    def step(self, dt, now):
+        for agent in list(self.world.agents.values()):
+            if not agent.running or agent.is_frozen(now):
+                continue
+            if agent.route_target is not None:
+                tx, tz = agent.route_target
+                dist = math.hypot(tx - agent.x, tz - agent.z)
+                if dist < 0.2:
+                    agent.route_target = None
+                else:
+                    agent.yaw = math.degrees(math.atan2(tx - agent.x, tz - agent.z)) % 360
+                    advance = min(dist, self.move_speed * dt)
+                    agent.x += math.sin(math.radians(agent.yaw)) * advance
+                    agent.z += math.cos(math.radians(agent.yaw)) * advance
+                continue
+            if agent.rotation:
+                agent.yaw = (agent.yaw + agent.rotation * self.turn_speed * dt) % 360
+            if agent.translation:
+                advance = agent.translation * self.move_speed * dt
+                new_x = agent.x + math.sin(math.radians(agent.yaw)) * advance
+                new_z = agent.z + math.cos(math.radians(agent.yaw)) * advance
+                if not self.world.blocked(agent, new_x, new_z):
+                    agent.x, agent.z = new_x, new_z
+        self.resolve_bites(now)
+
+    def resolve_bites(self, now):
+        agents = list(self.world.agents.values())
+        for critter in agents:
+            if critter.tag != CRITTER_TAG or now < critter.bite_cooldown_until:
+                continue
+            for astronaut in agents:
+                if astronaut.tag != ASTRONAUT_TAG or astronaut.is_frozen(now):
+                    continue
+                if math.hypot(astronaut.x - critter.x, astronaut.z - critter.z) <= \
+                        astronaut.radius + critter.radius + 0.3:
+                    astronaut.frozen_until = now + 5.0
+                    astronaut.translation = SimAgent.STOPPED
+                    astronaut.rotation = 0
+                    astronaut.route_target = None
+                    critter.bite_cooldown_until = now + 5.0
+                    if astronaut.inventory.get(FLOWER_TAG, 0) > 0:
+                        astronaut.inventory[FLOWER_TAG] -= 1
+                        if astronaut.inventory[FLOWER_TAG] == 0:
+                            del astronaut.inventory[FLOWER_TAG]
+                    self.log(f"{critter.name} bit {astronaut.name}")
+
+    def perception(self, agent):
+        rays = []
+        for i, angle in enumerate(agent.ray_angles):
+            hit = self.world.cast_ray(agent, angle)
+            if hit is None:
+                rays.append([i, 0, None])
+            else:
+                rays.append([i, 1, {"name": hit[1], "tag": hit[2], "distance": round(hit[0], 3)}])
+        return rays
+
+    def internal_state(self, agent, now):
+        location = self.world.location_of(agent.x, agent.z)
+        routing = agent.route_target is not None
+        return {
+            "isRotatingRight": agent.rotation > 0 and not routing,
+            "isRotatingLeft": agent.rotation < 0 and not routing,
+            "movingForwards": agent.translation == SimAgent.FORWARD and not routing,
+            "movingBackwards": agent.translation == SimAgent.BACKWARD and not routing,
+            "isFrozen": agent.is_frozen(now),
+            "speed": self.move_speed if (agent.translation or routing) and not agent.is_frozen(now) else 0.0,
+            "position": {"x": round(agent.x, 3), "y": 0.0, "z": round(agent.z, 3)},
+            "rotation": {"x": 0.0, "y": round(agent.yaw, 3), "z": 0.0},
+            "currentNamedLoc": location.name if location else "",
+            "onRoute": routing,
+            "targetNamedLoc": agent.route_name if routing else "",
+            "myInventoryList": [{"name": k, "amount": v} for k, v in agent.inventory.items()],
+            "nearbyContainerInventory": bool(location and location.container),
+            "nearbyContainerInventoryList": [{"name": k, "amount": v} for k, v in location.inventory.items()]
+            if location and location.container else []
+        }
+
+    @staticmethod
+    def sensor_message(agent, rays, state):
+        """
+        :return: (msg_type, content) of the next sensor frame of 'agent': a full frame or, if the agent asked for
+        them, the changes since its previous frame (a keyframe every agent.sensor_delta frames)
+        """
+        if not agent.sensor_delta:
+            return "sensor", [rays, state]
+        if agent.last_state is None or agent.frames_since_keyframe + 1 >= agent.sensor_delta:
+            msg_type, content = "sensor", [rays, state]
+            agent.frames_since_keyframe = 0
+        else:
+            changed_rays = [ray for ray, last_ray in zip(rays, agent.last_rays) if ray != last_ray]
+            changed_state = {field: value for field, value in state.items() if agent.last_state[field] != value}
+            msg_type, content = "sensor_delta", {"rays": changed_rays, "state": changed_state}
+            agent.frames_since_keyframe += 1
+        agent.last_rays = rays
+        agent.last_state = state
+        return msg_type, content
+
+    async def send_sensor_frames(self, now):
+        for agent in list(self.world.agents.values()):
+            if not agent.running or agent.ws.closed:
+                continue
+            rays, state = self.perception(agent), self.internal_state(agent, now)
+            try:
+                if agent.frame_encoder is not None:
+                    msg_type = "binary"
+                    payload = agent.frame_encoder.encode(rays, state)
+                    await agent.ws.send_bytes(payload)
+                    agent.bytes_sent += len(payload)
+                else:
+                    msg_type, content = self.sensor_message(agent, rays, state)
+                    agent.bytes_sent += await self.send(agent, msg_type, content)
+                agent.frames_sent += 1
+                agent.delta_frames_sent += msg_type == "sensor_delta"
+            except ConnectionResetError:
+                pass
+
+    async def simulation_loop(self):
+        period = 1.0 / self.rate
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(max(0.0, period - (time.monotonic() - last)))
+            now = time.monotonic()
+            self.step(now - last, now)
+            last = now
+            await self.send_sensor_frames(now)
+
+    def stats(self):
+        """
+        Per-agent throughput statistics since each agent connected
+        """
+        now = time.monotonic()
+        result = []
+        for agent in list(self.world.agents.values()) + self.finished_agents:
+            elapsed = max(now - agent.connected_at, 1e-9)
+            result.append({
+                "name": agent.name,
+                "tag": agent.tag,
+                "frames_sent": agent.frames_sent,
+                "delta_frames_sent": agent.delta_frames_sent,
+                "bytes_sent": agent.bytes_sent,
+                "bytes_per_sec": round(agent.bytes_sent / elapsed, 1),
+                "actions_received": agent.actions_received,
+                "frames_per_sec": round(agent.frames_sent / elapsed, 2),
+                "actions_per_sec": round(agent.actions_received / elapsed, 2),
+                "first_action_delay": None if agent.first_action_at is None
+                else round(agent.first_action_at - agent.connected_at, 4),
+                "inventory": dict(agent.inventory)
+            })
+        return result
+
+    async def handle_stats(self, request):
+        return web.json_response({"uptime": round(time.monotonic() - self.started_at, 2),
+                                  "base_inventory": self.world.base.inventory,
+                                  "agents": self.stats()})
+
+    def print_stats(self):
+        print(f"{'agent':<24}{'frames':>8}{'fps':>8}{'deltas':>8}{'bytes/s':>9}{'actions':>9}{'act/s':>8}{'1st act':>9}"
+              f"  inventory")
+        for s in self.stats():
+            first = "-" if s["first_action_delay"] is None else f"{s['first_action_delay']:.3f}"
+            print(f"{s['name']:<24}{s['frames_sent']:>8}{s['frames_per_sec']:>8}{s['delta_frames_sent']:>8}"
+                  f"{s['bytes_per_sec']:>9.0f}{s['actions_received']:>9}{s['actions_per_sec']:>8}{first:>9}"
+                  f"  {s['inventory']}")
+        print(f"Base inventory: {self.world.base.inventory}")
+
+
+async def serve(args):
+    server = LocalServer(rate=args.rate, num_flowers=args.flowers, hold=args.hold, seed=args.seed,
+                         verbose=not args.quiet)
+    await server.start(args.host, args.port)
+    try:
+        if args.duration > 0:
+            await asyncio.sleep(args.duration)
+        else:
+            await asyncio.Event().wait()
+    finally:
+        server.print_stats()
+        await server.stop()
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Headless local stand-in for the Unity AAPE server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4649)
+    parser.add_argument("--rate", type=float, default=20.0, help="Simulation steps and sensor frames per second")
+    parser.add_argument("--flowers", type=int, default=12, help="Number of alien flowers in the world")
+    parser.add_argument("--hold", action="store_true", help="Keep the simulation on hold (agents connect but idle)")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed of the world")
+    parser.add_argument("--duration", type=float, default=0, help="Seconds to run (0 = until Ctrl+C)")
+    parser.add_argument("--quiet", action="store_true", help="Do not log connections and events")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve(parse_args(sys.argv[1:])))
+    except KeyboardInterrupt:
+        pass
+    print("Bye!!!")
@@ -0,0 +1,142 @@
+#################################################
+# Level-gated asynchronous logging
+#################################################
+import atexit
+import contextvars
+import logging
+import logging.handlers
+import queue
+import sys
+from collections import deque
+
+'''
+Logging of the goals and the behaviour tree nodes (any module can get its logger with Log.get_logger(__name__)).
+● Levels per module: Misc.log_level ("INFO" by default) is the level of all the modules and Misc.log_levels
+  overrides it per module, e.g. {"BTCritters": "DEBUG", "Goals_BT": "WARNING"}. A disabled call only costs the level
+  check: the messages use %-style arguments, so they are built only when the record is written.
+● The agents neither format nor write the records: they are put in a queue, and a background thread
+  (logging.handlers.QueueListener) formats them and writes them to stdout, so a slow terminal never blocks a tick.
+● Every agent keeps its last Misc.log_ring records (200 by default) in a ring buffer (a deque with maxlen: appending
+  needs no lock). AAgent.run prints them after an unexpected error. The agent of a record is taken from the context
+  variable 'agent_log', set by AAgent.run, so all the tasks created by the agent inherit it.
+● The nodes log what they check on every tick (detections, targets not found) at DEBUG, and the outcomes of
+  their actions at INFO: even queued, an enabled record costs the agent several times a print.
+● Records are formatted by the writer thread, after the call: mutable arguments should not be modified afterwards.
+● The records do not carry the caller, thread or process (not used by the formats, and the most expensive parts of
+  creating a record, see the "Optimization" section of the logging HOWTO). This applies to all the process.
+'''
+
+ROOT = "aape"
+FORMAT = "[%(agent)s] %(message)s"
+RING_FORMAT = "%(asctime)s %(levelname)-7s [%(agent)s] %(name)s: %(message)s"
+
+# AgentLog of the agent running in the current context (None outside of the agents)
+agent_log = contextvars.ContextVar("agent_log", default=None)
+
+listener = None
+
+
+class AgentLog:
+    """
+    Ring buffer with the last records of an agent
+    """
+    __slots__ = ("name", "records")
+
+    def __init__(self, name, size=200):
+        self.name = name
+        self.records = deque(maxlen=size)
+
+    def dump(self):
+        """
+        :return: the records of the ring, formatted, oldest first
+        """
+        formatter = logging.Formatter(RING_FORMAT)
+        return "\n".join(formatter.format(record) for record in list(self.records))
+
+
+class AgentQueueHandler(logging.handlers.QueueHandler):
+    """
+    Tags the records with their agent, keeps them in the ring of the agent and queues them for the writer thread
+    """
+    def prepare(self, record):
+        return record  # Formatted by the writer thread
+
+    def handle(self, record):
+        # Without the lock of the handler: the deque and the queue are thread-safe
+        if self.filter(record):
+            self.emit(record)
+        return record
+
+    def emit(self, record):
+        try:
+            ring = agent_log.get()
+            if ring is None:
+                record.agent = "-"
+            else:
+                record.agent = ring.name
+                ring.records.append(record)
+            self.enqueue(record)
+        except Exception:
+            self.handleError(record)
+
+
+class StdoutHandler(logging.StreamHandler):
+    """
+    Writes to the current sys.stdout, which may be redirected after the setup
+    """
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+def get_logger(module_name):
+    return logging.getLogger(f"{ROOT}.{module_name}")
+
+
+def setup(log_level="INFO", log_levels=None):
+    """
+    Sets the levels of the modules and starts the writer thread (the first time). Called by every agent with its
+    Misc options: the levels are the same for all the agents of a process, the last ones set win.
+    :param log_levels: {module name: level} overriding 'log_level'
+    """
+    global listener
+    root = logging.getLogger(ROOT)
+    root.setLevel(log_level)
+    for module_name, level in (log_levels or {}).items():
+        get_logger(module_name).setLevel(level)
+    if listener is None:
+        logging._srcfile = None
+        logging.logThreads = False
+        logging.logProcesses = False
+        logging.logMultiprocessing = False
+        records = queue.SimpleQueue()
+        writer = StdoutHandler()
+        writer.setFormatter(logging.Formatter(FORMAT))
+        listener = logging.handlers.QueueListener(records, writer)
+        listener.start()
+        root.addHandler(AgentQueueHandler(records))
+        root.propagate = False
+        atexit.register(shutdown)
+
+
+def shutdown():
+    """
+    Writes the pending records and stops the writer thread. Called at exit, or explicitly by the processes that do
+    not run the atexit handlers (the Spawner workers).
+    """
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+        root = logging.getLogger(ROOT)
+        for handler in list(root.handlers):
+            if isinstance(handler, AgentQueueHandler):
+                root.removeHandler(handler)
+        root.propagate = True
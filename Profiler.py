@@ -0,0 +1,191 @@
+#################################################
+# Per-node profiler of the behaviour trees
+#################################################
+import json
+import time
+from collections import Counter
+from py_trees import common
+
+'''
+Opt-in profiler of the behaviour trees of an agent (Misc.bt_profiler or "python Spawner.py ... --bt-profile").
+● Wraps the initialise, update and terminate methods of every node of the trees and the tick of the trees, and
+  records the number of calls and the cumulative and maximum wall time of each one.
+● Records the status transitions of every node: when it starts RUNNING (update) and when it finishes or is
+  interrupted (terminate), e.g. "RUNNING->SUCCESS" or "RUNNING->INVALID".
+● The profiles of several agents (and of several Spawner workers, through to_dict/from_dict) can be merged and
+  printed as a table or exported as json.
+'''
+
+METHODS = ("initialise", "update", "terminate")
+
+
+class CallStats:
+    """
+    Calls, cumulative and maximum wall time (seconds) of a method
+    """
+    __slots__ = ("calls", "total", "max")
+
+    def __init__(self, calls=0, total=0.0, max=0.0):
+        self.calls = calls
+        self.total = total
+        self.max = max
+
+    def add(self, elapsed):
+        self.calls += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def to_dict(self):
+        return {"calls": self.calls, "total": self.total, "max": self.max}
+
+
+class NodeProfile:
+    def __init__(self):
+        self.methods = {method: CallStats() for method in METHODS}
+        self.transitions = Counter()
+
+    def merge(self, other):
+        for method, stats in other.methods.items():
+            self.methods[method].merge(stats)
+        self.transitions.update(other.transitions)
+
+    def total(self):
+        return sum(stats.total for stats in self.methods.values())
+
+    def to_dict(self):
+        return {"methods": {method: stats.to_dict() for method, stats in self.methods.items()},
+                "transitions": dict(self.transitions)}
+
+    @classmethod
+    def from_dict(cls, data):
+        profile = cls()
+        for method, stats in data["methods"].items():
+            profile.methods[method] = CallStats(**stats)
+        profile.transitions.update(data["transitions"])
+        return profile
+
+
+class BTProfiler:
+    def __init__(self):
+        # "<tree>/<node class>:<node name>" -> NodeProfile
+        self.nodes = {}
+        # "<tree>" -> CallStats of the whole ticks
+        self.ticks = {}
+
+    def instrument(self, tree_name, behaviour_tree):
+        """
+        Wraps the tick of 'behaviour_tree' and the methods of all its nodes. The wrappers are instance attributes,
+        so only this agent's trees are affected.
+        """
+        self.ticks.setdefault(tree_name, CallStats())
+        behaviour_tree.tick = self.timed(behaviour_tree.tick, self.ticks[tree_name])
+        for node in behaviour_tree.root.iterate():
+            key = f"{tree_name}/{node.__class__.__name__}:{node.name}"
+            profile = self.nodes.setdefault(key, NodeProfile())
+            node.initialise = self.timed(node.initialise, profile.methods["initialise"])
+            node.update = self.timed_update(node, profile)
+            node.terminate = self.timed_terminate(node, profile)
+
+    @staticmethod
+    def timed(method, stats):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                stats.add(time.perf_counter() - start)
+        return wrapper
+
+    @staticmethod
+    def timed_update(node, profile):
+        update = node.update
+        stats = profile.methods["update"]
+
+        def wrapper():
+            previous = node.status
+            start = time.perf_counter()
+            try:
+                status = update()
+            finally:
+                stats.add(time.perf_counter() - start)
+            # Finished nodes are recorded by terminate, here only the ones that start running
+            if status == common.Status.RUNNING and previous != common.Status.RUNNING:
+                profile.transitions[f"{previous.name}->RUNNING"] += 1
+            return status
+        return wrapper
+
+    @staticmethod
+    def timed_terminate(node, profile):
+        terminate = node.terminate
+        stats = profile.methods["terminate"]
+
+        def wrapper(new_status):
+            # py_trees calls terminate before updating node.status
+            if node.status != new_status:
+                profile.transitions[f"{node.status.name}->{new_status.name}"] += 1
+            start = time.perf_counter()
+            try:
+                return terminate(new_status)
+            finally:
+                stats.add(time.perf_counter() - start)
+        return wrapper
+
+    def merge(self, other):
+        for key, profile in other.nodes.items():
+            self.nodes.setdefault(key, NodeProfile()).merge(profile)
+        for tree_name, stats in other.ticks.items():
+            self.ticks.setdefault(tree_name, CallStats()).merge(stats)
+
+    def to_dict(self):
+        return {"ticks": {tree_name: stats.to_dict() for tree_name, stats in self.ticks.items()},
+                "nodes": {key: profile.to_dict() for key, profile in self.nodes.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        profiler = cls()
+        for tree_name, stats in data["ticks"].items():
+            profiler.ticks[tree_name] = CallStats(**stats)
+        for key, profile in data["nodes"].items():
+            profiler.nodes[key] = NodeProfile.from_dict(profile)
+        return profiler
+
+    def table(self, title="", limit=None):
+        """
+        :return: the ticks of every tree and the nodes that were called, sorted by cumulative time
+        :param limit: maximum number of nodes listed (all if None)
+        """
+        lines = [f"Behaviour tree profile {title}".rstrip()]
+        lines.append(f"{'tree':<40}{'ticks':>10}{'total (ms)':>12}{'mean (us)':>11}{'max (us)':>10}")
+        for tree_name, stats in sorted(self.ticks.items(), key=lambda item: -item[1].total):
+            if stats.calls:
+                lines.append(f"{tree_name:<40}{stats.calls:>10}{1e3 * stats.total:>12.1f}"
+                             f"{1e6 * stats.total / stats.calls:>11.1f}{1e6 * stats.max:>10.1f}")
+        lines.append(f"{'node':<56}{'method':<11}{'calls':>9}{'total (ms)':>12}{'mean (us)':>11}{'max (us)':>10}"
+                     f"  transitions")
+        nodes = sorted(((key, profile) for key, profile in self.nodes.items() if profile.total()),
+                       key=lambda item: -item[1].total())
+        for key, profile in nodes[:limit]:
+            transitions = "  ".join(f"{t}:{n}" for t, n in profile.transitions.most_common())
+            for method, stats in profile.methods.items():
+                if stats.calls:
+                    lines.append(f"{key:<56}{method:<11}{stats.calls:>9}{1e3 * stats.total:>12.2f}"
+                                 f"{1e6 * stats.total / stats.calls:>11.1f}{1e6 * stats.max:>10.1f}  {transitions}")
+                    key = transitions = ""  # Only in the first line of the node
+        return "\n".join(lines)
+
+    def export(self, path, agents=None):
+        """
+        Writes the profile as json. 'agents' is an optional {agent: BTProfiler.to_dict()} with the profile of every
+        agent, exported along with this (total) one.
+        """
+        data = {"total": self.to_dict()}
+        if agents is not None:
+            data["agents"] = agents
+        with open(path, 'w') as file:
+            json.dump(data, file, indent=2)
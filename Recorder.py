@@ -0,0 +1,197 @@
+#################################################
+# Record and replay of websocket sessions
+#################################################
+import argparse
+import asyncio
+import gzip
+import random
+import struct
+import sys
+import time
+import Codec
+
+'''
+Recording of every message an agent exchanges with Unity (Misc.record_session, see AAgent_BT.py), and replay of
+the recordings without Unity.
+
+File format (append-only, optionally gzip compressed when the file name ends in ".gz"):
+● Header: MAGIC
+● One record per message: <kind: uint8><timestamp: int64, ns since the start of the recording><length: uint32>
+  followed by 'length' bytes of payload (utf-8 for text messages). 'kind' is INCOMING or OUTGOING, plus BINARY for
+  binary websocket messages. A record truncated by a crash ends the recording.
+
+Usage: python Recorder.py <recording> [--config AAgent-1.json] [--speed 1.0 | --fast] [--seed 0]
+● Default (--speed): the incoming messages are fed to a new agent (with a fake websocket) at their original pace,
+  multiplied by 'speed', while the agent runs its main loop as usual.
+● --fast: the messages are fed as fast as possible and the active behaviour tree is ticked once after every sensor
+  frame (the goals started by the nodes still run on the clock, so their timing differs from the recording).
+At the end it prints the decoding/processing and tick times and the actions sent vs the recorded ones.
+'''
+
+MAGIC = b"AAPEREC\x01"
+RECORD_HEADER = struct.Struct("<BqI")
+
+INCOMING = 0
+OUTGOING = 1
+BINARY = 2
+
+
+def open_file(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, compresslevel=1)
+    return open(path, mode)
+
+
+class SessionRecorder:
+    """
+    Appends the messages of a session to a recording file
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open_file(path, "wb")
+        self.file.write(MAGIC)
+        self.start_ns = time.monotonic_ns()
+        self.records = 0
+
+    def record(self, kind, payload):
+        """
+        :param kind: INCOMING or OUTGOING
+        :param payload: text (str) or binary (bytes) message
+        """
+        if isinstance(payload, str):
+            payload = payload.encode()
+        else:
+            kind |= BINARY
+        self.file.write(RECORD_HEADER.pack(kind, time.monotonic_ns() - self.start_ns, len(payload)))
+        self.file.write(payload)
+        self.records += 1
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+def read_records(path):
+    """
+    Generator of the records of a recording file
+    :return: (kind, timestamp in ns, payload) tuples. Text payloads are returned as str, binary ones as bytes
+    """
+    with open_file(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a session recording")
+        while True:
+            header = file.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            kind, timestamp, length = RECORD_HEADER.unpack(header)
+            payload = file.read(length)
+            if len(payload) < length:
+                return
+            yield kind, timestamp, payload if kind & BINARY else payload.decode()
+
+
+class ReplayWebSocket:
+    """
+    Stands for the websocket of the replayed agent: keeps the messages it sends
+    """
+    closed = False
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_str(self, data):
+        self.sent.append(data)
+
+    async def close(self):
+        self.closed = True
+
+
+async def replay(recording, config_file, speed=1.0, fast=False):
+    """
+    Feeds the incoming messages of 'recording' to a new agent created from 'config_file'
+    :return: statistics of the replay
+    """
+    from AAgent_BT import AAgent
+
+    agent = AAgent(config_file)
+    agent.ws = ReplayWebSocket()
+    stats = {"incoming": 0, "recorded_actions": 0, "process_time": 0.0, "ticks": 0, "tick_time": 0.0}
+    main_loop = None if fast else asyncio.create_task(agent.main_loop())
+    loop = asyncio.get_running_loop()
+    wall_start = time.perf_counter()
+    replay_start = loop.time()
+    try:
+        for kind, timestamp, payload in read_records(recording):
+            if kind & OUTGOING:
+                stats["recorded_actions"] += is_action(payload)
+                continue
+            if not fast:
+                delay = replay_start + timestamp / 1e9 / speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            start = time.perf_counter()
+            agent.process_incoming_message(payload, start)
+            stats["process_time"] += time.perf_counter() - start
+            stats["incoming"] += 1
+            if fast:
+                await step(agent, stats)
+    finally:
+        agent.exit_event.set()
+        if main_loop:
+            await asyncio.wait([main_loop], timeout=5)
+        pending = asyncio.all_tasks() - {asyncio.current_task()}
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending, timeout=1)
+    stats["wall"] = time.perf_counter() - wall_start
+    stats["sent_actions"] = sum(is_action(message) for message in agent.ws.sent)
+    return stats
+
+
+def is_action(message):
+    return not isinstance(message, bytes) and Codec.loads(message).get("type") == "action"
+
+
+async def step(agent, stats):
+    """
+    Does, once, what the main loop of 'agent' would do after a new message (fast replay)
+    """
+    while agent.pendingActions:
+        await agent.send_message("action", agent.pendingActions.popleft())
+    fresh_frame = agent.sensor_frame_count > agent.ticked_frame_count
+    if agent.simulation_state == agent.RUNNING and agent.currentBT and fresh_frame:
+        agent.ticked_frame_count = agent.sensor_frame_count
+        agent.mark_decision()
+        start = time.perf_counter()
+        agent.bts[agent.currentBT].behaviour_tree.tick()
+        stats["tick_time"] += time.perf_counter() - start
+        stats["ticks"] += 1
+    await asyncio.sleep(0)  # Let the tasks started by the nodes run
+
+
+def print_stats(stats):
+    incoming = max(stats["incoming"], 1)
+    ticks = max(stats["ticks"], 1)
+    print(f"Replayed {stats['incoming']} messages in {stats['wall']:.2f}s")
+    print(f"  process_incoming_message: {1e6 * stats['process_time'] / incoming:.1f} us/message")
+    if stats["ticks"]:
+        print(f"  behaviour tree ticks: {stats['ticks']}  {1e6 * stats['tick_time'] / ticks:.1f} us/tick")
+    print(f"  actions sent: {stats['sent_actions']}  recorded: {stats['recorded_actions']}")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Replays a session recorded by an agent (Misc.record_session)")
+    parser.add_argument("recording")
+    parser.add_argument("--config", default="AAgent-1.json", help="Configuration file of the replayed agent")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed (1.0 = original pace)")
+    parser.add_argument("--fast", action="store_true", help="Replay as fast as possible")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random choices of the goals")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    random.seed(args.seed)
+    print_stats(asyncio.run(replay(args.recording, args.config, args.speed, args.fast)))
@@ -1,3 +1,69 @@
+from collections import namedtuple
+from collections.abc import Sequence
+
+import numpy as np
+
+# Tags of the hit objects are interned to small integers at decode time, so the sensor can store them in an array
+# and the queries compare integers instead of strings
+NO_TAG = -1
+TAG_IDS = {}
+TAG_NAMES = []
+
+
+def intern_tag(tag):
+    """
+    :return: the small integer that identifies 'tag'. New tags get the next free id.
+    """
+    tag_id = TAG_IDS.get(tag)
+    if tag_id is None:
+        tag_id = len(TAG_NAMES)
+        TAG_IDS[tag] = tag_id
+        TAG_NAMES.append(tag)
+    return tag_id
+
+
+def tag_name(tag_id):
+    """
+    :return: the tag identified by 'tag_id' or None if the ray does not hit any object
+    """
+    return None if tag_id == NO_TAG else TAG_NAMES[tag_id]
+
+
+# Closest hit of a tag: index of the ray, distance to the object and angle of the ray
+NearestHit = namedtuple("NearestHit", ["ray", "distance", "angle"])
+
+
+class ObjectInfoView(Sequence):
+    """
+    Information about the object that each ray is hitting, read from the arrays of a binary sensor frame (see
+    BinaryFrame.py) when it is accessed: the dictionary (or None) of a ray is only built if somebody reads it
+    """
+    __slots__ = ("name_ids", "tag_ids", "distances", "strings")
+
+    def __init__(self, name_ids, tag_ids, distances, strings):
+        """
+        :param name_ids: id of the name of the object hit by every ray (index in 'strings')
+        :param tag_ids: interned tag of every ray (NO_TAG if there is no hit)
+        :param distances: distance of every ray
+        :param strings: id -> string
+        """
+        self.name_ids = name_ids
+        self.tag_ids = tag_ids
+        self.distances = distances
+        self.strings = strings
+
+    def __len__(self):
+        return len(self.tag_ids)
+
+    def __getitem__(self, ray):
+        if isinstance(ray, slice):
+            return [self[i] for i in range(*ray.indices(len(self)))]
+        tag_id = int(self.tag_ids[ray])
+        if tag_id == NO_TAG:
+            return None
+        return {"name": self.strings[self.name_ids[ray]], "tag": TAG_NAMES[tag_id], "distance": float(self.distances[ray])}
+
+
 class RayCastSensor:
     HIT = 0
     DISTANCE = 1
@@ -18,32 +84,41 @@ class RayCastSensor:
             sphere_cast_radius -> Radius of sphere to cast.
             ray_length -> Length of the rays to cast.
         """
-        self.sensor_rays = None
         self.rays_per_direction = ray_perception_config[0]
         self.num_rays = (self.rays_per_direction * 2) + 1
+        self.center_ray = self.rays_per_direction
         self.max_ray_degrees = ray_perception_config[1]
         self.sphere_cast_radius = ray_perception_config[2]
         self.ray_length = ray_perception_config[3]
 
-        # Array [3 x num_rays] with the live information of the sensor rays
+        # Live information of the sensor rays, one contiguous array per field (index = ray)
+        # hit -> bool, hit ON/OFF
+        # distance -> float, distance to the target (-1 if there is no hit)
+        # tag_id -> int, interned tag of the object that the ray is hitting (NO_TAG if there is no hit)
+        # angle -> float, degrees from the center. Positive, rays on the right. Negative, rays on the left
+        self.hit = np.zeros(self.num_rays, dtype=np.bool_)
+        self.distance = np.full(self.num_rays, -1.0)
+        self.tag_id = np.full(self.num_rays, NO_TAG, dtype=np.int16)
+        self.angle = np.zeros(self.num_rays)
+        # Information about the object that each ray is hitting (dictionary or None)
+        self.object_info = [None for _ in range(self.num_rays)]
+
+        # Fill the angles of each ray
+        if self.rays_per_direction > 0:
+            angle_between_rays = self.max_ray_degrees / self.rays_per_direction
+            # Left side rays (negative angles), center ray and right side rays (positive angles)
+            self.angle[:] = (np.arange(self.num_rays) - self.rays_per_direction) * angle_between_rays
+
+        # Compatibility view [4 x num_rays] with the live information of the sensor rays
         # row HIT -> bool, hit ON/OFF
-        # row DISTANCE -> int, distance to the target
+        # row DISTANCE -> float, distance to the target
         # row OBJECT_INFO -> Information about the object that the ray is hitting
-        # row ANGLE -> int, degrees from the center. Positive, rays on the right. Negative, rays on the left
-        self.sensor_rays = [[False for _ in range(self.num_rays)],
-                            [-1 for _ in range(self.num_rays)],
-                            [None for _ in range(self.num_rays)],
-                            [0.0 for _ in range(self.num_rays)]]
-        # Fill the angles of each ray
-        angle_between_rays = self.max_ray_degrees / self.rays_per_direction
-        # Left side rays (negative angles)
-        for r in range(self.rays_per_direction):
-            self.sensor_rays[RayCastSensor.ANGLE][r] = -((self.rays_per_direction - r) * angle_between_rays)
-        # Center ray
-        self.sensor_rays[RayCastSensor.ANGLE][self.rays_per_direction] = 0.0
-        # Right side rays (positive angles)
-        for r in range(self.rays_per_direction+1, (self.rays_per_direction * 2)+1):
-            self.sensor_rays[RayCastSensor.ANGLE][r] = ((r - self.rays_per_direction) * angle_between_rays)
+        # row ANGLE -> float, degrees from the center. Positive, rays on the right. Negative, rays on the left
+        # The rows are the arrays above, so they are always up to date
+        self.sensor_rays = [self.hit, self.distance, self.object_info, self.angle]
+
+        # Index of the current frame, built once per set_perception: tag_id -> (rays hitting the tag, NearestHit)
+        self.tag_index = {}
 
     def set_perception(self, perception):
         """
@@ -53,12 +128,100 @@ class RayCastSensor:
                             or
                                 None
                             if the ray does not hit any object
+                           It can have only some of the rays (the ones that changed, sensor_delta messages): the
+                           others keep their information.
         :return:
         """
+        if not perception:
+            return
+        if not isinstance(self.object_info, list):
+            # The previous frame was binary: build the information of its rays, a partial frame keeps the others
+            self.object_info = list(self.object_info)
+            self.sensor_rays[self.OBJECT_INFO] = self.object_info
+        rays, hits, distances, tag_ids, infos = [], [], [], [], []
         for p in perception:
-            self.sensor_rays[RayCastSensor.HIT][p[0]] = p[1]
-            if p[2] is None:
-                self.sensor_rays[RayCastSensor.DISTANCE][p[0]] = -1
+            info = p[2]
+            rays.append(p[0])
+            hits.append(p[1])
+            infos.append(info)
+            if info is None:
+                distances.append(-1.0)
+                tag_ids.append(NO_TAG)
             else:
-                self.sensor_rays[RayCastSensor.DISTANCE][p[0]] = p[2]["distance"]
-            self.sensor_rays[RayCastSensor.OBJECT_INFO][p[0]] = p[2]
+                distances.append(info["distance"])
+                tag_ids.append(intern_tag(info["tag"]))
+
+        if len(rays) == self.num_rays and rays[0] == 0 and rays[-1] == self.num_rays - 1:
+            # Full frame with the rays in order: bulk copy into the arrays
+            self.hit[:] = hits
+            self.distance[:] = distances
+            self.tag_id[:] = tag_ids
+            self.object_info[:] = infos
+        else:
+            self.hit[rays] = hits
+            self.distance[rays] = distances
+            self.tag_id[rays] = tag_ids
+            for ray, info in zip(rays, infos):
+                self.object_info[ray] = info
+        self.build_tag_index()
+
+    def set_perception_arrays(self, hit, distance, tag_id, object_info):
+        """
+        Sets the perception of all the rays from arrays (binary sensor frames, see BinaryFrame.py)
+        :param hit: hit (0/1) of every ray
+        :param distance: distance of every ray (-1 if there is no hit)
+        :param tag_id: interned tag of every ray (NO_TAG if there is no hit)
+        :param object_info: sequence with the information of the hit object of every ray (ObjectInfoView)
+        """
+        self.hit[:] = hit
+        self.distance[:] = distance
+        self.tag_id[:] = tag_id
+        self.object_info = object_info
+        self.sensor_rays[self.OBJECT_INFO] = object_info
+        self.build_tag_index()
+
+    def perception(self):
+        """
+        :return: the current information of all the rays in the format of set_perception
+        """
+        return [[ray, int(hit), info] for ray, (hit, info) in enumerate(zip(self.hit.tolist(), self.object_info))]
+
+    def build_tag_index(self):
+        """
+        Groups the rays of the current frame by the tag they hit and finds the closest hit of each tag
+        """
+        index = {}
+        distances = self.distance.tolist()
+        for ray, tag_id in enumerate(self.tag_id.tolist()):
+            if tag_id == NO_TAG:
+                continue
+            entry = index.get(tag_id)
+            if entry is None:
+                index[tag_id] = ([ray], ray)
+            else:
+                entry[0].append(ray)
+                if distances[ray] < distances[entry[1]]:
+                    index[tag_id] = (entry[0], ray)
+        angles = self.angle.tolist()
+        self.tag_index = {tag_id: (tuple(rays), NearestHit(ray, distances[ray], angles[ray]))
+                          for tag_id, (rays, ray) in index.items()}
+
+    def has(self, tag):
+        """
+        :return: True if any ray of the current frame hits an object with 'tag'
+        """
+        return TAG_IDS.get(tag, NO_TAG) in self.tag_index
+
+    def nearest(self, tag):
+        """
+        :return: NearestHit(ray, distance, angle) of the closest object with 'tag' or None if no ray hits one
+        """
+        entry = self.tag_index.get(TAG_IDS.get(tag, NO_TAG))
+        return None if entry is None else entry[1]
+
+    def rays_with(self, tag):
+        """
+        :return: tuple with the indices of the rays that hit an object with 'tag' (empty if none)
+        """
+        entry = self.tag_index.get(TAG_IDS.get(tag, NO_TAG))
+        return () if entry is None else entry[0]
@@ -1,10 +1,18 @@
+import argparse
 import json
+import math
+import os
 import multiprocessing
-import subprocess
-import signal
+import queue
 import sys
 import asyncio
-from AAgent_BT import AAgent
+import time
+from functools import partial
+import Latency
+import Log
+
+# aiohttp, the agents and the profiler are imported where they are used: with several workers, the parent process
+# only loads the configuration and collects the results
 
 
 def load_config(json_file):
@@ -12,39 +20,329 @@ def load_config(json_file):
         return json.load(file)
 
 
-def start_agents(config_file):
-    config = load_config(config_file)
-
-    all_agents = []
+def agent_config_files(config):
+    """
+    :return: list with the configuration file of every agent of every pack
+    """
+    files = []
     packs = config.get('packs', [])
     for pack in packs:
         agent_config_file = pack.get("agent_config_file", "")
         num_agents = pack.get("num_agents", 1)
+        files.extend([agent_config_file] * num_agents)
+    return files
+
+
+def shard(agent_files, workers):
+    """
+    Splits the agents in 'workers' shards (round robin, so every worker gets agents of every pack)
+    """
+    return [agent_files[w::workers] for w in range(workers)]
+
+
+def create_session(conn_limit=0, conn_limit_per_host=0):
+    """
+    Creates the aiohttp session shared by all the agents of the process.
+    :param conn_limit: Maximum number of simultaneous connections (0 = no limit). Every agent keeps one open.
+    :param conn_limit_per_host: Maximum number of simultaneous connections to the same host (0 = no limit)
+    """
+    import aiohttp
+    connector = aiohttp.TCPConnector(limit=conn_limit, limit_per_host=conn_limit_per_host, ttl_dns_cache=None)
+    return aiohttp.ClientSession(connector=connector)
+
+
+class ConnectionLimiter:
+    """
+    Ramp-up of the connections of the agents of a process. Used as an async context manager around the connection
+    of every agent (ws_connect, initial_params and wait for connection_ready):
+    ● At most 'rate' connections are started per second, evenly spaced.
+    ● At most 'concurrency' connections are in progress at the same time.
+    """
+    def __init__(self, rate=0.0, concurrency=0):
+        """
+        :param rate: Connections started per second (0 = no limit)
+        :param concurrency: Maximum number of connections in progress (0 = no limit)
+        """
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.semaphore = asyncio.Semaphore(concurrency) if concurrency > 0 else None
+        self.next_start = 0.0
+
+    async def __aenter__(self):
+        if self.semaphore:
+            await self.semaphore.acquire()
+        if self.interval:
+            # Reserve the next free start time, so the waiting agents are released one every 'interval' seconds
+            now = asyncio.get_running_loop().time()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+            if start > now:
+                await asyncio.sleep(start - now)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.semaphore:
+            self.semaphore.release()
+
+
+async def shutdown_agents(agents, tasks, timeout=5.0):
+    """
+    Stops all the agents at once: sets their exit events, gives their main loops up to 'timeout' seconds to finish
+    and closes all the websockets concurrently.
+    """
+    for agent in agents:
+        agent.exit_event.set()
+    pending = [task for task in tasks if not task.done()]
+    if pending:
+        _, pending = await asyncio.wait(pending, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending, timeout=timeout)
+    # close_websocket is idempotent, so the agents that already closed their connection are not affected
+    await asyncio.wait_for(asyncio.gather(*(agent.close_websocket() for agent in agents), return_exceptions=True),
+                           timeout)
+
+
+def latency_report(agents):
+    """
+    :return: latency histograms of every agent and of all of them together
+    """
+    total = Latency.LatencyTracker()
+    reports = []
+    for agent in agents:
+        if agent.latency:
+            total.merge(agent.latency)
+            reports.append(agent.latency.report(agent.AgentParameters["name"]))
+    reports.append(total.report(f"{len(agents)} agents (pid {os.getpid()})"))
+    return "\n".join(reports)
+
 
-        # Create multiple AAgent instances
-        agents_in_pack = [AAgent(agent_config_file) for _ in range(num_agents)]
+async def run_all_agents(agent_files, conn_limit=0, conn_limit_per_host=0, connect_rate=0.0, connect_concurrency=0,
+                         latency=None, bt_profile=False, bt_profiles=None, publish_rows=None, dashboard_rate=2.0):
+    """
+    :param latency: Optional LatencyTracker where the latency histograms of all the agents are merged at the end
+    :param bt_profile: Profile the behaviour trees of all the agents (see Profiler.py)
+    :param bt_profiles: Optional dictionary where the behaviour tree profile (BTProfiler.to_dict) of every
+    profiled agent is stored at the end
+    :param publish_rows: Optional function that receives the dashboard rows of all the agents 'dashboard_rate' times
+    per second (see Dashboard.py)
+    """
+    from AAgent_BT import AAgent
 
-        all_agents.extend(agents_in_pack)
+    # One session (connector, DNS cache...) for all the agents of this process
+    session = create_session(conn_limit, conn_limit_per_host)
+    limiter = ConnectionLimiter(connect_rate, connect_concurrency)
+    all_agents = []
+    tasks = []
+    sampler = None
+    try:
+        # Create the AAgent instances
+        all_agents = [AAgent(agent_config_file, session) for agent_config_file in agent_files]
+        if bt_profile:
+            for agent in all_agents:
+                agent.enable_bt_profiler()
+        Latency.dump_on_signal(lambda: latency_report(all_agents))
+        if publish_rows:
+            import Dashboard
+            sampler = asyncio.create_task(Dashboard.sample_agents(all_agents, publish_rows, dashboard_rate))
 
-    async def run_all_agents():
-        tasks = []
         for agent in all_agents:
-            task = asyncio.create_task(agent.run())
+            task = asyncio.create_task(agent.run(limiter))
             tasks.append(task)
 
         await asyncio.wait(tasks, return_when=asyncio.ALL_COMPLETED)
+    except asyncio.CancelledError:
+        # Ctrl+C: asyncio.run cancels this task. Stop all the agents in parallel before leaving
+        print(f"Shutting down {len(all_agents)} agents...")
+        await shutdown_agents(all_agents, tasks)
+        raise
+    finally:
+        if sampler:
+            sampler.cancel()
+        await session.close()
+        if latency is not None:
+            for agent in all_agents:
+                if agent.latency:
+                    latency.merge(agent.latency)
+        if bt_profiles is not None:
+            for i, agent in enumerate(all_agents):
+                if agent.bt_profiler:
+                    bt_profiles[f"{i}:{agent.AgentParameters['name']}"] = agent.bt_profiler.to_dict()
+
 
+def run_agents(agent_files, worker_id=0, dashboard_queue=None, **options):
+    """
+    Creates the agents of 'agent_files' and runs all of them in a new event loop of the current process.
+    :param dashboard_queue: Optional queue where the rows of the dashboard are published (see Dashboard.py)
+    :param options: Options of run_all_agents (session limits, connection ramp-up, profiling...)
+    :return: summary of the run: worker id, number of agents, wall and CPU time, loop utilisation, latency
+    histograms (LatencyTracker.to_dict) of all the agents and behaviour tree profile of every profiled agent
+    """
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    latency = Latency.LatencyTracker()
+    bt_profiles = {}
+    if dashboard_queue is not None:
+        import Dashboard
+        options["publish_rows"] = partial(Dashboard.publish_to_queue, dashboard_queue, worker_id)
     try:
-        asyncio.run(run_all_agents())
+        asyncio.run(run_all_agents(agent_files, latency=latency, bt_profiles=bt_profiles, **options))
     except KeyboardInterrupt:
-        print("Shutting down...")
+        print(f"Shutting down worker {worker_id}...")
+    finally:
+        Log.shutdown()  # Write the pending log records (the workers do not run the atexit handlers)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    # The event loop runs in a single thread, so the CPU time of the process is the time the loop was busy (plus the
+    # time of the log writer thread, small unless DEBUG logs are enabled)
+    return {"worker": worker_id, "agents": len(agent_files), "wall": wall, "cpu": cpu,
+            "loop_utilisation": cpu / wall if wall > 0 else 0.0, "latency": latency.to_dict(),
+            "bt_profiles": {f"{worker_id}/{agent}": profile for agent, profile in bt_profiles.items()}}
+
+
+def worker_main(worker_id, agent_files, results, options):
+    """
+    Entry point of the worker processes: runs its shard of agents and reports the summary to the parent
+    """
+    results.put(run_agents(agent_files, worker_id, **options))
+
+
+def print_summary(summaries, exit_codes, bt_profile_file=None):
+    """
+    :param bt_profile_file: json file where the behaviour tree profiles are exported (None: not exported)
+    """
+    print(f"{'worker':>6}{'agents':>8}{'wall (s)':>10}{'cpu (s)':>10}{'loop util':>11}{'exit':>6}")
+    for worker_id in sorted(exit_codes):
+        s = summaries.get(worker_id)
+        if s:
+            print(f"{worker_id:>6}{s['agents']:>8}{s['wall']:>10.1f}{s['cpu']:>10.1f}"
+                  f"{100 * s['loop_utilisation']:>10.1f}%{exit_codes[worker_id]:>6}")
+        else:
+            print(f"{worker_id:>6}{'-':>8}{'-':>10}{'-':>10}{'-':>11}{exit_codes[worker_id]:>6}")
+    total = sum(s["agents"] for s in summaries.values())
+    failed = [w for w, code in exit_codes.items() if code != 0]
+    print(f"Total agents: {total}" + (f"  Workers with errors: {failed}" if failed else ""))
+    latency = Latency.LatencyTracker()
+    for s in summaries.values():
+        latency.merge(Latency.LatencyTracker.from_dict(s["latency"]))
+    print(latency.report(f"{total} agents"))
+
+    bt_profiles = {}
+    for s in summaries.values():
+        bt_profiles.update(s["bt_profiles"])
+    if bt_profiles:
+        import Profiler
+        bt_profile = Profiler.BTProfiler()
+        for profile in bt_profiles.values():
+            bt_profile.merge(Profiler.BTProfiler.from_dict(profile))
+        print(bt_profile.table(f"({len(bt_profiles)} agents)"))
+        if bt_profile_file:
+            bt_profile.export(bt_profile_file, bt_profiles)
+            print(f"Behaviour tree profile exported to {bt_profile_file}")
 
+
+def start_agents(config_file, workers=1, conn_limit=0, conn_limit_per_host=0, connect_rate=0.0,
+                 connect_concurrency=0, bt_profile=None, dashboard_port=0, dashboard_rate=2.0):
+    """
+    :param bt_profile: None to not profile the behaviour trees, "" to profile them and print the profile at the
+    end, or the json file where the profile is also exported
+    :param dashboard_port: Port of the web dashboard of the agents (0 = no dashboard)
+    :param dashboard_rate: Times per second the agents are sampled for the dashboard
+    """
+    config = load_config(config_file)
+    agent_files = agent_config_files(config)
+    options = {"conn_limit": conn_limit, "conn_limit_per_host": conn_limit_per_host,
+               "connect_rate": connect_rate, "connect_concurrency": connect_concurrency,
+               "bt_profile": bt_profile is not None}
+    dashboard = None
+    if dashboard_port:
+        import Dashboard
+        # Bounded: a few samples per worker at most are waiting to be shown
+        options["dashboard_queue"] = multiprocessing.Queue(maxsize=4 * max(workers, 1))
+        options["dashboard_rate"] = dashboard_rate
+        dashboard = Dashboard.Dashboard(options["dashboard_queue"], dashboard_rate)
+        dashboard.start("127.0.0.1", dashboard_port)
+    try:
+        run_workers(agent_files, workers, options, bt_profile)
+    finally:
+        if dashboard:
+            dashboard.stop()
     print("Bye!!!")
 
 
+def run_workers(agent_files, workers, options, bt_profile):
+    """
+    Runs the agents in this process (workers <= 1) or sharded across 'workers' processes and prints the summary
+    """
+    if workers <= 1:
+        # All the agents in the event loop of this process
+        summary = run_agents(agent_files, 0, **options)
+        print_summary({0: summary}, {0: 0}, bt_profile)
+        return
+
+    # Shard the agents across 'workers' processes, each one with its own event loop
+    shards = [worker_files for worker_files in shard(agent_files, workers) if worker_files]
+    # The connection budget is for the whole run: split it among the workers
+    options["connect_rate"] = options["connect_rate"] / len(shards)
+    options["connect_concurrency"] = math.ceil(options["connect_concurrency"] / len(shards))
+    results = multiprocessing.Queue()
+    processes = {}
+    for worker_id, worker_files in enumerate(shards):
+        process = multiprocessing.Process(target=worker_main,
+                                          args=(worker_id, worker_files, results, options),
+                                          name=f"AAgentWorker-{worker_id}")
+        process.start()
+        processes[worker_id] = process
+    print(f"Running {len(agent_files)} agents in {len(processes)} workers")
+
+    summaries = {}
+    while len(summaries) < len(processes):
+        try:
+            summary = results.get(timeout=0.5)
+            summaries[summary["worker"]] = summary
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes.values()):
+                break  # Some worker finished without reporting
+        except KeyboardInterrupt:
+            # Ctrl+C also reaches the workers, that shut down their agents and report
+            print("Shutting down...")
+
+    exit_codes = {}
+    for worker_id, process in processes.items():
+        process.join(timeout=10)
+        if process.is_alive():
+            process.terminate()
+            process.join()
+        exit_codes[worker_id] = process.exitcode
+    print_summary(summaries, exit_codes, bt_profile)
+
+
 if __name__ == "__main__":
-    if len(sys.argv) < 1:
-        print("Usage: python Spawner.py <init_file.json>")
+    if len(sys.argv) < 2:
+        print("Usage: python Spawner.py <init_file.json> [--workers N] [--conn-limit N] [--conn-limit-per-host N] "
+              "[--connect-rate R] [--connect-concurrency N] [--bt-profile [FILE.json]] [--dashboard PORT]")
     else:
-        init_file = sys.argv[1]
-        start_agents(init_file)
+        parser = argparse.ArgumentParser(description="Spawns the packs of agents of <init_file.json>")
+        parser.add_argument("init_file")
+        parser.add_argument("--workers", type=int, default=1,
+                            help="Number of processes the agents are sharded across (each one with its event loop)")
+        parser.add_argument("--conn-limit", type=int, default=0,
+                            help="Connection limit of the aiohttp session shared by the agents of a process (0 = none)")
+        parser.add_argument("--conn-limit-per-host", type=int, default=0,
+                            help="Connection limit per host of the shared aiohttp session (0 = none)")
+        parser.add_argument("--connect-rate", type=float, default=0.0,
+                            help="Agents that start connecting per second, in total (0 = all at once)")
+        parser.add_argument("--connect-concurrency", type=int, default=0,
+                            help="Maximum number of agents connecting at the same time, in total (0 = no limit)")
+        parser.add_argument("--bt-profile", nargs="?", const="", default=None, metavar="FILE.json",
+                            help="Profile the behaviour tree nodes of all the agents, print the profile at the end "
+                                 "and export it to FILE.json if given")
+        parser.add_argument("--dashboard", type=int, default=0, metavar="PORT",
+                            help="Serve a web dashboard of all the agents at http://127.0.0.1:PORT/")
+        parser.add_argument("--dashboard-rate", type=float, default=2.0,
+                            help="Times per second the agents are sampled for the dashboard")
+        args = parser.parse_args()
+        start_agents(args.init_file, args.workers, args.conn_limit, args.conn_limit_per_host,
+                     args.connect_rate, args.connect_concurrency, args.bt_profile, args.dashboard,
+                     args.dashboard_rate)
@@ -0,0 +1,40 @@
+from collections import deque
+from types import SimpleNamespace
+
+from ActionFilter import ActionFilter
+
+
+def fake_state(**flags):
+    state = dict(movingForwards=False, movingBackwards=False, isRotatingRight=False, isRotatingLeft=False,
+                 onRoute=False)
+    state.update(flags)
+    return SimpleNamespace(**state)
+
+
+def test_suppresses_actions_that_change_nothing():
+    action_filter = ActionFilter(fake_state(movingForwards=True))
+    assert not action_filter.accept("mf")
+    assert not action_filter.accept("nt")
+    assert action_filter.accept("tr")
+    assert not action_filter.accept("tr")  # Already sent
+    assert action_filter.suppressed == 3 and action_filter.sent == 1
+
+
+def test_stop_while_rotating_is_sent():
+    action_filter = ActionFilter(fake_state(isRotatingRight=True))
+    assert action_filter.accept("stop")
+    assert action_filter.accept("stop")  # Never suppressed
+    assert action_filter.accept("nt")  # The rotation is unknown after a stop
+    assert not action_filter.accept("ntm")
+
+
+def test_merges_pending_actions_of_the_same_axis():
+    action_filter = ActionFilter(fake_state())
+    pending = deque()
+    for action in ("tl", "tr", "mf"):
+        action_filter.merge_pending(pending, action)
+    assert list(pending) == ["tr", "mf"]
+    action_filter.merge_pending(pending, "stop")
+    action_filter.merge_pending(pending, "mb")
+    assert list(pending) == ["tr", "stop", "mb"]  # A pending stop is kept
+    assert action_filter.merged == 2
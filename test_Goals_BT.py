@@ -0,0 +1,71 @@
+import asyncio
+from types import SimpleNamespace
+
+import Goals_BT
+
+
+def fake_agent(heading=0.0, updates=0, sensor_frame_time=None):
+    i_state = SimpleNamespace(updates=updates, rotation=SimpleNamespace(y=heading),
+                              isRotatingRight=False, isRotatingLeft=False)
+    return SimpleNamespace(i_state=i_state, sensor_frame_time=sensor_frame_time)
+
+
+def next_frame(agent, heading, arrival, rotating_right=True):
+    agent.i_state.updates += 1
+    agent.i_state.rotation.y = heading
+    agent.i_state.isRotatingRight = rotating_right
+    agent.sensor_frame_time = arrival
+
+
+def test_turn_started_before_the_first_frame():
+    agent = fake_agent()
+    heading = Goals_BT.HeadingController(agent)
+    assert heading.start(90) == "tr"
+    next_frame(agent, 10.0, 1.0)
+    assert heading.update() is None
+    assert heading.frame_interval is None and heading.rate is None
+    next_frame(agent, 20.0, 1.1)
+    assert heading.update() is None
+    assert abs(heading.frame_interval - 0.1) < 1e-9
+    assert abs(heading.rate - 100) < 1e-6
+
+
+def test_turn_stops_before_the_target():
+    agent = fake_agent(sensor_frame_time=0.0)
+    heading = Goals_BT.HeadingController(agent)
+    assert heading.start(90) == "tr"
+    for frame in range(1, 9):
+        next_frame(agent, 10.0 * frame, 0.1 * frame)
+        assert heading.update() is None
+    # 4 degrees left at 10 degrees per frame: stopping now lands closer than stopping on the next frame
+    next_frame(agent, 86.0, 0.9)
+    assert heading.update() == "nt"
+    assert heading.done and heading.corrections == 0
+
+
+def test_heading_difference_takes_the_short_way():
+    assert Goals_BT.heading_difference(10, 350) == 20
+    assert Goals_BT.heading_difference(350, 10) == -20
+
+
+def test_send_keeps_the_order_of_the_actions():
+    sent = []
+
+    async def send_message(msg_type, action):
+        await asyncio.sleep(0.01 if action == "tr" else 0)
+        if action == "fail":
+            raise ConnectionResetError("closed")
+        sent.append(action)
+
+    async def turn():
+        agent = fake_agent()
+        agent.send_message = send_message
+        heading = Goals_BT.HeadingController(agent)
+        for action in ("tr", "fail", None, "nt"):
+            heading.send(action)
+        await heading.task
+        return heading.task
+
+    task = asyncio.run(turn())
+    assert sent == ["tr", "nt"]
+    assert task.done() and task.exception() is None
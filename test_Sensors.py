@@ -0,0 +1,41 @@
+import numpy as np
+
+import Sensors
+
+
+def binary_frame(sensor, strings, hits):
+    """
+    Sets a perception like the one of a binary frame, 'hits' {ray: (tag, name, distance)}
+    """
+    hit = np.zeros(sensor.num_rays, dtype=np.uint8)
+    tag_ids = np.full(sensor.num_rays, Sensors.NO_TAG, dtype=np.int16)
+    name_ids = np.zeros(sensor.num_rays, dtype=np.uint16)
+    distance = np.full(sensor.num_rays, -1.0, dtype=np.float32)
+    for ray, (tag, name, ray_distance) in hits.items():
+        hit[ray] = 1
+        tag_ids[ray] = Sensors.intern_tag(tag)
+        name_ids[ray] = strings.index(name)
+        distance[ray] = ray_distance
+    sensor.set_perception_arrays(hit, distance, tag_ids, Sensors.ObjectInfoView(name_ids, tag_ids, distance, strings))
+
+
+def test_nearest_and_rays_with():
+    sensor = Sensors.RayCastSensor([2, 45, 0, 5])
+    sensor.set_perception([[0, 0, None], [1, 1, {"name": "AlienFlower_1", "tag": "AlienFlower", "distance": 3.0}],
+                           [2, 0, None], [3, 1, {"name": "AlienFlower_2", "tag": "AlienFlower", "distance": 2.0}],
+                           [4, 0, None]])
+    assert sensor.has("AlienFlower") and not sensor.has("Rock")
+    assert sensor.rays_with("AlienFlower") == (1, 3)
+    assert sensor.nearest("AlienFlower") == Sensors.NearestHit(3, 2.0, 22.5)
+
+
+def test_delta_frame_after_a_binary_frame():
+    sensor = Sensors.RayCastSensor([2, 45, 0, 5])
+    binary_frame(sensor, ["", "AlienFlower_1", "Rock_1"], {1: ("AlienFlower", "AlienFlower_1", 3.0),
+                                                            3: ("Rock", "Rock_1", 1.5)})
+    assert sensor.sensor_rays[Sensors.RayCastSensor.OBJECT_INFO][1]["name"] == "AlienFlower_1"
+    sensor.set_perception([[3, 0, None]])  # Only the ray that changed
+    object_info = sensor.sensor_rays[Sensors.RayCastSensor.OBJECT_INFO]
+    assert object_info[1] == {"name": "AlienFlower_1", "tag": "AlienFlower", "distance": 3.0}
+    assert object_info[3] is None
+    assert sensor.has("AlienFlower") and not sensor.has("Rock")